@@ -0,0 +1,78 @@
+"""
+Binary G-code codec benchmark.
+
+Encodes generated G-code with every `.bgcode` compression and encoding, decodes it back,
+checks that the commands are unchanged and prints sizes and throughput.
+The pure-Python heatshrink is always measured, `heatshrink2` too when it is installed.
+
+Usage:
+    python benchmarks/bgcode_codec.py
+    python benchmarks/bgcode_codec.py --size 5 --dialect orcaslicer
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import GcodeGenerator
+from GcodeTools.gcode_bgcode import Bgcode, Heatshrink, MeatPack
+
+
+def commands(text: str) -> list[str]:
+    return [command for command in (line.split(';')[0].strip() for line in text.split('\n')) if command]
+
+
+def codecs(text: bytes):
+    print(f'{"codec":>24} {"ratio":>7} {"encode MB/s":>12} {"decode MB/s":>12}')
+    mb = len(text) / 1e6
+    packed = MeatPack.encode(text)
+    start = time.perf_counter(); MeatPack.encode(text); encode = time.perf_counter() - start
+    start = time.perf_counter(); MeatPack.decode(packed); decode = time.perf_counter() - start
+    print(f'{"meatpack":>24} {len(packed) / len(text):7.3f} {mb / encode:12.2f} {mb / decode:12.2f}')
+
+    natives = [False] + ([True] if Heatshrink._native() else [])
+    for native in natives:
+        for window in (11, 12):
+            start = time.perf_counter(); compressed = Heatshrink.compress(packed, window, 4, native); encode = time.perf_counter() - start
+            start = time.perf_counter(); decompressed = Heatshrink.decompress(compressed, window, 4, native); decode = time.perf_counter() - start
+            assert decompressed == packed
+            name = f'heatshrink_{window}_4' + (' (native)' if native else '')
+            print(f'{name:>24} {len(compressed) / len(packed):7.3f} {len(packed) / 1e6 / encode:12.2f} {len(packed) / 1e6 / decode:12.2f}')
+
+
+def files(text: str):
+    from GcodeTools import Gcode
+    gcode_text = Gcode(gcode_str=text)
+    print(f'\n{"compression":>16} {"encoding":>18} {"bytes":>10} {"write s":>8} {"read s":>8}  result')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'out.bgcode')
+        for compression in Bgcode.COMPRESSION:
+            for encoding in Bgcode.ENCODING:
+                start = time.perf_counter()
+                Bgcode.write_file(gcode_text, path, compression=compression, encoding=encoding)
+                write = time.perf_counter() - start
+                start = time.perf_counter()
+                decoded = Bgcode.to_str(path)
+                read = time.perf_counter() - start
+                ok = commands(decoded) == commands(gcode_text.write_str())
+                print(f'{compression:>16} {encoding:>18} {os.path.getsize(path):10} {write:8.2f} {read:8.2f}  {"OK" if ok else "MISMATCH"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=1.0, help='size of generated G-code in MB (default: 1)')
+    parser.add_argument('--dialect', default='prusaslicer', choices=GcodeGenerator.DIALECTS)
+    parser.add_argument('--files', action='store_true', help='also write and read whole files with every option')
+    args = parser.parse_args()
+
+    text = '\n'.join(GcodeGenerator(args.dialect).lines(int(args.size * 1e6))) + '\n'
+    codecs(text.encode())
+    if args.files:
+        files(text)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
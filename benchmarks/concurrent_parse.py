@@ -0,0 +1,134 @@
+"""
+Concurrent parsing stress test and thread-scaling benchmark.
+
+Parses generated G-code of every dialect in a thread pool, in shuffled order and with different `Config`s,
+and checks that each result is identical to a sequential parse. Then measures parsing throughput with 1..N threads.
+On free-threaded CPython (3.13t) the throughput should scale with threads, otherwise it is limited by the GIL.
+
+Usage:
+    python benchmarks/concurrent_parse.py
+    python benchmarks/concurrent_parse.py --size 0.5 --threads 1,2,4,8 --rounds 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import Gcode, Config, Block, CoordSystem, GcodeGenerator
+from GcodeTools.gcode_parser import GcodeParser
+
+
+# Exercises state which used to leak between parses: G92 offsets, relative moves and absolute extrusion
+OFFSETS = """G28
+G90
+M82
+G1 X5 Y5 F3000
+G92 X10 Y10 E5
+G1 X20 Y20 E6 F3000
+G91
+G1 X1 Y1 E1
+G90
+G92 E0
+G1 X0 Y0 E1
+"""
+
+
+def make_config(speed: float, precision: int) -> Config:
+    config = Config()
+    config.speed = speed
+    config.precision = precision
+    return config
+
+
+def parse(gcode_str: str, config: Config, meta: bool) -> str:
+    gcode = Gcode(config=config)
+    if meta:
+        gcode.from_str(gcode_str)
+    else:
+        GcodeParser.from_str(gcode, gcode_str)
+    return gcode.write_str()
+
+
+def shared_defaults() -> list[str]:
+    """Returns names of default arguments which are shared between instances"""
+    shared = []
+    if Gcode().config is Gcode().config: shared.append('Gcode.config')
+    if Block().position is Block().position: shared.append('Block.position')
+    if CoordSystem().position is CoordSystem().position: shared.append('CoordSystem.position')
+    if CoordSystem().offset is CoordSystem().offset: shared.append('CoordSystem.offset')
+    return shared
+
+
+def stress(sources: dict[str, str], workers: int, rounds: int, seed: int) -> int:
+    """Returns number of results which differ from a sequential parse"""
+    configs = [make_config(1200, 5), make_config(3000, 3)]
+    jobs = [(name, idx) for name in sources for idx in range(len(configs))]
+    expected = {(name, idx): parse(sources[name], configs[idx], True) for name, idx in jobs}
+
+    rnd = random.Random(seed)
+    failures = 0
+    with ThreadPoolExecutor(workers) as executor:
+        for _ in range(rounds):
+            order = jobs * 2
+            rnd.shuffle(order)
+            futures = [(job, executor.submit(parse, sources[job[0]], configs[job[1]], True)) for job in order]
+            for job, future in futures:
+                if future.result() != expected[job]:
+                    failures += 1
+                    print(f'MISMATCH: {job[0]} with config {job[1]}')
+    return failures
+
+
+def scaling(sources: dict[str, str], threads: list[int], repeat: int):
+    work = list(sources.values()) * max(threads)
+    config = Config()
+    lines = sum(text.count('\n') for text in work)
+    base = None
+    print(f'{"threads":>8} {"seconds":>10} {"lines/s":>10} {"speedup":>8}')
+    for count in threads:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(count) as executor:
+                list(executor.map(lambda text: parse(text, config, False), work))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        base = base or best
+        print(f'{count:8} {best:10.3f} {round(lines / best):10} {base / best:8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.05, help='size of each generated file in MB (default: 0.05)')
+    parser.add_argument('--threads', default=f'1,2,4,{os.cpu_count() or 4}', help='comma separated thread counts for scaling')
+    parser.add_argument('--rounds', type=int, default=2, help='stress test rounds')
+    parser.add_argument('--repeat', type=int, default=2, help='repetitions per thread count, the fastest one is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    size = int(args.size * 1e6)
+    sources = {'offsets': OFFSETS * 50}
+    for dialect in GcodeGenerator.DIALECTS:
+        sources[dialect] = '\n'.join(GcodeGenerator(dialect, args.seed).lines(size)) + '\n'
+
+    threads = sorted(set(int(t) for t in args.threads.split(',')))
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'Python {sys.version.split()[0]}, GIL {"enabled" if gil else "disabled"}')
+
+    shared = shared_defaults()
+    if shared:
+        print(f'Shared mutable defaults: {", ".join(shared)}')
+
+    failures = stress(sources, max(threads), args.rounds, args.seed) + len(shared)
+    print(f'Stress test: {"OK" if not failures else f"{failures} mismatches"}\n')
+
+    scaling(sources, threads, args.repeat)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
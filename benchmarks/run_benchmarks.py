@@ -0,0 +1,193 @@
+"""
+Offline benchmark suite for GcodeTools.
+
+Generates synthetic G-code files for several slicer dialects and times every stage in a fresh process:
+parsing, metadata, writing, `Tools` operations and thumbnail scene building.
+Reports lines/s, MB/s and peak RSS, and compares the results against a stored baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline      # store current results as the new baseline
+    python benchmarks/run_benchmarks.py --size 1 --only from_file,write_file
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools.gcode_generator import GcodeGenerator
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, '.corpus')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def ensure_file(dialect: str, size: int, seed = 0) -> str:
+    """Returns path to a generated file, generating it only when it doesn't exist yet"""
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    path = os.path.join(CORPUS_DIR, f'{dialect}_{size}_{seed}.gcode')
+    if not os.path.exists(path):
+        GcodeGenerator(dialect, seed).write(path + '.tmp', size)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def _parsed(path):
+    from GcodeTools import Gcode
+    from GcodeTools.gcode_parser import GcodeParser
+    return GcodeParser.from_file(Gcode(), path)
+
+
+def _with_meta(path):
+    from GcodeTools import Gcode
+    return Gcode(path)
+
+
+def _thumbnail_scene(gcode):
+    """Path extraction of a thumbnail, with the software backend so no GPU is needed"""
+    from GcodeTools.Thumbnails.gcode_thumbnails import ThumbnailRenderer
+    ThumbnailRenderer('numpy').upload(gcode)
+
+
+def _benchmarks():
+    """`name`: (`setup(path)`, `stage(setup_result, path)`)"""
+    from GcodeTools import Gcode, Tools, Vector
+    from GcodeTools.gcode_parser import GcodeParser, MetaParser
+
+    return {
+        'from_file': (lambda path: None, lambda _, path: GcodeParser.from_file(Gcode(), path)),
+        'fill_meta': (_parsed, lambda gcode, _: MetaParser.fill_meta(gcode)),
+        'write_file': (_with_meta, lambda gcode, _: gcode.write_file(os.path.join(tempfile.gettempdir(), 'gcodetools_bench.gcode'))),
+        'trim': (_with_meta, lambda gcode, _: Tools.trim(gcode)),
+        'split': (_with_meta, lambda gcode, _: Tools.split(gcode)),
+        'layers': (_with_meta, lambda gcode, _: gcode.layers),
+        'translate': (_with_meta, lambda gcode, _: Tools.translate(gcode, Vector(10, 10, 0))),
+        'rotate': (_with_meta, lambda gcode, _: Tools.rotate(gcode, 90)),
+        'scale': (_with_meta, lambda gcode, _: Tools.scale(gcode, 1.1)),
+        'thumbnail_scene': (_with_meta, lambda gcode, _: _thumbnail_scene(gcode)),
+    }
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_one(name: str, path: str, repeat: int) -> dict:
+    """Runs a single benchmark. Meant to be executed in a fresh process"""
+    setup, stage = _benchmarks()[name]
+    try:
+        data = setup(path)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stage(data, path)
+            times.append(time.perf_counter() - start)
+    except ImportError as e:
+        return {'status': 'skipped', 'reason': str(e)}
+    except Exception as e:
+        return {'status': 'error', 'reason': f'{type(e).__name__}: {e}'}
+
+    with open(path, 'rb') as f:
+        lines = sum(1 for _ in f)
+    seconds = min(times)
+    return {
+        'status': 'ok',
+        'seconds': round(seconds, 4),
+        'lines_per_s': round(lines / seconds) if seconds else None,
+        'mb_per_s': round(os.path.getsize(path) / 1e6 / seconds, 3) if seconds else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list[str]:
+    """Returns a list of regressions against `baseline`. Benchmarks that ran in the baseline and no longer do are regressions too"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get('results', {}).get(key)
+        if not base or base.get('status') != 'ok':
+            continue
+        if result.get('status') != 'ok':
+            regressions.append(f'{key}: {result.get("status")} ({result.get("reason")}), was ok in baseline')
+            continue
+        limit = base['seconds'] * (1 + tolerance)
+        if result['seconds'] > limit and result['seconds'] - base['seconds'] > min_delta:
+            regressions.append(f'{key}: {result["seconds"]:.4f}s vs baseline {base["seconds"]:.4f}s (+{(result["seconds"] / base["seconds"] - 1) * 100:.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.25, help='size of each generated file in MB (default: 0.25)')
+    parser.add_argument('--dialects', default=','.join(GcodeGenerator.DIALECTS), help='comma separated slicer dialects')
+    parser.add_argument('--only', help='comma separated benchmark names')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per benchmark, the fastest one is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown ratio (default: 0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.02, help='ignore slowdowns below this many seconds')
+    parser.add_argument('--json', help='write results to a JSON file')
+    args = parser.parse_args()
+
+    size = int(args.size * 1e6)
+    names = args.only.split(',') if args.only else list(_benchmarks().keys())
+    context = multiprocessing.get_context('spawn')
+
+    results = {}
+    for dialect in args.dialects.split(','):
+        path = ensure_file(dialect, size, args.seed)
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_one, name, path, args.repeat).result()
+            key = f'{dialect}/{name}'
+            results[key] = result
+            if result['status'] == 'ok':
+                print(f'{key:32} {result["seconds"]:9.4f} s {result["lines_per_s"]:>10} lines/s {result["mb_per_s"]:8.3f} MB/s {result["peak_rss_mb"]:8} MB RSS')
+            else:
+                print(f'{key:32} {result["status"]}: {result["reason"]}')
+
+    report = {'size': size, 'seed': args.seed, 'python': sys.version.split()[0], 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save-baseline first')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('size') != size or baseline.get('seed') != args.seed:
+        print(f'Baseline was recorded with size={baseline.get("size")} seed={baseline.get("seed")}, not comparing')
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print('\nPERFORMANCE REGRESSIONS:')
+        for regression in regressions:
+            print('  ' + regression)
+        return 1
+    print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
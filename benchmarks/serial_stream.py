@@ -0,0 +1,116 @@
+"""
+Serial streaming test against a fake firmware on a local pty.
+
+The fake firmware answers like Marlin: it checks line numbers and checksums, replies `ok` for every command,
+and `Error:checksum mismatch` + `Resend:` for broken lines. Transmission errors are injected at `--error-rate`.
+Generated G-code is streamed with `SerialSender`, and the commands received by the firmware are compared with the source.
+
+Usage:
+    python benchmarks/serial_stream.py
+    python benchmarks/serial_stream.py --size 0.2 --window 8 --error-rate 0.01 --delay 0.0005
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import SerialSender, GcodeGenerator
+
+
+class FakeFirmware:
+    """Marlin-like line protocol on the master side of a pty"""
+
+    def __init__(self, error_rate: float, delay: float, seed: int):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        self._slave = slave
+        self.error_rate = error_rate
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.received: list[str] = []
+        self.errors = 0
+        self.expected = 0
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+
+    def _reply(self, text: str):
+        os.write(self.master, text.encode())
+
+
+    def _handle(self, line: str):
+        corrupted = self.random.random() < self.error_rate
+        body, _, checksum = line.rpartition('*')
+        if corrupted or not checksum.isdigit() or SerialSender.checksum(body) != int(checksum):
+            self.errors += 1
+            self._reply(f'Error:checksum mismatch, Last Line: {self.expected - 1}\nResend: {self.expected}\nok\n')
+            return
+        number, _, command = body.partition(' ')
+        number = int(number[1:])
+        if command.startswith('M110'):
+            self.expected = number + 1
+            self._reply('ok\n')
+            return
+        if number != self.expected:
+            self._reply(f'Error:Line Number is not Last Line Number+1, Last Line: {self.expected - 1}\nResend: {self.expected}\nok\n')
+            return
+        self.expected += 1
+        self.received.append(command)
+        if self.delay:
+            time.sleep(self.delay)
+        self._reply('ok\n')
+
+
+    def _loop(self):
+        buffer = b''
+        while True:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self._handle(line.decode().strip())
+
+
+    def close(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.1, help='size of generated G-code in MB (default: 0.1)')
+    parser.add_argument('--window', default='1,4,8', help='comma separated in-flight command counts')
+    parser.add_argument('--error-rate', type=float, default=0.002, help='fraction of lines corrupted in transmission')
+    parser.add_argument('--delay', type=float, default=0.0, help='firmware processing time per command in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    lines = list(GcodeGenerator('prusaslicer', args.seed).lines(int(args.size * 1e6)))
+    expected = [command for command in map(SerialSender.clean_command, lines) if command]
+
+    failures = 0
+    print(f'{"window":>8} {"lines":>8} {"resends":>8} {"seconds":>8} {"lines/s":>8}  result')
+    for window in sorted(set(int(w) for w in args.window.split(','))):
+        firmware = FakeFirmware(args.error_rate, args.delay, args.seed)
+        with open(firmware.path, 'r+b', buffering=0) as port, SerialSender(port, window=window, timeout=10) as sender:
+            stats = sender.send(lines)
+        ok = firmware.received == expected
+        failures += not ok
+        print(f'{window:8} {stats["lines"]:8} {stats["resends"]:8} {stats["seconds"]:8.3f} {stats["lines_per_s"]:8}  {"OK" if ok else "MISMATCH"}')
+        firmware.close()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Shared-memory `Gcode` transfer benchmark.
+
+Parses generated G-code once, then hands it to worker processes which sum extrusion per layer:
+once pickled with every task, once published with `GcodeStore.publish` and attached by the workers.
+Results of both must be equal.
+
+Usage:
+    python benchmarks/shared_gcode.py
+    python benchmarks/shared_gcode.py --size 2 --workers 8 --tasks 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import Gcode, GcodeGenerator, GcodeStore
+
+
+def extrusion_per_layer(gcode: Gcode) -> dict[int, float]:
+    result = {}
+    for block in gcode:
+        result[block.layer] = result.get(block.layer, 0.0) + block.position.E
+    return result
+
+
+def attached(name: str) -> dict[int, float]:
+    gcode = GcodeStore.attach(name)
+    try:
+        return extrusion_per_layer(gcode)
+    finally:
+        gcode.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.5, help='size of generated G-code in MB (default: 0.5)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--tasks', type=int, default=8)
+    args = parser.parse_args()
+
+    text = '\n'.join(GcodeGenerator('prusaslicer').lines(int(args.size * 1e6))) + '\n'
+    start = time.perf_counter()
+    gcode = Gcode(gcode_str=text)
+    print(f'parsed {len(gcode)} blocks in {time.perf_counter() - start:.2f} s')
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        list(executor.map(int, range(args.workers)))
+
+        start = time.perf_counter()
+        pickled = list(executor.map(extrusion_per_layer, [gcode] * args.tasks))
+        print(f'{"pickled":>10}: {time.perf_counter() - start:8.2f} s')
+
+        start = time.perf_counter()
+        shm = GcodeStore.publish(gcode)
+        published = time.perf_counter() - start
+        try:
+            shared = list(executor.map(attached, [shm.name] * args.tasks))
+        finally:
+            shm.close()
+            shm.unlink()
+        print(f'{"shared":>10}: {time.perf_counter() - start:8.2f} s  (publish {published:.2f} s, {shm.size / 1e6:.1f} MB)')
+
+    ok = all(result == pickled[0] for result in pickled + shared)
+    print('OK' if ok else 'MISMATCH')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Thumbnail rendering benchmark.
+
+Renders a generated plate with the NumPy software rasterizer (and polyscope, when installed)
+and prints the time of path extraction and of whole `generate_thumbnail` calls.
+
+Usage:
+    python benchmarks/thumbnail_render.py
+    python benchmarks/thumbnail_render.py --size 1 --resolution 500,1000 --save out.png
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import Gcode, GcodeGenerator
+from GcodeTools.Thumbnails.gcode_thumbnails import Thumbnails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.5, help='size of generated G-code in MB (default: 0.5)')
+    parser.add_argument('--resolution', default='250,500,1000', help='comma separated image sizes')
+    parser.add_argument('--save', help='save the last numpy render to this file')
+    args = parser.parse_args()
+
+    text = '\n'.join(GcodeGenerator('prusaslicer').lines(int(args.size * 1e6))) + '\n'
+    start = time.perf_counter()
+    gcode = Gcode(gcode_str=text)
+    print(f'parsed {len(gcode)} blocks in {time.perf_counter() - start:.2f} s')
+
+    start = time.perf_counter()
+    nodes, edges, _, _ = Thumbnails._extract_paths(gcode)
+    print(f'extracted {len(edges)} segments, {len(nodes)} nodes in {time.perf_counter() - start:.3f} s')
+
+    backends = ['numpy']
+    try:
+        import polyscope
+        backends.append('polyscope')
+    except ImportError:
+        pass
+
+    print(f'{"backend":>10} {"px":>6} {"seconds":>8}')
+    image = None
+    for backend in backends:
+        for resolution in (int(r) for r in args.resolution.split(',')):
+            start = time.perf_counter()
+            rendered = Thumbnails.generate_thumbnail(gcode, resolution=resolution, backend=backend)
+            print(f'{backend:>10} {resolution:6} {time.perf_counter() - start:8.3f}')
+            if backend == 'numpy':
+                image = rendered
+    if args.save and image is not None:
+        image.save(args.save)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Toolpath export benchmark.
+
+Exports extrusion toolpaths of generated G-code as JSON built from `Block`s, the way viewers were fed before,
+and with `Export` as NPZ, PLY and GLB. Prints time and size of each.
+
+Usage:
+    python benchmarks/toolpath_export.py
+    python benchmarks/toolpath_export.py --size 2 --keep out_dir
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GcodeTools import Gcode, GcodeGenerator, Export
+
+
+def write_json(gcode: Gcode, filename: str):
+    segments = []
+    previous = None
+    for block in gcode:
+        if previous is not None and (block.position.E or 0) > 0:
+            segments.append({
+                'start': [previous.X, previous.Y, previous.Z],
+                'end': [block.position.X, block.position.Y, block.position.Z],
+                'e': block.position.E, 'move_type': block.move_type, 'object': block.object, 'layer': block.layer,
+            })
+        previous = block.position
+    with open(filename, 'w') as f:
+        json.dump(segments, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=0.5, help='size of generated G-code in MB (default: 0.5)')
+    parser.add_argument('--keep', help='directory to keep the exported files in')
+    args = parser.parse_args()
+
+    text = '\n'.join(GcodeGenerator('prusaslicer').lines(int(args.size * 1e6))) + '\n'
+    start = time.perf_counter()
+    gcode = Gcode(gcode_str=text)
+    print(f'parsed {len(gcode)} blocks in {time.perf_counter() - start:.2f} s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.keep or tmp
+        os.makedirs(directory, exist_ok=True)
+        print(f'{"format":>8} {"seconds":>8} {"MB":>8}')
+        for extension in ('.json',) + Export.FORMATS:
+            filename = os.path.join(directory, 'toolpaths' + extension)
+            start = time.perf_counter()
+            if extension == '.json':
+                write_json(gcode, filename)
+            else:
+                Export.write_file(gcode, filename)
+            print(f'{extension:>8} {time.perf_counter() - start:8.3f} {os.path.getsize(filename) / 1e6:8.2f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
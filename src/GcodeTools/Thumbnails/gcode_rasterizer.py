@@ -0,0 +1,176 @@
+import math
+import numpy as np
+from PIL import Image
+
+
+
+class Rasterizer:
+    """
+    Headless software renderer of thick 3D lines, written in NumPy. No GPU, OpenGL or display is needed.
+
+    Segments are sampled about once per pixel and every sample is drawn as a shaded sphere impostor,
+    so consecutive samples form round tubes. Fragments are depth-tested in a z-buffer.
+    """
+
+    LIGHT = np.array([-0.4, 0.5, 0.77])
+    """Light direction in view space (x right, y up, z towards the camera)"""
+
+    AMBIENT = 0.35
+    DIFFUSE = 0.6
+    SPECULAR = 0.15
+
+    CHUNK = 1 << 22
+    """Fragments processed at once, limits memory use"""
+
+
+    @staticmethod
+    def _shade(dx: np.ndarray, dy: np.ndarray, radius: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Shading of a sphere impostor of pixel `radius` at pixel offsets `dx`, `dy` from its center
+
+        Returns:
+            `tuple` of (view-space normal Z, diffuse factor, specular term)
+        """
+        scale = radius + 0.5
+        nx = dx / scale
+        ny = -dy / scale
+        nz = np.sqrt(np.clip(1 - nx * nx - ny * ny, 0, 1))
+        light = Rasterizer.LIGHT / np.linalg.norm(Rasterizer.LIGHT)
+        half = light + np.array([0, 0, 1])
+        half /= np.linalg.norm(half)
+        lambert = np.clip(nx * light[0] + ny * light[1] + nz * light[2], 0, 1)
+        specular = np.clip(nx * half[0] + ny * half[1] + nz * half[2], 0, 1) ** 24
+        return (nz, Rasterizer.AMBIENT + Rasterizer.DIFFUSE * lambert, Rasterizer.SPECULAR * specular)
+
+
+    @staticmethod
+    def _stencil(radius: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pixel offsets of a disc, with view-space normal Z"""
+        r = np.arange(-radius, radius + 1, dtype=np.int32)
+        dx, dy = np.meshgrid(r, r)
+        dx = dx.ravel()
+        dy = dy.ravel()
+        inside = dx * dx + dy * dy <= (radius + 0.5) ** 2
+        dx, dy = dx[inside], dy[inside]
+        nz = Rasterizer._shade(dx, dy, np.float64(radius))[0]
+        return (dx, dy, nz.astype(np.float32))
+
+
+    @staticmethod
+    def look_at(camera: np.ndarray, target: np.ndarray, up = (0, 0, 1)) -> np.ndarray:
+        """Rows of the camera basis: right, up, forward"""
+        forward = target - camera
+        forward = forward / np.linalg.norm(forward)
+        right = np.cross(forward, up)
+        if np.linalg.norm(right) < 1e-9:
+            right = np.cross(forward, (0, 1, 0))
+        right = right / np.linalg.norm(right)
+        true_up = np.cross(right, forward)
+        return np.stack([right, true_up, forward])
+
+
+    @staticmethod
+    def render(starts: np.ndarray, ends: np.ndarray, radii: np.ndarray, colors: np.ndarray, camera: np.ndarray, target: np.ndarray,
+               fov: float, resolution: int, *, ortho_size: float = 1.0, shaded: np.ndarray|None = None) -> Image.Image:
+        """
+        Render line segments into an RGBA image with a transparent background
+
+        Args:
+            starts, ends: `np.ndarray` (n, 3) - segment end points
+            radii: `np.ndarray` (n,) - line radius in world units
+            colors: `np.ndarray` (n, 3) - colors in 0..1
+            camera, target: `np.ndarray` (3,) - camera position and look-at point, Z is up
+            fov: `float` - vertical field of view in degrees. Below 5, orthographic projection is used
+            resolution: `int` - width and height of the image
+            ortho_size: `float` - half of the visible height in world units with orthographic projection
+            shaded: `np.ndarray` (n,) of `bool` - segments drawn with lighting. All when `None`
+        """
+        size = int(resolution)
+        if len(starts) == 0:
+            return Image.fromarray(np.full((size, size, 4), (255, 255, 255, 0), dtype=np.uint8), 'RGBA')
+
+        basis = Rasterizer.look_at(np.asarray(camera, float), np.asarray(target, float))
+        ortho = fov < 5
+        if ortho:
+            focal = size / 2 / ortho_size
+        else:
+            focal = size / 2 / math.tan(math.radians(fov) / 2)
+        near = 1e-3
+
+        def project(points: np.ndarray):
+            view = (points - camera) @ basis.T
+            depth = view[:, 2]
+            scale = np.full_like(depth, focal) if ortho else focal / np.maximum(depth, near)
+            x = size / 2 + view[:, 0] * scale
+            y = size / 2 - view[:, 1] * scale
+            return x, y, depth, scale
+
+        x0, y0, z0, s0 = project(np.asarray(starts, float))
+        x1, y1, z1, s1 = project(np.asarray(ends, float))
+        radii = np.asarray(radii, float)
+        visible = (z0 > near) & (z1 > near)
+        px_radius = radii * np.maximum(s0, s1)
+        margin = px_radius + 1
+        visible &= (np.maximum(x0, x1) >= -margin) & (np.minimum(x0, x1) < size + margin)
+        visible &= (np.maximum(y0, y1) >= -margin) & (np.minimum(y0, y1) < size + margin)
+        if shaded is None:
+            shaded = np.ones(len(starts), dtype=bool)
+
+        index = np.flatnonzero(visible)
+        x0, y0, z0, s0, x1, y1, z1, s1 = (a[index] for a in (x0, y0, z0, s0, x1, y1, z1, s1))
+        radii, px_radius, seg_colors, seg_shaded = radii[index], px_radius[index], np.asarray(colors, float)[index], shaded[index]
+
+        length = np.hypot(x1 - x0, y1 - y0)
+        spacing = np.maximum(1.0, px_radius * 0.5)
+        counts = np.ceil(length / spacing).astype(np.int64) + 1
+        segment = np.repeat(np.arange(len(counts)), counts)
+        first = np.cumsum(counts) - counts
+        t = (np.arange(counts.sum()) - np.repeat(first, counts)) / np.maximum(np.repeat(counts, counts) - 1, 1)
+
+        sx = x0[segment] + (x1 - x0)[segment] * t
+        sy = y0[segment] + (y1 - y0)[segment] * t
+        sz = (z0[segment] + (z1 - z0)[segment] * t).astype(np.float32)
+        scale = s0[segment] + (s1 - s0)[segment] * t
+        world_radius = radii[segment].astype(np.float32)
+        sample_radius = np.rint(radii[segment] * scale).astype(np.int64)
+        cx = np.rint(sx).astype(np.int32)
+        cy = np.rint(sy).astype(np.int32)
+
+        # z-buffer of depth (as ordered float32 bits) in the high half and sample index in the low half,
+        # so the minimum is the front fragment. Only visible fragments are shaded afterwards
+        empty = np.iinfo(np.uint64).max
+        buffer = np.full(size * size, empty, dtype=np.uint64)
+        for radius in np.flatnonzero(np.bincount(sample_radius)):
+            samples = np.flatnonzero(sample_radius == radius).astype(np.uint32)
+            dx, dy, nz = Rasterizer._stencil(int(radius))
+            # discs crossing the image border need clipping, the rest are written without masking
+            crossing = (np.minimum(cx[samples], cy[samples]) < radius) | (np.maximum(cx[samples], cy[samples]) >= size - radius)
+            step = max(1, Rasterizer.CHUNK // len(dx))
+            for clip in (False, True):
+                group = samples[crossing == clip]
+                for i in range(0, len(group), step):
+                    chunk = group[i:i + step]
+                    pixel = (cy[chunk] * size + cx[chunk])[:, None] + (dy * size + dx)[None, :]
+                    depth = sz[chunk][:, None] - nz[None, :] * world_radius[chunk][:, None]
+                    np.maximum(depth, 0, out=depth)
+                    key = (depth.view(np.uint32).astype(np.uint64) << np.uint64(32)) | chunk[:, None]
+                    if clip:
+                        px = cx[chunk][:, None] + dx[None, :]
+                        py = cy[chunk][:, None] + dy[None, :]
+                        inside = (px.view(np.uint32) < size) & (py.view(np.uint32) < size)
+                        pixel, key = pixel[inside], key[inside]
+                    np.minimum.at(buffer, pixel.ravel(), key.ravel())
+
+        pixel = np.flatnonzero(buffer != empty)
+        sample = (buffer[pixel] & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        seg = segment[sample]
+        _, shade, specular = Rasterizer._shade(pixel % size - cx[sample], pixel // size - cy[sample], sample_radius[sample])
+        lit = seg_shaded[seg]
+        shade = np.where(lit, shade, 1.0)
+        specular = np.where(lit, specular, 0.0)
+        rgb = np.clip(seg_colors[seg] * shade[:, None] + specular[:, None], 0, 1)
+
+        image = np.full((size * size, 4), (255, 255, 255, 0), dtype=np.uint8)
+        image[pixel, :3] = (rgb * 255 + 0.5).astype(np.uint8)
+        image[pixel, 3] = 255
+        return Image.fromarray(image.reshape(size, size, 4), 'RGBA')
@@ -1,13 +1,22 @@
+import typing
 from typing import List
 from GcodeTools.gcode_types import *
 from GcodeTools.gcode import Gcode
 from GcodeTools.gcode_tools import Tools
 import numpy as np
 from PIL import Image
-import polyscope as ps
 import io
+import concurrent.futures
 
 class Thumbnails:
+    """
+    Renders G-code previews.
+
+    Backends:
+    - `polyscope` - OpenGL through an EGL context (`pip install polyscope`, needs Mesa on headless machines)
+    - `numpy` - software rasterizer (`Rasterizer`), no GPU or display needed, thread safe
+    - `auto` - `polyscope` when it is installed, `numpy` otherwise
+    """
 
     MOVE_TYPE_COLORS = {
         Static.INTERNAL_PERIMETER : [255, 255, 0],
@@ -21,27 +30,101 @@ class Thumbnails:
         Static.SUPPORT : [0, 255, 0],
     }
 
+    BACKENDS = ('auto', 'polyscope', 'numpy')
+
+    MERGE_TOLERANCE = 0.05
+    """Max distance in mm of a node merged into a polyline from the resulting line. An eighth of the drawn line radius"""
+
+    NO_TYPE = -1000
+    """Move type of blocks without one"""
+
+    ENCODERS = {
+        'PNG': ('PNG', {'optimize': False, 'compress_level': 6}, None),
+        'JPG': ('JPEG', {'quality': 85}, 'JPG'),
+        'QOI': ('QOI', {}, 'QOI'),
+        'WEBP': ('WEBP', {'optimize': True, 'quality': 70}, None),
+    }
+    """Thumbnail formats: Pillow format, save options and comment block format (`None` writes `; thumbnail begin`)"""
+
+    _polyscope_ready = False
+
+
     @staticmethod
-    def generate_thumbnail(gcode: Gcode, *, e_scale = 1, color: tuple[int, int, int]|None = None, yaw = 45, pitch = 45, fov = 45, resolution = 500, render_scale = 1, fit_in_viewport = True, draw_bounding_box = False):
-        ps = Thumbnails._generate_scene(gcode, draw_bounding_box, yaw, pitch, fov, resolution * render_scale)
-        Thumbnails._create_gcode_object(gcode, e_scale, color)
-        buf = ps.screenshot_to_buffer()
-        image = Image.fromarray(buf)
-        if fit_in_viewport and render_scale > 1.5:
-            image = Thumbnails.crop(image)
-        image = image.resize((resolution, resolution))
-        return image
+    def _polyscope():
+        try:
+            import polyscope
+            return polyscope
+        except ImportError:
+            raise ImportError('polyscope backend requires polyscope. Install it with `pip install polyscope` or use backend="numpy"')
 
 
     @staticmethod
-    def interactive(gcode: Gcode = None, gcodes: List[Gcode] = None, e_scale = 1, color_moves = False):
+    def _backend(backend: str) -> str:
+        if backend not in Thumbnails.BACKENDS:
+            raise ValueError(f'Unknown backend: {backend}, use one of {Thumbnails.BACKENDS}')
+        if backend == 'auto':
+            try:
+                import polyscope
+                return 'polyscope'
+            except ImportError:
+                return 'numpy'
+        return backend
+
+
+    @staticmethod
+    def generate_thumbnail(gcode: Gcode, *, e_scale = 1, color: tuple[int, int, int]|None = None, yaw = 45, pitch = 45, fov = 45, resolution = 500, render_scale = 1, fit_in_viewport = True, draw_bounding_box = False, backend = 'auto'):
+        """
+        Render `gcode` into a square image. To render many images, use a `ThumbnailRenderer` session
+
+        Args:
+            backend: `str` - `auto`, `polyscope` or `numpy`, see `Thumbnails`
+        """
+        view = {'yaw': yaw, 'pitch': pitch, 'fov': fov, 'render_scale': render_scale, 'fit_in_viewport': fit_in_viewport, 'draw_bounding_box': draw_bounding_box, 'e_scale': e_scale, 'color': color}
+        return ThumbnailRenderer(backend).render(gcode, view, resolution)[0]
+
+
+    @staticmethod
+    def interactive(gcode: Gcode = None, gcodes: List[Gcode] = None, e_scale = 1, color_moves = False, tolerance_px: float|None = None, detail_layers: int|None = None):
+        """
+        Show `gcode` or `gcodes` in a polyscope window, with sliders of the first and last visible layer.
+        Only the visible layers are uploaded to the GPU
+
+        Args:
+            tolerance_px: `float` - simplify paths up to this many pixels of the window, see `PreviewLod`. Use for huge prints
+            detail_layers: `int` - show only perimeters below this many top visible layers
+        """
         if not gcodes:
             gcodes = [gcode]
         colors = [(255,0,0),(255,255,0),(0,255,0),(0,255,255),(0,0,255),(255,0,255)]
         ps = Thumbnails._generate_scene(gcodes[0], len(gcodes) < 2, 45, 45, 45, 300)
-        for idx, g in enumerate(gcodes):
-            Thumbnails._create_gcode_object(g, e_scale, None if color_moves else colors[idx % len(colors)], idx)
+        window = max(ps.get_window_size())
+        previews = [PreviewLod(g, tolerance_px, window, e_scale, None if color_moves else colors[idx % len(colors)]) for idx, g in enumerate(gcodes)]
+        layers = [p.layers for p in previews if len(p.layers)]
+        if not layers:
+            ps.show()
+            return
+        lowest = int(min(l[0] for l in layers))
+        highest = int(max(l[-1] for l in layers))
+        shown = {'first': lowest, 'last': highest, 'uploaded': None}
+
+        def upload():
+            for idx, preview in enumerate(previews):
+                ps.remove_curve_network(f"Gcode {idx} Path", error_if_absent=False)
+                Thumbnails._register_paths(preview.select(shown['first'], shown['last'], detail_layers), idx)
+            shown['uploaded'] = (shown['first'], shown['last'])
+
+        def callback():
+            psim = ps.imgui
+            _, shown['first'] = psim.SliderInt("First layer", shown['first'], v_min=lowest, v_max=highest)
+            _, shown['last'] = psim.SliderInt("Last layer", shown['last'], v_min=lowest, v_max=highest)
+            shown['last'] = max(shown['first'], shown['last'])
+            if shown['uploaded'] != (shown['first'], shown['last']):
+                upload()
+
+        upload()
+        ps.set_user_callback(callback)
         ps.show()
+        ps.clear_user_callback()
 
 
     @staticmethod
@@ -60,45 +143,163 @@ class Thumbnails:
 
 
     @staticmethod
-    def _create_gcode_object(gcode: Gcode, e_scale = 1, color: tuple[int, int, int]|None = None, id = 0):
-        nodes = []
-        edges = []
-        sizes = []
-        colors = []
-        current_position = None
-        continuous = False
+    def _path_columns(gcode: Gcode) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            `tuple` of (`positions` (n, 3), `e` (n,), `move_types` (n,) with `None` as `Thumbnails.NO_TYPE`, `layers` (n,))
+        """
+        positions, e, move_types, _, layers = Tools._columns(gcode, Thumbnails.NO_TYPE)
+        return (positions, e, move_types, layers)
+
+
+    @staticmethod
+    def _bounding_box(positions: np.ndarray) -> tuple[Vector, Vector]:
+        """`Tools.get_bounding_box` of position columns"""
+        if len(positions) == 0:
+            return (Vector(), Vector())
+        low = positions.min(axis=0)
+        high = positions.max(axis=0)
+        return (Vector(*low), Vector(*high))
+
+
+    @staticmethod
+    def _merge_polylines(nodes: np.ndarray, run_start: np.ndarray, edge_type: np.ndarray, tolerance: float) -> np.ndarray:
+        """
+        Remove nodes of polylines lying within `tolerance` from the line between their neighbours,
+        when both neighbouring edges have the same type. Segments shorter than `tolerance` are merged too.
+        Every pass removes every other candidate, so kept neighbours stay fixed.
+
+        Args:
+            nodes: `np.ndarray` (n, 3)
+            run_start: `np.ndarray` (n,) of `bool` - first node of each polyline
+            edge_type: `np.ndarray` (n,) - type of the edge ending at each node
+        Returns:
+            `np.ndarray` of indices of kept nodes
+        """
+        keep = np.arange(len(nodes))
+        parity = 0
+        idle_passes = 0
+        while idle_passes < 2 and len(keep) > 2:
+            p = nodes[keep]
+            starts = run_start[keep]
+            types = edge_type[keep]
+            candidate = np.zeros(len(keep), dtype=bool)
+            candidate[1:-1] = ~starts[1:-1] & ~starts[2:] & (types[1:-1] == types[2:])
+            candidate[1:-1] &= (np.arange(1, len(keep) - 1) % 2) == parity
+            index = np.flatnonzero(candidate)
+            chord = p[index + 1] - p[index - 1]
+            offset = p[index] - p[index - 1]
+            length2 = np.einsum('ij,ij->i', chord, chord)
+            t = np.clip(np.einsum('ij,ij->i', offset, chord) / np.maximum(length2, 1e-18), 0, 1)
+            deviation = offset - chord * t[:, None]
+            remove = index[np.einsum('ij,ij->i', deviation, deviation) <= tolerance * tolerance]
+            if len(remove):
+                keep = np.delete(keep, remove)
+                idle_passes = 0
+            else:
+                idle_passes += 1
+            parity ^= 1
+        return keep
+
+
+    @staticmethod
+    def _extract_polylines(gcode: Gcode, merge_tolerance: float|None = None, columns: tuple|None = None) -> dict[str, np.ndarray]:
+        """
+        Extrusion runs of `gcode` as polylines, built with array operations. Nearly collinear nodes are merged,
+        within runs of the same move type and layer
+
+        Args:
+            merge_tolerance: `float` - see `Thumbnails._extract_paths`
+            columns: `tuple` - result of `Thumbnails._path_columns(gcode)`, when already computed
+        Returns:
+            `dict` of `nodes` (n, 3), `run_start` (n,) - first node of each polyline, and `move_type`, `layer` (n,) of the edge ending at each node
+        """
+        merge_tolerance = Thumbnails.MERGE_TOLERANCE if merge_tolerance is None else merge_tolerance
+        positions, e, move_types, layers = columns or Thumbnails._path_columns(gcode)
+
+        extruding = Tools._extruding(positions, e)
+        blocks = np.flatnonzero(extruding)
+        if len(blocks) == 0:
+            return {'nodes': np.zeros((0, 3)), 'run_start': np.zeros(0, dtype=bool), 'move_type': np.zeros(0, dtype=np.int64), 'layer': np.zeros(0, dtype=np.int64)}
+        # runs break at moves without extrusion, blocks without movement (commands, comments) don't break them
+        moved = np.zeros(len(e), dtype=bool)
+        moved[1:] = np.any(positions[1:] != positions[:-1], axis=1)
+        travels = np.cumsum(moved & ~extruding)
+        starts = np.ones(len(blocks), dtype=bool)
+        starts[1:] = travels[blocks[1:] - 1] != travels[blocks[:-1]]
+
+        # a polyline is the position before its first extruding block, followed by every extruding block
+        counts = 1 + starts
+        node_block = np.repeat(blocks, counts)
+        edge_block = node_block.copy()
+        first = np.cumsum(counts) - counts
+        node_block[first[starts]] -= 1
+        run_start = np.zeros(len(node_block), dtype=bool)
+        run_start[first[starts]] = True
+
+        nodes = positions[node_block]
+        if merge_tolerance >= 0:
+            # consecutive layers never share a value, so merging stops at type and layer changes
+            edge_key = move_types[edge_block] * (int(layers.max(initial=0)) + 1 - int(layers.min(initial=0))) + layers[edge_block]
+            keep = Thumbnails._merge_polylines(nodes, run_start, edge_key, merge_tolerance)
+            nodes, run_start, edge_block = nodes[keep], run_start[keep], edge_block[keep]
+        return {'nodes': nodes, 'run_start': run_start, 'move_type': move_types[edge_block], 'layer': layers[edge_block]}
+
+
+    @staticmethod
+    def _polyline_paths(polylines: dict[str, np.ndarray], e_scale = 1, color: tuple[int, int, int]|None = None, edge_mask: np.ndarray|None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Curve network of polylines from `Thumbnails._extract_polylines`
+
+        Args:
+            edge_mask: `np.ndarray` (n,) of `bool` - edges to keep, indexed by their end node. Unused nodes are dropped
+        Returns:
+            `tuple` of (`nodes` (n, 3), `edges` (m, 2), node `sizes` (n,), edge `colors` (m, 3) in 0..1)
+        """
+        nodes, run_start, edge_type = polylines['nodes'], polylines['run_start'], polylines['move_type']
+        ends = np.flatnonzero(~run_start)
+        if edge_mask is not None:
+            ends = ends[edge_mask[ends]]
+        edges = np.stack([ends - 1, ends], axis=1).reshape(-1, 2)
+        sizes = np.where(edge_type == Static.NO_OBJECT, 0.01, .4) * e_scale
+        if edge_mask is not None:
+            used = np.zeros(len(nodes), dtype=bool)
+            used[edges.ravel()] = True
+            remap = np.cumsum(used) - 1
+            edges = remap[edges]
+            # a start node takes the size of the edge ending at the next node
+            sizes = np.where(run_start, np.roll(sizes, -1), sizes)[used]
+            nodes = nodes[used]
+
         if color:
-            draw_color = np.array([color[0] / 255, color[1] / 255, color[2] / 255])
-
-        for block in gcode:
-            new_position = np.array([block.position.X, block.position.Y, block.position.Z])
-            if current_position is None:
-                current_position = new_position
-                continuous = False
-                continue
-            if block.position.E <= 0:
-                current_position = new_position
-                continuous = False
-                continue
-            flowrate = 0.01 if block.move_type == Static.NO_OBJECT else .4
-            flowrate *= e_scale
-            if not continuous:
-                nodes.append(current_position)
-                sizes.append(flowrate)
-            nodes.append(new_position)
-            edges.append([len(nodes) - 2, len(nodes) - 1])
-            colors_arr = Thumbnails.MOVE_TYPE_COLORS.get(block.move_type, [127, 127, 127])
-            if color is None:
-                draw_color = np.array([colors_arr[0]/255, colors_arr[1]/255, colors_arr[2]/255])
-            sizes.append(flowrate)
-            colors.append(draw_color)
-            current_position = new_position
-            continuous = True
-
-        nodes = np.array(nodes)
-        edges = np.array(edges)
-        sizes = np.array(sizes)
-        colors = np.array(colors)
+            colors = np.tile(np.array(color[:3], dtype=float) / 255, (len(ends), 1))
+        else:
+            types, inverse = np.unique(edge_type[ends], return_inverse=True)
+            lut = np.array([Thumbnails.MOVE_TYPE_COLORS.get(int(t), [127, 127, 127]) for t in types], dtype=float).reshape(-1, 3) / 255
+            colors = lut[inverse.ravel()]
+        return (nodes, edges, sizes, colors)
+
+
+    @staticmethod
+    def _extract_paths(gcode: Gcode, e_scale = 1, color: tuple[int, int, int]|None = None, merge_tolerance: float|None = None, columns: tuple|None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Extrusion paths of `gcode` as a curve network, built with array operations.
+        Each continuous extrusion run is one polyline, whose nearly collinear nodes are merged
+
+        Args:
+            merge_tolerance: `float` - max distance in mm of a merged node from the resulting line.
+                Defaults to `Thumbnails.MERGE_TOLERANCE`, 0 merges only exactly collinear nodes, negative disables merging
+            columns: `tuple` - result of `Thumbnails._path_columns(gcode)`, when already computed
+        Returns:
+            `tuple` of (`nodes` (n, 3), `edges` (m, 2), node `sizes` (n,), edge `colors` (m, 3) in 0..1)
+        """
+        return Thumbnails._polyline_paths(Thumbnails._extract_polylines(gcode, merge_tolerance, columns), e_scale, color)
+
+
+    @staticmethod
+    def _register_paths(paths: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], id = 0):
+        ps = Thumbnails._polyscope()
+        nodes, edges, sizes, colors = paths
         if len(nodes) > 0:
             ps_net = ps.register_curve_network(f"Gcode {id} Path", nodes, edges, material="clay")
             try:
@@ -113,8 +314,12 @@ class Thumbnails:
 
 
     @staticmethod
-    def _create_bounding_box_object(min: Vector, max: Vector):
+    def _create_gcode_object(gcode: Gcode, e_scale = 1, color: tuple[int, int, int]|None = None, id = 0):
+        return Thumbnails._register_paths(Thumbnails._extract_paths(gcode, e_scale, color), id)
+
 
+    @staticmethod
+    def _bounding_box_edges(min: Vector, max: Vector) -> tuple[np.ndarray, np.ndarray]:
         bbox_nodes = np.array([
             [min.X, min.Y, min.Z],
             [max.X, min.Y, min.Z],
@@ -130,6 +335,13 @@ class Thumbnails:
             [4, 5], [5, 7], [7, 6], [6, 4],  # Top rectangle
             [0, 4], [1, 5], [2, 6], [3, 7],  # Vertical edges
         ])
+        return (bbox_nodes, bbox_edges)
+
+
+    @staticmethod
+    def _create_bounding_box_object(min: Vector, max: Vector):
+        ps = Thumbnails._polyscope()
+        bbox_nodes, bbox_edges = Thumbnails._bounding_box_edges(min, max)
         ps_bbox_net = ps.register_curve_network("Bounding Box", bbox_nodes, bbox_edges, material="flat")
         ps_bbox_net.set_color((1, 0, 0))
         ps_bbox_net.set_radius(0.001)
@@ -137,10 +349,11 @@ class Thumbnails:
 
 
     @staticmethod
-    def _generate_scene(gcode: Gcode, draw_bounding_box: bool, yaw: float, pitch: float, fov: float, resolution: int):
-
-        bounding_box = Tools.get_bounding_box(gcode)
-
+    def _camera(bounding_box: tuple[Vector, Vector], yaw: float, pitch: float, fov: float) -> tuple[Vector, Vector, float]:
+        """
+        Returns:
+            `tuple` of (`camera_pos`, `middle`, `radius`) - camera looking at the middle of `bounding_box` from `yaw` and `pitch`
+        """
         middle = (bounding_box[0] + bounding_box[1]) / 2
         size = (bounding_box[1] - bounding_box[0]) / 2
         radius = math.sqrt(size.X**2 + size.Y**2 + size.Z**2)
@@ -156,25 +369,70 @@ class Thumbnails:
         camera_pos.Y = math.cos(math.radians(yaw)) * h_dist
         camera_pos *= camera_dist
         camera_pos += middle
-        
-        print('Setting up polyscope')
+        return (camera_pos, middle, radius)
+
+
+    @staticmethod
+    def _render_numpy(paths: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], bounding_box: tuple[Vector, Vector], yaw: float, pitch: float, fov: float, resolution: int, draw_bounding_box: bool) -> Image.Image:
+        from GcodeTools.Thumbnails.gcode_rasterizer import Rasterizer
+
+        camera_pos, middle, radius = Thumbnails._camera(bounding_box, yaw, pitch, fov)
+        nodes, edges, sizes, colors = paths
+        starts = nodes[edges[:, 0]]
+        ends = nodes[edges[:, 1]]
+        radii = (sizes[edges[:, 0]] + sizes[edges[:, 1]]) / 2
+        shaded = np.ones(len(edges), dtype=bool)
+
+        if draw_bounding_box:
+            bbox_nodes, bbox_edges = Thumbnails._bounding_box_edges(bounding_box[0], bounding_box[1])
+            starts = np.concatenate([starts, bbox_nodes[bbox_edges[:, 0]]])
+            ends = np.concatenate([ends, bbox_nodes[bbox_edges[:, 1]]])
+            radii = np.concatenate([radii, np.zeros(len(bbox_edges))])
+            colors = np.concatenate([colors, np.tile([1.0, 0, 0], (len(bbox_edges), 1))])
+            shaded = np.concatenate([shaded, np.zeros(len(bbox_edges), dtype=bool)])
+
+        camera = np.array([camera_pos.X, camera_pos.Y, camera_pos.Z])
+        target = np.array([middle.X, middle.Y, middle.Z])
+        return Rasterizer.render(starts, ends, radii, colors, camera, target, fov, resolution, ortho_size=max(radius, 1e-6), shaded=shaded)
+
+
+    @staticmethod
+    def _init_polyscope(resolution: int):
+        """Set polyscope up, once per process"""
+        ps = Thumbnails._polyscope()
+        if not Thumbnails._polyscope_ready:
+            print('Setting up polyscope')
+
+            w, h = ps.get_window_size()
+            if w != resolution or h != resolution:
+                ps.set_window_size(resolution, resolution)
+
+            print('Setting up polyscope environment')
+            try:
+                ps.set_allow_headless_backends(True) 
+                print('Polyscope set with headless backend')
+            except:
+                print('Warning: some features are not supported with this python version')
+            ps.set_verbosity(6)
+
+            ps.set_use_prefs_file(False)
+            ps.init("openGL3_egl")
+            print('Polyscope initialized with OpenGL3 EGL backend')
+            ps.set_up_dir("z_up")
+            ps.set_ground_plane_mode("none")
+            Thumbnails._polyscope_ready = True
+        return ps
+
+
+    @staticmethod
+    def _set_polyscope_camera(bounding_box: tuple[Vector, Vector], yaw: float, pitch: float, fov: float, resolution: int):
+        ps = Thumbnails._polyscope()
+        camera_pos, middle, radius = Thumbnails._camera(bounding_box, yaw, pitch, fov)
 
         w, h = ps.get_window_size()
         if w != resolution or h != resolution:
             ps.set_window_size(resolution, resolution)
 
-        print('Setting up polyscope environment')
-        try:
-            ps.set_allow_headless_backends(True) 
-            print('Polyscope set with headless backend')
-        except:
-            print('Warning: some features are not supported with this python version')
-        ps.set_verbosity(6)
-
-        ps.set_use_prefs_file(False)
-        ps.init("openGL3_egl")
-        print('Polyscope initialized with OpenGL3 EGL backend')
-        ps.set_up_dir("z_up")
         ps.set_view_projection_mode("orthographic" if fov < 5 else "perspective")
         intrinsics = ps.CameraIntrinsics(fov_vertical_deg=fov if fov >= 5 else 35, aspect=1.)
         extrinsics = ps.CameraExtrinsics(root=(2., 2., 2.), look_dir=(-1., 0., 0.), up_dir=(0.,1.,0.))
@@ -182,34 +440,267 @@ class Thumbnails:
         ps.set_view_camera_parameters(new_params)
         ps.look_at((camera_pos.X, camera_pos.Y, camera_pos.Z), (middle.X, middle.Y, middle.Z))
 
-        if draw_bounding_box:
-            Thumbnails._create_bounding_box_object(bounding_box[0], bounding_box[1])
-
         try:
             ps.set_view_center((middle.X, middle.Y, middle.Z))
         except:
             pass
-        ps.set_ground_plane_mode("none")
-        w, h = ps.get_window_size()
-        if w != resolution or h != resolution:
-            ps.set_window_size(resolution, resolution)
+
+
+    @staticmethod
+    def _generate_scene(gcode: Gcode, draw_bounding_box: bool, yaw: float, pitch: float, fov: float, resolution: int):
+        ps = Thumbnails._init_polyscope(resolution)
+        ps.remove_all_structures()
+
+        bounding_box = Thumbnails._bounding_box(Thumbnails._path_columns(gcode)[0])
+        Thumbnails._set_polyscope_camera(bounding_box, yaw, pitch, fov, resolution)
+
+        if draw_bounding_box:
+            Thumbnails._create_bounding_box_object(bounding_box[0], bounding_box[1])
         return ps
 
 
     @staticmethod
-    def write_image_thumbnail(gcode: Gcode, image: Image.Image):
+    def _encode_image(image: Image.Image, size: int|tuple[int, int]|None, format: str) -> tuple[bytes, int, int, str|None]:
+        """
+        Returns:
+            `tuple` of (`data`, `width`, `height`, comment `format`) for `Tools.write_thumbnails`
+        """
+        if format not in Thumbnails.ENCODERS:
+            raise ValueError(f'Unknown thumbnail format: {format}, use one of {tuple(Thumbnails.ENCODERS)}')
+        pil_format, options, comment_format = Thumbnails.ENCODERS[format]
+        if size is not None:
+            if isinstance(size, int):
+                size = (size, size)
+            if tuple(size) != image.size:
+                image = image.resize(tuple(size), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
         img_data = io.BytesIO()
-        image.save(img_data, 'webp', optimize = True, quality = 70)
+        image.save(img_data, pil_format, **options)
         w, h = image.size
-        return Tools.write_thumbnail(gcode, img_data.getvalue(), w, h)
+        return (img_data.getvalue(), w, h, comment_format)
+
+
+    @staticmethod
+    def encode_thumbnails(image: Image.Image, targets: typing.Iterable[tuple[int|tuple[int, int]|None, str]], workers: int|None = None) -> list[tuple[bytes, int, int, str|None]]:
+        """
+        Resize and encode `image` to many sizes and formats concurrently
+
+        Args:
+            targets: `Iterable` of (`size`, `format`) - `size` is `int` for square images, (`width`, `height`) or `None` to keep the size.
+                `format` is one of `Thumbnails.ENCODERS`
+            workers: `int` - number of threads. Defaults to one per target
+        Returns:
+            `list` of (`data`, `width`, `height`, comment `format`) in order of `targets`, for `Tools.write_thumbnails`
+        """
+        targets = [(size, format.upper()) for size, format in targets]
+        if len(targets) < 2 or workers == 1:
+            return [Thumbnails._encode_image(image, size, format) for size, format in targets]
+        image.load()
+        with concurrent.futures.ThreadPoolExecutor(workers or len(targets)) as executor:
+            return list(executor.map(lambda target: Thumbnails._encode_image(image, *target), targets))
 
 
     @staticmethod
-    def set_thumbnail(gcode: Gcode, image: Image.Image):
+    def write_image_thumbnail(gcode: Gcode, image: Image.Image, format = 'WEBP'):
+        data, w, h, comment_format = Thumbnails._encode_image(image, None, format.upper())
+        return Tools.write_thumbnail(gcode, data, w, h, format=comment_format)
+
+
+    @staticmethod
+    def set_thumbnail(gcode: Gcode, image: Image.Image, targets: typing.Iterable[tuple[int|tuple[int, int]|None, str]]|None = None, workers: int|None = None):
         """
-        Replaces thumbnails with a selected image. Adds a small 48x48 thumbnail.
+        Replaces thumbnails with a selected image. By default adds the image and a small 48x48 thumbnail as WebP.
+
+        Args:
+            targets: `Iterable` of (`size`, `format`), e.g. `[(300, 'QOI'), (16, 'QOI'), ((220, 124), 'JPG')]` - see `Thumbnails.encode_thumbnails`
         """
+        if targets is None:
+            targets = [(None, 'WEBP'), (48, 'WEBP')]
         gcode = Tools.remove_thumbnails(gcode)
-        gcode = Thumbnails.write_image_thumbnail(gcode, image)
-        gcode = Thumbnails.write_image_thumbnail(gcode, image.resize((48, 48)))
-        return gcode
+        return Tools.write_thumbnails(gcode, Thumbnails.encode_thumbnails(image, targets, workers))
+
+
+
+class ThumbnailRenderer:
+    """
+    Rendering session: the backend is set up once, and every `Gcode` is extracted (and uploaded) once
+    for all of its views and sizes. Structures of the previous `Gcode` are removed before the next one is uploaded.
+
+    A view is a `dict` with any of `ThumbnailRenderer.VIEW` keys. `e_scale` and `color` change the geometry,
+    the rest only the camera and the output.
+
+    Example:
+    ```
+    renderer = ThumbnailRenderer('numpy')
+    iso, top = renderer.render(gcode, [{}, {'pitch': 90, 'fov': 0}], 300)
+    images = renderer.render_jobs([(obj, {'draw_bounding_box': True}, 250) for obj in objects])
+    ```
+    """
+
+    VIEW = {'yaw': 45, 'pitch': 45, 'fov': 45, 'render_scale': 1, 'fit_in_viewport': True, 'draw_bounding_box': False, 'e_scale': 1, 'color': None}
+    """Default view"""
+
+
+    def __init__(self, backend = 'auto'):
+        """
+        Args:
+            backend: `str` - `auto`, `polyscope` or `numpy`, see `Thumbnails`
+        """
+        self.backend = Thumbnails._backend(backend)
+        self._uploaded = None
+        if self.backend == 'polyscope':
+            Thumbnails._init_polyscope(500)
+
+
+    def _view(self, view: dict|None) -> dict:
+        full = dict(ThumbnailRenderer.VIEW)
+        full.update(view or {})
+        unknown = set(full) - set(ThumbnailRenderer.VIEW)
+        if unknown:
+            raise ValueError(f'Unknown view keys: {sorted(unknown)}')
+        return full
+
+
+    def upload(self, gcode: Gcode, e_scale = 1, color: tuple[int, int, int]|None = None) -> dict:
+        """
+        Extract geometry of `gcode` and, with polyscope, replace registered structures with it
+
+        Returns:
+            `dict` with `paths` and `bounding_box`, to be passed to `ThumbnailRenderer.render_geometry`
+        """
+        columns = Thumbnails._path_columns(gcode)
+        geometry = {
+            'paths': Thumbnails._extract_paths(gcode, e_scale, color, columns=columns),
+            'bounding_box': Thumbnails._bounding_box(columns[0]),
+        }
+        if self.backend == 'polyscope':
+            ps = Thumbnails._polyscope()
+            ps.remove_all_structures()
+            Thumbnails._register_paths(geometry['paths'])
+            geometry['bounding_box_object'] = Thumbnails._create_bounding_box_object(*geometry['bounding_box'])
+        self._uploaded = geometry
+        return geometry
+
+
+    def render_geometry(self, geometry: dict, view: dict|None = None, size = 500) -> Image.Image:
+        """
+        Render uploaded geometry. With polyscope, it must be the last uploaded one
+
+        Args:
+            view: `dict` - see `ThumbnailRenderer.VIEW`
+            size: `int` - width and height of the image
+        """
+        view = self._view(view)
+        resolution = int(size * view['render_scale'])
+        if self.backend == 'polyscope':
+            if geometry is not self._uploaded:
+                raise ValueError('Only the last uploaded geometry can be rendered with polyscope')
+            ps = Thumbnails._polyscope()
+            geometry['bounding_box_object'].set_enabled(view['draw_bounding_box'])
+            Thumbnails._set_polyscope_camera(geometry['bounding_box'], view['yaw'], view['pitch'], view['fov'], resolution)
+            image = Image.fromarray(ps.screenshot_to_buffer())
+        else:
+            image = Thumbnails._render_numpy(geometry['paths'], geometry['bounding_box'], view['yaw'], view['pitch'], view['fov'], resolution, view['draw_bounding_box'])
+
+        if view['fit_in_viewport'] and view['render_scale'] > 1.5:
+            image = Thumbnails.crop(image)
+        return image.resize((size, size))
+
+
+    def render(self, gcode: Gcode, views: dict|list[dict]|None = None, sizes: int|list[int] = 500) -> list[Image.Image]:
+        """
+        Render `gcode` with every view in every size. Geometry is extracted once per `e_scale` and `color`
+
+        Returns:
+            `list` of images, for each view for each size
+        """
+        views = [self._view(v) for v in (views if isinstance(views, list) else [views])]
+        sizes = sizes if isinstance(sizes, list) else [sizes]
+        images = []
+        geometry = None
+        key = None
+        for view in views:
+            if key != (view['e_scale'], view['color']):
+                key = (view['e_scale'], view['color'])
+                geometry = self.upload(gcode, *key)
+            for size in sizes:
+                images.append(self.render_geometry(geometry, view, size))
+        return images
+
+
+    def render_jobs(self, jobs: typing.Iterable[tuple[Gcode, dict|None, int]]) -> list[Image.Image]:
+        """
+        Render (`gcode`, `view`, `size`) jobs in order. Consecutive jobs of the same `Gcode` share its geometry
+
+        Returns:
+            `list` of images, one for each job
+        """
+        images = []
+        uploaded = None
+        geometry = None
+        for gcode, view, size in jobs:
+            view = self._view(view)
+            if uploaded is None or uploaded[0] is not gcode or uploaded[1:] != (view['e_scale'], view['color']):
+                geometry = self.upload(gcode, view['e_scale'], view['color'])
+                uploaded = (gcode, view['e_scale'], view['color'])
+            images.append(self.render_geometry(geometry, view, size))
+        return images
+
+
+
+
+class PreviewLod:
+    """
+    Level of detail geometry of `Gcode` for interactive previews of huge prints.
+
+    Paths are extracted once, and simplified so that no node moves by more than `tolerance_px` pixels of a `window` sized view
+    of the whole print. Segments shorter than that are merged into their neighbours. `select` returns a curve network
+    of a layer range, optionally with only perimeters of layers far below the top one.
+    """
+
+    PERIMETERS = (Static.EXTERNAL_PERIMETER, Static.INTERNAL_PERIMETER, Static.OVERHANG_PERIMETER)
+    """Move types kept in layers below `detail_layers`"""
+
+
+    def __init__(self, gcode: Gcode, tolerance_px: float|None = 1.0, window = 1000, e_scale = 1, color: tuple[int, int, int]|None = None):
+        """
+        Args:
+            tolerance_px: `float` - max simplification error in pixels. `None` uses `Thumbnails.MERGE_TOLERANCE` in mm
+            window: `int` - size of the view in pixels
+        """
+        columns = Thumbnails._path_columns(gcode)
+        self.bounding_box = Thumbnails._bounding_box(columns[0])
+        if tolerance_px is None:
+            self.tolerance = Thumbnails.MERGE_TOLERANCE
+        else:
+            size = (self.bounding_box[1] - self.bounding_box[0])
+            diameter = math.sqrt(size.X**2 + size.Y**2 + size.Z**2)
+            self.tolerance = max(tolerance_px * diameter / window, Thumbnails.MERGE_TOLERANCE)
+        self.polylines = Thumbnails._extract_polylines(gcode, self.tolerance, columns)
+        self.layers = np.unique(self.polylines['layer'][~self.polylines['run_start']])
+        self.e_scale = e_scale
+        self.color = color
+
+
+    def select(self, first: int|None = None, last: int|None = None, detail_layers: int|None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Curve network of layers `first` to `last` inclusive
+
+        Args:
+            detail_layers: `int` - only perimeters are kept in layers below the top `detail_layers` layers. All layers are detailed when `None`
+        Returns:
+            `tuple` of (`nodes` (n, 3), `edges` (m, 2), node `sizes` (n,), edge `colors` (m, 3) in 0..1)
+        """
+        layer = self.polylines['layer']
+        mask = np.ones(len(layer), dtype=bool)
+        if first is not None:
+            mask &= layer >= first
+        if last is not None:
+            mask &= layer <= last
+        if detail_layers is not None:
+            top = last if last is not None else (self.layers[-1] if len(self.layers) else 0)
+            mask &= (layer > top - detail_layers) | np.isin(self.polylines['move_type'], self.PERIMETERS)
+        return Thumbnails._polyline_paths(self.polylines, self.e_scale, self.color, mask)
\ No newline at end of file
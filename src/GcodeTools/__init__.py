@@ -1,3 +1,15 @@
 from GcodeTools.gcode import Gcode
 from GcodeTools.gcode_tools import *
-from GcodeTools.gcode_types import *
\ No newline at end of file
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode_meta_reader import MetaReader
+from GcodeTools.gcode_batch import Batch
+from GcodeTools.gcode_stream import GcodeStream
+from GcodeTools.gcode_generator import GcodeGenerator
+from GcodeTools.gcode_profiler import Profiler
+from GcodeTools.gcode_progress import Progress, OperationCancelled
+from GcodeTools.gcode_async import GcodeAsync
+from GcodeTools.gcode_serial import SerialSender
+from GcodeTools.gcode_bgcode import Bgcode
+from GcodeTools.gcode_compression import Compression
+from GcodeTools.gcode_store import GcodeStore, StoredGcode
+from GcodeTools.gcode_export import Export
\ No newline at end of file
@@ -1,9 +1,13 @@
 from GcodeTools.gcode_types import *
 
+if typing.TYPE_CHECKING:
+    import concurrent.futures
+    from GcodeTools.gcode_profiler import Profiler
+
 
 class Gcode(list[Block]):
     
-    def __init__(self, filename = None, *, gcode_str = None, config = Config()):
+    def __init__(self, filename = None, *, gcode_str = None, config: Config|None = None, profiler: 'Profiler|None' = None):
         """
         Initializes a `Gcode` object.
 
@@ -11,8 +15,10 @@ class Gcode(list[Block]):
             filename: `str` - Path to a G-code file to load.
             gcode_str: `str` - A string containing G-code to parse.
             config: `Config` - Printer configuration for G-code.
+            profiler: `Profiler` - collects timings of parsing, metadata and writing stages.
         """
-        self.config = config
+        self.config = config if config is not None else Config()
+        self.profiler = profiler
         self.header = ''
         self.footer = ''
         self.objects: list[str] = []
@@ -32,32 +38,32 @@ class Gcode(list[Block]):
         return MetaParser
 
 
-    def __fill_meta__(self):
-        self.__get_meta_parser__().fill_meta(self)
+    def __fill_meta__(self, progress_callback: typing.Callable|None = None):
+        self.__get_meta_parser__().fill_meta(self, progress_callback)
 
 
-    def from_str(self, gcode_str: str, block = Block(), progress_callback: typing.Callable|None = None) -> 'Gcode':
+    def from_str(self, gcode_str: str, block: Block|None = None, progress_callback: typing.Callable|None = None) -> 'Gcode':
         """
         Args:
             gcode: `Gcode` or `None`. When `Gcode`, uses its config. When `None`, creates an empty `Gcode`
             gcode_str: `str` - string that will be parsed into `Gcode`
             block: `Block` - initial printer state
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`, also called while filling metadata
         """
         self: Gcode = self.__get_parser__().from_str(self, gcode_str, block, progress_callback)
-        self.__fill_meta__()
+        self.__fill_meta__(progress_callback)
         return self
 
-    def from_file(self, filename: str, block = Block(), progress_callback: typing.Callable|None = None) -> 'Gcode':
+    def from_file(self, filename: str, block: Block|None = None, progress_callback: typing.Callable|None = None) -> 'Gcode':
         """
         Args:
             gcode: `Gcode` or `None`. When `Gcode`, uses its config. When `None`, creates an empty `Gcode`
             filename: `str` - filename containing g-code to be parsed
             block: `Block` - initial printer state
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`, also called while filling metadata
         """
         self: Gcode = self.__get_parser__().from_file(self, filename, block, progress_callback)
-        self.__fill_meta__()
+        self.__fill_meta__(progress_callback)
         return self
 
     def write_str(self, verbose = False, progress_callback: typing.Callable|None = None):
@@ -67,7 +73,7 @@ class Gcode(list[Block]):
         Args:
             gcode: `Gcode`
             verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         Returns:
             str
         """
@@ -81,11 +87,66 @@ class Gcode(list[Block]):
             gcode: `Gcode`
             filename: `str` of output path
             verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         """
         return self.__get_parser__().write_file(self, filename, verbose, progress_callback)
 
 
+    async def afrom_str(self, gcode_str: str, block: Block|None = None, progress_callback: typing.Callable|None = None, executor: 'concurrent.futures.Executor|None' = None) -> 'Gcode':
+        """
+        `Gcode.from_str` which doesn't block the event loop, see `GcodeAsync`
+
+        Args:
+            executor: `concurrent.futures.Executor` running the parser. Defaults to the loop's default executor
+        """
+        from GcodeTools.gcode_async import GcodeAsync
+        return await GcodeAsync.from_str(self, gcode_str, block, progress_callback, executor)
+
+    async def afrom_file(self, filename: str, block: Block|None = None, progress_callback: typing.Callable|None = None, executor: 'concurrent.futures.Executor|None' = None) -> 'Gcode':
+        """
+        `Gcode.from_file` which doesn't block the event loop, see `GcodeAsync`
+
+        Args:
+            executor: `concurrent.futures.Executor` running the parser. Defaults to the loop's default executor
+        """
+        from GcodeTools.gcode_async import GcodeAsync
+        return await GcodeAsync.from_file(self, filename, block, progress_callback, executor)
+
+    async def awrite_file(self, filename: str, verbose = False, progress_callback: typing.Callable|None = None, executor: 'concurrent.futures.Executor|None' = None):
+        """
+        `Gcode.write_file` which doesn't block the event loop, see `GcodeAsync`
+
+        Args:
+            executor: `concurrent.futures.Executor` converting blocks to text. Defaults to the loop's default executor
+        """
+        from GcodeTools.gcode_async import GcodeAsync
+        return await GcodeAsync.write_file(self, filename, verbose, progress_callback, executor)
+
+
+    def save(self, filename: str, progress_callback: typing.Callable|None = None):
+        """
+        Save parsed `Gcode` into a binary container, which loads without parsing. See `GcodeStore`
+
+        Args:
+            filename: `str` of output path
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
+        """
+        from GcodeTools.gcode_store import GcodeStore
+        GcodeStore.save(self, filename, progress_callback)
+
+
+    @staticmethod
+    def load(filename: str) -> 'Gcode':
+        """
+        Load `Gcode` saved with `Gcode.save`. The file is memory mapped and blocks are created when accessed
+
+        Args:
+            filename: `str` - path to a container file
+        """
+        from GcodeTools.gcode_store import GcodeStore
+        return GcodeStore.load(filename)
+
+
     def new(self):
         """
         Create an empty G-code list with self's config
@@ -93,6 +154,7 @@ class Gcode(list[Block]):
         new = Gcode()
         new.config = self.config
         new.objects = self.objects
+        new.profiler = self.profiler
         return new
 
 
@@ -125,24 +187,28 @@ class Gcode(list[Block]):
         idx = index if index < len(self) else -1
         
         if len(self) == 0:
-            if block is None: block = Block(config=self.config)
+            if block is None: block = Block()
         else:
             last_index = idx - 1 * (idx > 0)
             
-            if block is None: block = self[last_index]
+            if block is None:
+                block = self[last_index].copy()
+                block.emit_command = True
+                block.position.E = 0
+        
+        gcode_obj = block.copy()
+        gcode_obj.command = gcode
         
         if compile:
             parser = self.__get_parser__()
-            position = self[max(idx, 0) - 1].position if len(self) else Vector()
-            gcode_objs = parser._parse_line(parser.ParserData(CoordSystem(position=position), Block(None, gcode, True, block, self.config)))
-            for idx, obj in enumerate(gcode_objs):
+            position = self[max(idx, 0) - 1].position.copy() if len(self) else Vector(F=self.config.speed)
+            gcode_objs = parser._parse_line(parser.ParserData(CoordSystem(position=position), gcode_obj), self.config)
+            for num, obj in enumerate(gcode_objs):
                 if idx == -1:
                     super().append(obj.block)
                 else:
-                    super().insert(index + idx, obj.block)
+                    super().insert(index + num, obj.block)
             return
-        gcode_obj = block
-        gcode_obj.command = gcode
         
         if idx == -1:
             super().append(gcode_obj)
@@ -230,11 +296,16 @@ class Gcode(list[Block]):
 
 
 
-    def block_to_str(self, block_id: int, verbose=False):
-        """Returns gcode string of `Block`"""
+    def block_to_str(self, block_id: int, verbose=False, prev: Block|None = None):
+        """
+        Returns gcode string of `Block`
+
+        Args:
+            prev: `Block` preceding the first `Block`, used when `Gcode` is a chunk of a stream
+        """
         
         current: Block = self[block_id]
-        if block_id < 1: prev = Block()
+        if block_id < 1: prev = prev or Block()
         else: prev: Block = self[block_id - 1]
 
         out = ''
@@ -0,0 +1,202 @@
+import asyncio
+import concurrent.futures
+import functools
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_parser import GcodeParser, MetaParser
+from GcodeTools.gcode_compression import Compression
+from GcodeTools.gcode_progress import Progress
+
+
+
+class GcodeAsync:
+    """
+    asyncio interface to parsing and writing. CPU work runs in an executor, file I/O is done in chunks,
+    so the event loop stays responsive while big files are processed.
+
+    `executor` is any `concurrent.futures.Executor`, by default the loop's default thread pool.
+    With a `ProcessPoolExecutor` many files can be analysed in parallel, but `progress_callback` and `Profiler`
+    must be picklable then.
+
+    Cancelling the awaiting task cancels a `Progress` passed as `progress_callback`, which stops the running worker.
+
+    Example:
+    ```
+    gcode = await Gcode().afrom_file('file.gcode')
+    await gcode.awrite_file('out.gcode')
+
+    async for block in GcodeAsync.iter_blocks('file.gcode'):
+        ...
+    ```
+    """
+
+    READ_SIZE = 1 << 20
+    """Number of characters read at once"""
+
+    CHUNK_SIZE = 10000
+    """Number of `Block`s written at once"""
+
+
+    @staticmethod
+    async def _run(executor: concurrent.futures.Executor|None, func: typing.Callable, *args, progress_callback = None):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, functools.partial(func, *args))
+        except asyncio.CancelledError:
+            if isinstance(progress_callback, Progress):
+                progress_callback.cancel()
+            raise
+
+
+    @staticmethod
+    async def read_file(filename: str, read_size: int|None = None) -> str:
+        """
+        Read text file in chunks, without blocking the event loop. Compressed files are decompressed in a background thread,
+        binary G-code is decoded in the default executor
+        """
+        from GcodeTools.gcode_bgcode import Bgcode
+        if await GcodeAsync._run(None, Bgcode.is_bgcode, filename):
+            return await GcodeAsync._run(None, Bgcode.to_str, filename)
+
+        read_size = read_size or GcodeAsync.READ_SIZE
+        f = await GcodeAsync._run(None, Compression.open, filename, 'r')
+        try:
+            parts = []
+            while True:
+                part = await GcodeAsync._run(None, f.read, read_size)
+                if not part:
+                    return ''.join(parts)
+                parts.append(part)
+        finally:
+            f.close()
+
+
+    @staticmethod
+    def _parse(gcode_str: str, config: Config, block: Block, progress_callback, profiler) -> Gcode:
+        gcode = Gcode(config=config, profiler=profiler)
+        GcodeParser.from_str(gcode, gcode_str, block, progress_callback)
+        MetaParser.fill_meta(gcode, progress_callback)
+        return gcode
+
+
+    @staticmethod
+    async def from_str(gcode: Gcode, gcode_str: str, block: Block|None = None, progress_callback: typing.Callable|None = None, executor: concurrent.futures.Executor|None = None) -> Gcode:
+        """
+        Parse string into `gcode` in `executor`, filling metadata
+
+        Args:
+            gcode: `Gcode` - uses its config, parsed blocks are appended to it
+            block: `Block` - initial printer state
+            progress_callback: `Callable(current: int, total: int)` or `Progress`. Called from the executor
+        """
+        parsed = await GcodeAsync._run(executor, GcodeAsync._parse, gcode_str, gcode.config, block, progress_callback, gcode.profiler, progress_callback=progress_callback)
+        gcode.__super__().extend(parsed)
+        gcode.objects = parsed.objects
+        return gcode
+
+
+    @staticmethod
+    async def from_file(gcode: Gcode, filename: str, block: Block|None = None, progress_callback: typing.Callable|None = None, executor: concurrent.futures.Executor|None = None) -> Gcode:
+        """
+        Read file in chunks and parse it into `gcode` in `executor`, filling metadata
+
+        Args:
+            gcode: `Gcode` - uses its config, parsed blocks are appended to it
+            block: `Block` - initial printer state
+            progress_callback: `Callable(current: int, total: int)` or `Progress`. Called from the executor
+        """
+        gcode_str = await GcodeAsync.read_file(filename)
+        return await GcodeAsync.from_str(gcode, gcode_str, block, progress_callback, executor)
+
+
+    @staticmethod
+    def _chunk_to_str(chunk: Gcode, verbose: bool, prev: Block|None) -> str:
+        return ''.join(chunk.block_to_str(i, verbose, prev) for i in range(len(chunk)))
+
+
+    @staticmethod
+    async def write_file(gcode: Gcode, filename: str, verbose = False, progress_callback: typing.Callable|None = None, executor: concurrent.futures.Executor|None = None, chunk_size: int|None = None):
+        """
+        Write `Gcode` into a file, as `Gcode.write_file` would. Blocks are converted in chunks in `executor`
+
+        Args:
+            verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
+            progress_callback: `Callable(current: int, total: int)` or `Progress`. Called from the event loop after each chunk
+            chunk_size: `int` - number of `Block`s converted at once
+        """
+        chunk_size = chunk_size or GcodeAsync.CHUNK_SIZE
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('write')
+        coords = CoordSystem(position=Vector(F=gcode.config.speed), abs_e=False)
+        len_blocks = len(gcode)
+
+        f = await GcodeAsync._run(None, Compression.open, filename, 'w')
+        try:
+            await GcodeAsync._run(None, f.write, gcode.header + '\n' + coords.to_str())
+            for start in range(0, len_blocks, chunk_size):
+                chunk = gcode[start:start + chunk_size]
+                chunk.profiler = None
+                prev = gcode[start - 1] if start else None
+                text = await GcodeAsync._run(executor, GcodeAsync._chunk_to_str, chunk, verbose, prev)
+                await GcodeAsync._run(None, f.write, text)
+                if progress_callback:
+                    progress_callback(min(start + chunk_size, len_blocks) - 1, len_blocks)
+            await GcodeAsync._run(None, f.write, '\n' + gcode.footer)
+        finally:
+            f.close()
+
+
+    @staticmethod
+    def _parse_lines(pd: GcodeParser.ParserData, lines: list[str], config: Config) -> tuple[list[Block], GcodeParser.ParserData]:
+        blocks = []
+        for line in lines:
+            if not line.strip():
+                continue
+            pd.block.command = line
+            list_pd = GcodeParser._parse_line(pd, config)
+            blocks += [num.block for num in list_pd]
+            pd = list_pd[-1]
+        return blocks, pd
+
+
+    @staticmethod
+    async def iter_chunks(filename: str, config: Config|None = None, block: Block|None = None, executor: concurrent.futures.Executor|None = None, read_size: int|None = None) -> typing.AsyncIterator[Gcode]:
+        """
+        Parse file lazily into `Gcode` chunks of about `read_size` characters.
+        Metadata (`layer`, `object`, `move_type`) is not filled, like in `GcodeStream`
+
+        Args:
+            config: `Config` of created chunks
+            block: `Block` - initial printer state
+            read_size: `int` - number of characters read and parsed at once
+        """
+        config = config or Config()
+        read_size = read_size or GcodeAsync.READ_SIZE
+        pd = GcodeParser._initial_state(config, block)
+
+        f = await GcodeAsync._run(None, Compression.open, filename, 'r')
+        try:
+            rest = ''
+            while True:
+                text = await GcodeAsync._run(None, f.read, read_size)
+                lines = (rest + text).split('\n')
+                rest = lines.pop() if text else ''
+
+                blocks, pd = await GcodeAsync._run(executor, GcodeAsync._parse_lines, pd, lines, config)
+                if blocks:
+                    chunk = Gcode(config=config)
+                    chunk.__super__().extend(blocks)
+                    yield chunk
+                if not text:
+                    return
+        finally:
+            f.close()
+
+
+    @staticmethod
+    async def iter_blocks(filename: str, config: Config|None = None, block: Block|None = None, executor: concurrent.futures.Executor|None = None, read_size: int|None = None) -> typing.AsyncIterator[Block]:
+        """
+        Parse file lazily, one `Block` at a time. See `GcodeAsync.iter_chunks`
+        """
+        async for chunk in GcodeAsync.iter_chunks(filename, config, block, executor, read_size):
+            for item in chunk:
+                yield item
@@ -0,0 +1,249 @@
+import json
+import os
+import time
+import typing
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_tools import Tools
+from GcodeTools.gcode_meta_reader import MetaReader
+
+
+
+class Batch:
+    """
+    Applies a pipeline of operations to many G-code files using a pool of worker processes.
+
+    Each operation is either its name or a (`name`, `dict` of arguments) tuple:
+    - `parse`: `speed`, `step`, `precision` - parse with a custom `Config`. Done automatically if not listed
+    - `trim`
+    - `translate`: `X`, `Y`, `Z`
+    - `rotate`: `deg`
+    - `scale`: `factor`
+    - `stats`: adds blocks, layers, objects, filament used, bounding box, estimated time and slicer to the results
+    - `thumbnail`: `resolution` - renders a png into `output_dir` (requires `GcodeTools[Thumbnails]`)
+    - `write`: `suffix` - writes G-code into `output_dir`
+
+    Example:
+    ```
+    results = Batch.run(['gcodes/'], ['trim', ('translate', {'X': 10}), 'stats', 'write'], output_dir='out')
+    Batch.write_summary(results, 'out/summary.json')
+    ```
+    """
+
+    OPERATIONS = ['parse', 'trim', 'translate', 'rotate', 'scale', 'stats', 'thumbnail', 'write']
+
+
+    @staticmethod
+    def find_files(paths: list[str], extensions = ('.gcode',)) -> list[str]:
+        """
+        Expand directories in `paths` into G-code files they contain (non-recursive), sorted by name
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(extensions))
+            else:
+                files.append(path)
+        return files
+
+
+    @staticmethod
+    def normalize_operations(operations: list[str|tuple[str, dict]]) -> list[tuple[str, dict]]:
+        """
+        Returns operations as a list of (`name`, `kwargs`), with `parse` as the first one
+        """
+        normalized = []
+        for op in operations:
+            name, kwargs = (op, {}) if isinstance(op, str) else (op[0], dict(op[1]))
+            if name not in Batch.OPERATIONS:
+                raise ValueError(f'Unknown batch operation: {name}. Available: {", ".join(Batch.OPERATIONS)}')
+            normalized.append((name, kwargs))
+
+        if not normalized or normalized[0][0] != 'parse':
+            normalized.insert(0, ('parse', {}))
+        if [name for name, _ in normalized].count('parse') > 1:
+            raise ValueError('`parse` can only be the first batch operation')
+        return normalized
+
+
+    @staticmethod
+    def stats(gcode: Gcode) -> dict:
+        """
+        Summary of `Gcode`: blocks, layers, objects, filament used [mm], bounding box and estimated time [s]
+        """
+        filament = 0.0
+        duration = 0.0
+        prev = None
+        for block in gcode:
+            pos = block.position
+            if pos.E > 0: filament += pos.E
+            if prev is not None and pos.F:
+                distance = float(pos.xyz() - prev.xyz())
+                if distance == 0: distance = abs(pos.E)
+                duration += distance * 60 / pos.F
+            prev = pos
+
+        low, high = Tools.get_bounding_box(gcode) if len(gcode) else (Vector(), Vector())
+        return {
+            'blocks': len(gcode),
+            'layers': max((block.layer for block in gcode), default=0),
+            'objects': list(gcode.objects),
+            'filament_mm': round(filament, 3),
+            'estimated_time_s': round(duration, 1),
+            'bounding_box': [[low.X, low.Y, low.Z], [high.X, high.Y, high.Z]],
+        }
+
+
+    @staticmethod
+    def _init_worker(memory_limit: int|None):
+        if not memory_limit:
+            return
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        except (ImportError, ValueError, OSError):
+            print('Warning: memory limit is not supported on this platform')
+
+
+    @staticmethod
+    def _on_timeout(signum, frame):
+        raise TimeoutError('Processing timed out')
+
+
+    @staticmethod
+    def process_file(path: str, operations: list[tuple[str, dict]], output_dir: str|None = None, timeout: float|None = None) -> dict:
+        """
+        Apply normalized `operations` to a single file. Never raises, errors are reported in the result
+
+        Returns:
+            `dict` with `file`, `status` (`ok`, `error`, `timeout` or `memory`), `time`, `outputs` and optional `error`, `stats`, `slicer`
+        """
+        result = {'file': path, 'status': 'ok', 'outputs': []}
+        start = time.perf_counter()
+        name = os.path.splitext(os.path.basename(path))[0]
+
+        alarm = None
+        if timeout:
+            try:
+                import signal
+                alarm = signal.signal(signal.SIGALRM, Batch._on_timeout)
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            except (ImportError, AttributeError, ValueError):
+                print('Warning: per-file timeout is not supported on this platform')
+
+        try:
+            gcode = None
+            for op, kwargs in operations:
+                if op == 'parse':
+                    config = Config()
+                    for key, value in kwargs.items():
+                        setattr(config, key, value)
+                    gcode = Gcode(config=config).from_file(path)
+                elif op == 'trim':
+                    gcode = Tools.trim(gcode)
+                elif op == 'translate':
+                    gcode = Tools.translate(gcode, Vector(kwargs.get('X', 0), kwargs.get('Y', 0), kwargs.get('Z', 0)))
+                elif op == 'rotate':
+                    gcode = Tools.rotate(gcode, kwargs.get('deg', 0))
+                elif op == 'scale':
+                    gcode = Tools.scale(gcode, kwargs.get('factor', 1))
+                elif op == 'stats':
+                    result['stats'] = Batch.stats(gcode)
+                    result['slicer'] = MetaReader.get_slicer_name(path)
+                elif op == 'thumbnail':
+                    from GcodeTools.Thumbnails.gcode_thumbnails import Thumbnails
+                    if output_dir is None: raise ValueError('`thumbnail` requires output_dir')
+                    out_path = os.path.join(output_dir, name + '.png')
+                    Thumbnails.generate_thumbnail(Tools.split(gcode)[2], resolution=kwargs.get('resolution', 500)).save(out_path)
+                    result['outputs'].append(out_path)
+                elif op == 'write':
+                    if output_dir is None: raise ValueError('`write` requires output_dir')
+                    out_path = os.path.join(output_dir, name + kwargs.get('suffix', '.gcode'))
+                    if os.path.abspath(out_path) == os.path.abspath(path):
+                        raise ValueError('`write` would overwrite the input file')
+                    gcode.write_file(out_path)
+                    result['outputs'].append(out_path)
+        except TimeoutError as e:
+            result['status'] = 'timeout'
+            result['error'] = str(e)
+        except MemoryError:
+            result['status'] = 'memory'
+            result['error'] = 'Memory limit exceeded'
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = f'{type(e).__name__}: {e}'
+        finally:
+            if alarm is not None:
+                import signal
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, alarm)
+
+        result['time'] = round(time.perf_counter() - start, 3)
+        return result
+
+
+    @staticmethod
+    def run(paths: list[str], operations: list[str|tuple[str, dict]], *, output_dir: str|None = None, workers: int|None = None, timeout: float|None = None, memory_limit: int|None = None, progress_callback: typing.Callable|None = None) -> list[dict]:
+        """
+        Process many G-code files in parallel
+
+        Args:
+            paths: `list[str]` of files or directories containing `.gcode` files
+            operations: `list` of operations, see `Batch`
+            output_dir: `str` - directory for `write` and `thumbnail` outputs. Created if missing
+            workers: `int` - number of worker processes. Defaults to CPU count
+            timeout: `float` - per-file timeout in seconds (POSIX only)
+            memory_limit: `int` - address space limit of each worker in bytes (POSIX only)
+            progress_callback: `Callable(current: int, total: int)`, called after each finished file
+        Returns:
+            `list[dict]` of per-file results (see `Batch.process_file`), in the order of files
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        files = Batch.find_files(paths)
+        operations = Batch.normalize_operations(operations)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        if not files:
+            return []
+
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        results: dict[str, dict] = {}
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=Batch._init_worker, initargs=(memory_limit,)) as executor:
+            futures = {executor.submit(Batch.process_file, path, operations, output_dir, timeout): path for path in files}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = {'file': path, 'status': 'error', 'error': f'{type(e).__name__}: {e}', 'outputs': []}
+                if progress_callback:
+                    progress_callback(len(results), len(files))
+
+        return [results[path] for path in files]
+
+
+    @staticmethod
+    def summary(results: list[dict]) -> dict:
+        """
+        JSON-serializable summary of `Batch.run` results
+        """
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return {
+            'total': len(results),
+            'status': counts,
+            'time': round(sum(result.get('time', 0) for result in results), 3),
+            'files': results,
+        }
+
+
+    @staticmethod
+    def write_summary(results: list[dict], filename: str):
+        """
+        Write JSON summary of `Batch.run` results
+        """
+        with open(filename, 'w') as f:
+            json.dump(Batch.summary(results), f, indent=4)
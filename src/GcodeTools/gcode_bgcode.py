@@ -0,0 +1,663 @@
+import base64
+import contextlib
+import re
+import struct
+import time
+import zlib
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_progress import Progress
+from GcodeTools.gcode_meta_reader import MetaReader
+
+
+
+class Heatshrink:
+    """
+    Pure-Python heatshrink (LZSS) codec, as used by `.bgcode`.
+    When the `heatshrink2` package is installed, it is used instead.
+    """
+
+    MIN_MATCH = 3
+    CHAIN_DEPTH = 8
+    """Number of earlier occurrences checked for each match"""
+
+    _LITERALS = ['1' + format(byte, '08b') for byte in range(256)]
+    _indices: dict[int, list[str]] = {}
+
+
+    @staticmethod
+    def _native():
+        try:
+            import heatshrink2
+            return heatshrink2
+        except ImportError:
+            return None
+
+
+    @staticmethod
+    def _index_bits(bits: int) -> list[str]:
+        if bits not in Heatshrink._indices:
+            Heatshrink._indices[bits] = [format(value, f'0{bits}b') for value in range(1 << bits)]
+        return Heatshrink._indices[bits]
+
+
+    @staticmethod
+    def compress(data: bytes, window: int = 12, lookahead: int = 4, native = True) -> bytes:
+        """
+        Args:
+            window: `int` - window size as a power of 2
+            lookahead: `int` - lookahead size as a power of 2
+            native: `bool` - use `heatshrink2` when available
+        """
+        hs = Heatshrink._native() if native else None
+        if hs is not None:
+            return hs.compress(data, window_sz2=window, lookahead_sz2=lookahead)
+
+        data = bytes(data)
+        n = len(data)
+        window_size = 1 << window
+        max_len = 1 << lookahead
+        literals = Heatshrink._LITERALS
+        offsets = ['0' + bits for bits in Heatshrink._index_bits(window)]
+        counts = Heatshrink._index_bits(lookahead)
+
+        head: dict[bytes, int] = {}
+        chain = [-1] * n
+        out = []
+        i = 0
+        while i < n:
+            best_len = 0
+            best_off = 0
+            if i + Heatshrink.MIN_MATCH <= n:
+                key = data[i:i + 3]
+                cand = head.get(key, -1)
+                chain[i] = cand
+                head[key] = i
+                limit = i - window_size
+                longest = min(max_len, n - i)
+                depth = Heatshrink.CHAIN_DEPTH
+                while cand >= limit and cand >= 0 and depth:
+                    length = 3
+                    while length < longest and data[cand + length] == data[i + length]:
+                        length += 1
+                    if length > best_len:
+                        best_len, best_off = length, i - cand
+                        if length == longest:
+                            break
+                    cand = chain[cand]
+                    depth -= 1
+
+            if best_len >= Heatshrink.MIN_MATCH:
+                out.append(offsets[best_off - 1])
+                out.append(counts[best_len - 1])
+                for j in range(i + 1, min(i + best_len, n - 2)):
+                    key = data[j:j + 3]
+                    chain[j] = head.get(key, -1)
+                    head[key] = j
+                i += best_len
+            else:
+                out.append(literals[data[i]])
+                i += 1
+
+        bits = ''.join(out)
+        bits += '0' * (-len(bits) % 8)
+        return int('1' + bits, 2).to_bytes(len(bits) // 8 + 1, 'big')[1:]
+
+
+    @staticmethod
+    def decompress(data: bytes, window: int = 12, lookahead: int = 4, native = True) -> bytes:
+        """
+        Args:
+            window: `int` - window size as a power of 2
+            lookahead: `int` - lookahead size as a power of 2
+            native: `bool` - use `heatshrink2` when available
+        """
+        hs = Heatshrink._native() if native else None
+        if hs is not None:
+            return hs.decompress(data, window_sz2=window, lookahead_sz2=lookahead)
+
+        bits = bin(int.from_bytes(b'\x01' + bytes(data), 'big'))[3:]
+        n = len(bits)
+        backref = 1 + window + lookahead
+        out = bytearray()
+        i = 0
+        while i < n:
+            if bits[i] == '1':
+                if i + 9 > n: break
+                out.append(int(bits[i + 1:i + 9], 2))
+                i += 9
+                continue
+
+            if i + backref > n: break
+            offset = int(bits[i + 1:i + 1 + window], 2) + 1
+            count = int(bits[i + 1 + window:i + backref], 2) + 1
+            i += backref
+
+            start = len(out) - offset
+            if start < 0:
+                # the window is initially filled with zeros
+                zeros = min(-start, count)
+                out += bytes(zeros)
+                count -= zeros
+                start = len(out) - offset
+            if offset >= count:
+                out += out[start:start + count]
+            else:
+                for _ in range(count):
+                    out.append(out[-offset])
+        return bytes(out)
+
+
+
+class MeatPack:
+    """
+    MeatPack G-code encoding: the most common characters are packed in pairs into single bytes.
+    Follows the decoder in Marlin and Prusa firmware: every line starts on a byte boundary
+    and spaces in commands are dropped and restored (`no spaces` mode)
+    """
+
+    SIGNAL = b'\xff\xff'
+    ENABLE_PACKING = 251
+    DISABLE_PACKING = 250
+    RESET_ALL = 249
+    ENABLE_NO_SPACES = 247
+    DISABLE_NO_SPACES = 246
+
+    CHARS = b'0123456789. \nGX'
+    CHARS_NO_SPACES = b'0123456789.E\nGX'
+
+    # space between a number and the next parameter, e.g. `X1.5 Y2`
+    SPACE = re.compile(rb'(?<=[0-9.]) (?=[A-Z][-0-9.])')
+    NO_SPACE = re.compile(rb'(?<=[0-9.])(?=[A-Z][-0-9.])')
+    COMMENT = re.compile(rb'(;[^\n]*)')
+
+
+    @staticmethod
+    def _tables(chars: bytes):
+        encode = bytearray([15] * 256)
+        for code, char in enumerate(chars):
+            encode[char] = code
+        decode = []
+        for byte in range(256):
+            low, high = byte & 15, byte >> 4
+            if low == 12:
+                decode.append(b'\n')
+            elif low == 15 or high == 15:
+                decode.append(None)
+            else:
+                decode.append(bytes([chars[low], chars[high]]))
+        escapes = bytes(byte for byte in range(256) if decode[byte] is None)
+        # characters of escaped bytes, `None` for the ones sent in full after the byte
+        literals = [(None if byte & 15 == 15 else chars[byte & 15:(byte & 15) + 1], None if byte >> 4 == 15 else chars[byte >> 4:(byte >> 4) + 1]) for byte in range(256)]
+        return bytes(encode), decode, re.compile(b'[' + re.escape(escapes) + b']'), literals
+
+    _TABLES = {False: _tables(CHARS), True: _tables(CHARS_NO_SPACES)}
+    _HIGH = bytes((byte << 4) & 0xff for byte in range(256))
+
+
+    @staticmethod
+    def encode(text: bytes, comments = True) -> bytes:
+        """
+        Encode G-code with packing and `no spaces` enabled
+
+        Args:
+            text: `bytes` - G-code lines
+            comments: `bool` - keep comments, otherwise they are stripped
+        """
+        lines = []
+        for line in text.split(b'\n'):
+            command, sep, comment = line.partition(b';')
+            command = MeatPack.SPACE.sub(b'', command.lstrip() if sep and comments else command.strip())
+            line = command + sep + comment if comments else command
+            if not line.strip():
+                continue
+            # pad odd lines, a character packed after a newline is ignored
+            lines.append(line + b'\n' if len(line) % 2 else line + b'\n\n')
+        text = b''.join(lines)
+
+        encode, _, escape, _ = MeatPack._TABLES[True]
+        codes = text.translate(encode)
+        low = codes[0::2]
+        high = codes[1::2].translate(MeatPack._HIGH)
+        packed = (int.from_bytes(low, 'little') | int.from_bytes(high, 'little')).to_bytes(len(low), 'little')
+
+        out = [bytes([0xff, 0xff, MeatPack.ENABLE_PACKING, 0xff, 0xff, MeatPack.ENABLE_NO_SPACES])]
+        pos = 0
+        for match in escape.finditer(packed):
+            idx = match.start()
+            byte = packed[idx]
+            out.append(packed[pos:idx + 1])
+            if byte & 15 == 15: out.append(text[2 * idx:2 * idx + 1])
+            if byte >> 4 == 15: out.append(text[2 * idx + 1:2 * idx + 2])
+            pos = idx + 1
+        out.append(packed[pos:])
+        return b''.join(out)
+
+
+    class Decoder:
+        """Decoder state, kept between blocks of a file"""
+        def __init__(self):
+            self.packing = False
+            self.no_spaces = False
+
+
+        def decode(self, data: bytes) -> bytes:
+            out = []
+            pos = 0
+            n = len(data)
+            restore = self.no_spaces
+            while pos < n:
+                if not self.packing:
+                    idx = data.find(MeatPack.SIGNAL, pos)
+                    idx = n if idx < 0 else idx
+                    out.append(data[pos:idx])
+                    pos = idx
+                else:
+                    _, decode, escape, literals = MeatPack._TABLES[self.no_spaces]
+                    search = escape.search
+                    decode_byte = decode.__getitem__
+                    while True:
+                        match = search(data, pos)
+                        idx = match.start() if match else n
+                        if idx > pos:
+                            out.append(b''.join(map(decode_byte, data[pos:idx])))
+                        pos = idx
+                        if pos >= n or data[pos + 1:pos + 2] == b'\xff' and data[pos] == 0xff:
+                            break
+                        first, second = literals[data[pos]]
+                        if first is None:
+                            if second is None:
+                                out.append(data[pos + 1:pos + 3])
+                                pos += 3
+                            else:
+                                out.append(data[pos + 1:pos + 2] + second)
+                                pos += 2
+                        else:
+                            out.append(first + data[pos + 1:pos + 2])
+                            pos += 2
+
+                if data[pos:pos + 2] == MeatPack.SIGNAL and pos + 2 < n:
+                    command = data[pos + 2]
+                    if command == MeatPack.ENABLE_PACKING: self.packing = True
+                    elif command == MeatPack.DISABLE_PACKING: self.packing = False
+                    elif command == MeatPack.ENABLE_NO_SPACES: self.no_spaces = restore = True
+                    elif command == MeatPack.DISABLE_NO_SPACES: self.no_spaces = False
+                    elif command == MeatPack.RESET_ALL: self.packing = self.no_spaces = False
+                    pos += 3
+                elif pos < n:
+                    out.append(data[pos:pos + 1])
+                    pos += 1
+
+            text = b''.join(out)
+            if not restore:
+                return text
+            # comments are kept as they are, spaces are restored in commands
+            parts = MeatPack.COMMENT.split(text)
+            parts[0::2] = [MeatPack.NO_SPACE.sub(b' ', part) for part in parts[0::2]]
+            return b''.join(parts)
+
+
+    @staticmethod
+    def decode(data: bytes) -> bytes:
+        """Decode a MeatPack stream into G-code"""
+        return MeatPack.Decoder().decode(data)
+
+
+
+class Bgcode:
+    """
+    Prusa binary G-code (`.bgcode`) reader and writer.
+
+    Reading converts the file into ASCII G-code, like `libbgcode` does: file and printer metadata,
+    thumbnails, G-code, print metadata and slicer config as comments, so `Tools` and `MetaReader` work as usual.
+    Writing moves thumbnails and slicer config from comments into the native blocks.
+
+    `Gcode.from_file` and `Gcode.write_file` use it for files starting with `GCDE` or ending with `.bgcode`.
+
+    Example:
+    ```
+    gcode = Gcode('file.bgcode')
+    Bgcode.write_file(gcode, 'out.bgcode', compression='deflate')
+    thumbnails = Bgcode.read_thumbnails('file.bgcode')
+    ```
+    """
+
+    MAGIC = b'GCDE'
+    VERSION = 1
+
+    FILE_METADATA = 0
+    GCODE = 1
+    SLICER_METADATA = 2
+    PRINTER_METADATA = 3
+    PRINT_METADATA = 4
+    THUMBNAIL = 5
+
+    COMPRESSION = {'none': 0, 'deflate': 1, 'heatshrink_11_4': 2, 'heatshrink_12_4': 3}
+    ENCODING = {'none': 0, 'meatpack': 1, 'meatpack_comments': 2}
+    THUMBNAIL_FORMATS = {0: 'PNG', 1: 'JPG', 2: 'QOI'}
+
+    GCODE_BLOCK_SIZE = 65535
+    """Uncompressed size of G-code blocks"""
+
+    PRINTER_KEYS = ['printer_model', 'filament_type', 'nozzle_diameter', 'bed_temperature', 'temperature', 'layer_height', 'fill_density', 'brim_width', 'extruder_colour']
+    """Config keys copied into printer metadata, which is read by the printer"""
+
+    PRINT_STATS = re.compile(r'^; ?(filament used|filament cost|total filament|estimated printing time|estimated first layer|total toolchanges|total layers count|objects_info)')
+    METADATA_LINE = re.compile(r'^; ?([^=;]+?) ?= ?(.*)$')
+    THUMBNAIL_BEGIN = re.compile(r'^; ?thumbnail(?:_(\w+))? begin (\d+)x(\d+)')
+    CONFIG_BEGIN = re.compile(r'^; ?(?:CONFIG_BLOCK_START|\w+_config = begin)')
+    CONFIG_END = re.compile(r'^; ?(?:CONFIG_BLOCK_END|\w+_config = end)')
+    BASE64_LINE = re.compile(r'^; ?[A-Za-z0-9+/=]+$')
+    MOVE = re.compile(r'^G[0-3] .*[XYZE]')
+    """Header metadata ends at the first move"""
+
+
+    @staticmethod
+    def is_bgcode(filename: str) -> bool:
+        """Checks the magic number of a file"""
+        with open(filename, 'rb') as f:
+            return f.read(4) == Bgcode.MAGIC
+
+
+    @staticmethod
+    def _compress(data: bytes, compression: int) -> bytes:
+        if compression == 1: return zlib.compress(data)
+        if compression == 2: return Heatshrink.compress(data, 11, 4)
+        if compression == 3: return Heatshrink.compress(data, 12, 4)
+        return data
+
+
+    @staticmethod
+    def _decompress(data: bytes, compression: int) -> bytes:
+        if compression == 1: return zlib.decompress(data)
+        if compression == 2: return Heatshrink.decompress(data, 11, 4)
+        if compression == 3: return Heatshrink.decompress(data, 12, 4)
+        return data
+
+
+    @staticmethod
+    def iter_blocks(f: typing.BinaryIO, skip: typing.Container[int] = ()) -> typing.Iterator[tuple[int, tuple[int, ...], bytes|None]]:
+        """
+        Read blocks of an open `.bgcode` file
+
+        Args:
+            f: `BinaryIO` - file positioned at its beginning
+            skip: `Container[int]` - block types which are not read nor decompressed, their data is `None`
+        Returns:
+            `Iterator` of (`block_type`, `params`, `data`). `params` is (`encoding`,) or (`format`, `width`, `height`) for thumbnails
+        """
+        header = f.read(10)
+        if len(header) < 10 or header[:4] != Bgcode.MAGIC:
+            raise ValueError('Not a binary G-code file')
+        _, checksum_type = struct.unpack('<IH', header[4:])
+
+        while True:
+            block_header = f.read(8)
+            if not block_header:
+                return
+            if len(block_header) < 8:
+                raise ValueError('Truncated binary G-code block')
+            block_type, compression, size = struct.unpack('<HHI', block_header)
+            if compression:
+                block_header += f.read(4)
+                stored_size = struct.unpack('<I', block_header[8:12])[0]
+            else:
+                stored_size = size
+            params_size = 6 if block_type == Bgcode.THUMBNAIL else 2
+            params_raw = f.read(params_size)
+            params = struct.unpack('<HHH' if block_type == Bgcode.THUMBNAIL else '<H', params_raw)
+
+            if block_type in skip:
+                f.seek(stored_size + (4 if checksum_type else 0), 1)
+                yield block_type, params, None
+                continue
+
+            data = f.read(stored_size)
+            if checksum_type:
+                crc = struct.unpack('<I', f.read(4))[0]
+                if zlib.crc32(data, zlib.crc32(params_raw, zlib.crc32(block_header))) != crc:
+                    raise ValueError(f'Binary G-code block checksum mismatch at byte {f.tell()}')
+            yield block_type, params, Bgcode._decompress(data, compression)
+
+
+    @staticmethod
+    def _parse_ini(data: bytes) -> dict[str, str]:
+        metadata = {}
+        for line in data.decode('utf-8', 'replace').splitlines():
+            key, sep, value = line.partition('=')
+            if sep:
+                metadata[key.strip()] = value.strip()
+        return metadata
+
+
+    @staticmethod
+    def read_metadata(filename: str) -> dict[str, dict[str, str]]:
+        """
+        Read metadata blocks without decoding G-code
+
+        Returns:
+            {`file`|`printer`|`print`|`slicer`: {`key`: `value`}}
+        """
+        names = {Bgcode.FILE_METADATA: 'file', Bgcode.PRINTER_METADATA: 'printer', Bgcode.PRINT_METADATA: 'print', Bgcode.SLICER_METADATA: 'slicer'}
+        metadata = {name: {} for name in names.values()}
+        with open(filename, 'rb') as f:
+            for block_type, _, data in Bgcode.iter_blocks(f, skip=(Bgcode.GCODE, Bgcode.THUMBNAIL)):
+                if block_type in names:
+                    metadata[names[block_type]].update(Bgcode._parse_ini(data))
+        return metadata
+
+
+    @staticmethod
+    def read_thumbnails(filename: str) -> list[bytes]:
+        """
+        Get all thumbnails of a `.bgcode` file, ordered as appearing in the file
+        """
+        with open(filename, 'rb') as f:
+            return [data for block_type, _, data in Bgcode.iter_blocks(f, skip=(Bgcode.GCODE,)) if block_type == Bgcode.THUMBNAIL]
+
+
+    @staticmethod
+    def _thumbnail_lines(params: tuple[int, ...], data: bytes) -> list[str]:
+        fmt = Bgcode.THUMBNAIL_FORMATS.get(params[0], 'PNG')
+        name = 'thumbnail' if fmt == 'PNG' else f'thumbnail_{fmt}'
+        text = base64.b64encode(data).decode()
+        lines = [f'; {name} begin {params[1]}x{params[2]} {len(text)}']
+        lines += ['; ' + text[i:i + 78] for i in range(0, len(text), 78)]
+        lines += [f'; {name} end']
+        return lines
+
+
+    @staticmethod
+    def iter_lines(filename: str) -> typing.Iterator[str]:
+        """
+        Read `.bgcode` file as ASCII G-code lines. G-code blocks are decoded one at a time
+        """
+        decoder = MeatPack.Decoder()
+        tail = []
+        with open(filename, 'rb') as f:
+            for block_type, params, data in Bgcode.iter_blocks(f):
+                if block_type == Bgcode.GCODE:
+                    if params[0]:
+                        data = decoder.decode(data)
+                    yield from data.decode('utf-8', 'replace').split('\n')
+                elif block_type == Bgcode.THUMBNAIL:
+                    yield from Bgcode._thumbnail_lines(params, data)
+                elif block_type == Bgcode.FILE_METADATA:
+                    for key, value in Bgcode._parse_ini(data).items():
+                        yield f'; generated by {value}' if key == 'Producer' else f'; {key} = {value}'
+                elif block_type == Bgcode.PRINTER_METADATA:
+                    yield from (f'; {key} = {value}' for key, value in Bgcode._parse_ini(data).items())
+                elif block_type == Bgcode.PRINT_METADATA:
+                    tail += [f'; {key} = {value}' for key, value in Bgcode._parse_ini(data).items()]
+                elif block_type == Bgcode.SLICER_METADATA:
+                    config = Bgcode._parse_ini(data)
+                    if config:
+                        tail += ['; prusaslicer_config = begin']
+                        tail += [f'; {key} = {value}' for key, value in config.items()]
+                        tail += ['; prusaslicer_config = end']
+
+        yield from tail
+
+
+    @staticmethod
+    def to_str(filename: str) -> str:
+        """
+        Read `.bgcode` file as ASCII G-code
+        """
+        return '\n'.join(Bgcode.iter_lines(filename))
+
+
+    @staticmethod
+    def _block(block_type: int, params: bytes, data: bytes, compression: int, checksum: bool) -> bytes:
+        stored = Bgcode._compress(data, compression)
+        if compression and len(stored) >= len(data):
+            compression, stored = 0, data
+        header = struct.pack('<HHI', block_type, compression, len(data))
+        if compression:
+            header += struct.pack('<I', len(stored))
+        block = header + params + stored
+        if checksum:
+            block += struct.pack('<I', zlib.crc32(block))
+        return block
+
+
+    @staticmethod
+    def _metadata_block(block_type: int, metadata: dict[str, str], compression: int, checksum: bool) -> bytes:
+        data = ''.join(f'{key}={value}\n' for key, value in metadata.items()).encode()
+        return Bgcode._block(block_type, struct.pack('<H', 0), data, compression, checksum)
+
+
+    @staticmethod
+    def _split(lines: typing.Iterable[str]) -> tuple[dict, dict, dict, dict, list, list[str]]:
+        """Separates metadata, thumbnails and config from G-code lines"""
+        file_meta = {}
+        printer = {}
+        printer_done = False
+        stats = {}
+        config = {}
+        thumbnails = []
+        gcode: list[str] = []
+
+        thumbnail = None
+        in_config = False
+        for line in lines:
+            text = line.strip()
+            if thumbnail is not None:
+                if re.match(r'^; ?thumbnail(_\w+)? end', text):
+                    thumbnails.append((thumbnail[0], base64.b64decode(''.join(thumbnail[1]))))
+                    thumbnail = None
+                elif Bgcode.BASE64_LINE.match(text):
+                    thumbnail[1].append(text.removeprefix(';').strip())
+                continue
+            if in_config:
+                if Bgcode.CONFIG_END.match(text):
+                    in_config = False
+                    continue
+                match = Bgcode.METADATA_LINE.match(text)
+                if match: config[match.group(1)] = match.group(2)
+                continue
+
+            if not text.startswith(';'):
+                if Bgcode.MOVE.match(text): printer_done = True
+                gcode.append(line)
+                continue
+
+            match = Bgcode.THUMBNAIL_BEGIN.match(text)
+            if match:
+                fmt = {'JPG': 1, 'QOI': 2}.get((match.group(1) or 'PNG').upper(), 0)
+                thumbnail = ((fmt, int(match.group(2)), int(match.group(3))), [])
+                continue
+            if Bgcode.CONFIG_BEGIN.match(text):
+                in_config = True
+                continue
+            if 'Producer' not in file_meta and not printer_done and re.match(r'^; ?generated by ', text, re.IGNORECASE):
+                file_meta['Producer'] = re.sub(r'^; ?generated by ', '', text, flags=re.IGNORECASE)
+                continue
+            match = Bgcode.METADATA_LINE.match(text)
+            if match and Bgcode.PRINT_STATS.match(text):
+                stats[match.group(1)] = match.group(2)
+                continue
+            if match and not printer_done:
+                printer[match.group(1)] = match.group(2)
+                continue
+            gcode.append(line)
+
+        if 'Producer' not in file_meta:
+            slicer = MetaReader.parse_slicer_name([line.strip() for line in gcode[:50] if line.strip()])
+            file_meta['Producer'] = ' '.join(slicer) if slicer else 'GcodeTools'
+        for key in Bgcode.PRINTER_KEYS:
+            if key in config and key not in printer:
+                printer[key] = config[key]
+        return file_meta, printer, stats, config, thumbnails, gcode
+
+
+    @staticmethod
+    def write_file(gcode: Gcode, filename: str, verbose = False, progress_callback: typing.Callable|None = None,
+                   compression = 'heatshrink_12_4', encoding = 'meatpack_comments', meta_compression = 'deflate', checksum = True):
+        """
+        Write `Gcode` as a `.bgcode` file
+
+        Args:
+            gcode: `Gcode`
+            filename: `str` of output path
+            verbose: `bool` - include Block's metadata for each line
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
+            compression: `str` - G-code compression: `none`, `deflate`, `heatshrink_11_4` or `heatshrink_12_4`
+            encoding: `str` - G-code encoding: `none`, `meatpack` (strips comments) or `meatpack_comments`
+            meta_compression: `str` - compression of metadata blocks
+            checksum: `bool` - add CRC32 to every block
+        """
+        if compression not in Bgcode.COMPRESSION: raise ValueError(f'Unknown compression: {compression}')
+        if encoding not in Bgcode.ENCODING: raise ValueError(f'Unknown encoding: {encoding}')
+        if meta_compression not in Bgcode.COMPRESSION: raise ValueError(f'Unknown compression: {meta_compression}')
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('write')
+
+        len_blocks = len(gcode)
+        profiler = gcode.profiler
+        gcode_compression = Bgcode.COMPRESSION[compression]
+        meta = Bgcode.COMPRESSION[meta_compression]
+        gcode_encoding = Bgcode.ENCODING[encoding]
+
+        def lines():
+            coords = CoordSystem(position=Vector(F=gcode.config.speed), abs_e=False)
+            yield from (gcode.header + '\n' + coords.to_str()).split('\n')
+            for i in range(len_blocks):
+                yield from gcode.block_to_str(i, verbose).split('\n')
+                if progress_callback:
+                    progress_callback(i, len_blocks)
+            yield from ('\n' + gcode.footer).split('\n')
+
+        with profiler.stage('write', lines=len_blocks) if profiler else contextlib.nullcontext({}) as args:
+            file_meta, printer, stats, config, thumbnails, gcode_lines = Bgcode._split(lines())
+
+            blocks = [Bgcode._metadata_block(Bgcode.FILE_METADATA, file_meta, meta, checksum)]
+            blocks.append(Bgcode._metadata_block(Bgcode.PRINTER_METADATA, printer, meta, checksum))
+            for (fmt, width, height), data in thumbnails:
+                blocks.append(Bgcode._block(Bgcode.THUMBNAIL, struct.pack('<HHH', fmt, width, height), data, 0, checksum))
+            blocks.append(Bgcode._metadata_block(Bgcode.PRINT_METADATA, stats, meta, checksum))
+            blocks.append(Bgcode._metadata_block(Bgcode.SLICER_METADATA, config, meta, checksum))
+
+            encode_time = 0.0
+            chunk = []
+            size = 0
+            for line in gcode_lines + [None]:
+                if line is not None:
+                    chunk.append(line)
+                    size += len(line) + 1
+                if size >= Bgcode.GCODE_BLOCK_SIZE or (line is None and chunk):
+                    if profiler: start = time.perf_counter()
+                    data = '\n'.join(chunk).encode() + b'\n'
+                    if gcode_encoding:
+                        data = MeatPack.encode(data, gcode_encoding == 2)
+                    blocks.append(Bgcode._block(Bgcode.GCODE, struct.pack('<H', gcode_encoding), data, gcode_compression, checksum))
+                    if profiler: encode_time += time.perf_counter() - start
+                    chunk = []
+                    size = 0
+
+            with open(filename, 'wb') as f:
+                f.write(Bgcode.MAGIC + struct.pack('<IH', Bgcode.VERSION, 1 if checksum else 0))
+                for block in blocks:
+                    f.write(block)
+                if profiler:
+                    profiler.add('write.bgcode_encode', encode_time, lines=len(gcode_lines))
+                    args['bytes'] = f.tell()
@@ -0,0 +1,163 @@
+import argparse
+import io
+import json
+import sys
+
+
+
+def parse_operation(text: str) -> tuple[str, dict]:
+    """
+    Parse `name[:key=value,key=value]` into (`name`, `kwargs`)
+    """
+    name, _, args = text.partition(':')
+    kwargs = {}
+    for arg in filter(None, args.split(',')):
+        key, _, value = arg.partition('=')
+        try:
+            kwargs[key.strip()] = float(value)
+        except ValueError:
+            kwargs[key.strip()] = value.strip()
+    return (name.strip(), kwargs)
+
+
+def batch(args: argparse.Namespace):
+    from GcodeTools.gcode_batch import Batch
+
+    def progress(current: int, total: int):
+        print(f'[{current}/{total}]', file=sys.stderr)
+
+    results = Batch.run(
+        args.paths,
+        [parse_operation(op) for op in args.op],
+        output_dir=args.output_dir,
+        workers=args.workers,
+        timeout=args.timeout,
+        memory_limit=int(args.memory_limit * 1024 * 1024) if args.memory_limit else None,
+        progress_callback=None if args.quiet else progress,
+    )
+
+    for result in results:
+        if result['status'] != 'ok':
+            print(f'{result["file"]}: {result["status"]}: {result.get("error", "")}', file=sys.stderr)
+
+    if args.summary:
+        Batch.write_summary(results, args.summary)
+    else:
+        json.dump(Batch.summary(results), sys.stdout, indent=4)
+        sys.stdout.write('\n')
+
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+def open_io(args: argparse.Namespace, binary = False):
+    from GcodeTools.gcode_compression import Compression
+    fin = Compression.open(args.input, 'rb') if args.input else sys.stdin.buffer
+    if binary:
+        fout = Compression.open(args.output, 'wb') if args.output else sys.stdout.buffer
+    else:
+        fin = io.TextIOWrapper(fin, encoding='utf-8', errors='replace')
+        fout = io.TextIOWrapper(Compression.open(args.output, 'wb'), encoding='utf-8') if args.output else sys.stdout
+    return fin, fout
+
+
+def close_io(args: argparse.Namespace, fin, fout):
+    """Flush stdout, close files. Compressed files are only complete after closing"""
+    fout.flush()
+    if args.input: fin.close()
+    if args.output: fout.close()
+
+
+def exclude(args: argparse.Namespace):
+    from GcodeTools.gcode_tools import Tools
+
+    fin, fout = open_io(args, binary=True)
+    count = Tools.exclude_objects(fin, fout, args.names)
+    close_io(args, fin, fout)
+    print(f'Excluded {count} object ranges', file=sys.stderr)
+    return 0
+
+
+def transform(args: argparse.Namespace):
+    from GcodeTools.gcode_types import Config, Vector
+    from GcodeTools.gcode_tools import Tools
+    from GcodeTools.gcode_stream import GcodeStream
+
+    operations = {
+        'translate': (lambda chunk: Tools.translate(chunk, Vector(args.x, args.y, args.z)), True),
+        'rotate': (lambda chunk: Tools.rotate(chunk, args.deg), True),
+        'scale': (lambda chunk: Tools.scale(chunk, args.factor), True),
+        'flow': (lambda chunk: Tools.scale_flow(chunk, args.multiplier), True),
+        'trim': (Tools.trim, False),
+    }
+    operation, one_to_one = operations[args.command]
+
+    config = Config()
+    config.speed = args.speed
+    config.precision = args.precision
+    config.step = args.step
+
+    fin, fout = open_io(args)
+    chunks = GcodeStream.read(fin, config, args.chunk_size)
+    GcodeStream.write(GcodeStream.apply(chunks, operation, one_to_one), fout, config=config)
+    close_io(args, fin, fout)
+    return 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='gcodetools', description='Python G-Code Tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = commands.add_parser('batch', help='process many G-code files in parallel', description='Apply a pipeline of operations to many G-code files. Operations: parse, trim, translate, rotate, scale, stats, thumbnail, write')
+    batch_parser.add_argument('paths', nargs='+', help='G-code files or directories containing .gcode files')
+    batch_parser.add_argument('--op', action='append', default=[], metavar='NAME[:KEY=VALUE,...]', help='operation to apply, can be repeated, e.g. --op trim --op translate:X=10,Y=5 --op write')
+    batch_parser.add_argument('-o', '--output-dir', help='directory for written G-code and thumbnails')
+    batch_parser.add_argument('-j', '--workers', type=int, help='number of worker processes (default: CPU count)')
+    batch_parser.add_argument('--timeout', type=float, help='per-file timeout in seconds')
+    batch_parser.add_argument('--memory-limit', type=float, help='memory limit per worker in MB')
+    batch_parser.add_argument('--summary', help='write JSON results summary to a file instead of stdout')
+    batch_parser.add_argument('-q', '--quiet', action='store_true', help='don\'t report progress')
+    batch_parser.set_defaults(func=batch)
+
+    stream_parser = argparse.ArgumentParser(add_help=False)
+    stream_parser.add_argument('-i', '--input', help='input G-code file (default: stdin)')
+    stream_parser.add_argument('-o', '--output', help='output G-code file (default: stdout)')
+
+    transform_parser = argparse.ArgumentParser(add_help=False, parents=[stream_parser])
+    transform_parser.add_argument('--chunk-size', type=int, help='number of blocks processed at once')
+    transform_parser.add_argument('--speed', type=float, default=1200, help='initial speed in mm/min (default: 1200)')
+    transform_parser.add_argument('--precision', type=int, default=5, help='decimal digits of written coordinates (default: 5)')
+    transform_parser.add_argument('--step', type=float, default=0.1, help='arc subdivision step in mm (default: 0.1)')
+
+    translate_parser = commands.add_parser('translate', parents=[transform_parser], help='move G-code by a vector')
+    translate_parser.add_argument('--x', type=float, default=0)
+    translate_parser.add_argument('--y', type=float, default=0)
+    translate_parser.add_argument('--z', type=float, default=0)
+
+    rotate_parser = commands.add_parser('rotate', parents=[transform_parser], help='rotate G-code around Z axis')
+    rotate_parser.add_argument('--deg', type=float, required=True, help='angle in degrees')
+
+    scale_parser = commands.add_parser('scale', parents=[transform_parser], help='scale G-code')
+    scale_parser.add_argument('--factor', type=float, required=True)
+
+    flow_parser = commands.add_parser('flow', parents=[transform_parser], help='multiply extrusion of printing moves')
+    flow_parser.add_argument('--multiplier', type=float, required=True, help='e.g. 0.95 for 95%% flow')
+
+    commands.add_parser('trim', parents=[transform_parser], help='trim G-code from commands not handled by GcodeTools')
+
+    for name in ['translate', 'rotate', 'scale', 'flow', 'trim']:
+        commands.choices[name].set_defaults(func=transform)
+
+    exclude_parser = commands.add_parser('exclude', parents=[stream_parser], help='remove objects, passing other lines untouched')
+    exclude_parser.add_argument('names', nargs='+', help='object names or M486 ids')
+    exclude_parser.set_defaults(func=exclude)
+
+    return parser
+
+
+def main(argv: list[str]|None = None):
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
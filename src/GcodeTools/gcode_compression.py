@@ -0,0 +1,233 @@
+import io
+import os
+import queue
+import threading
+import typing
+
+
+
+class Compression:
+    """
+    Transparent gzip, bzip2 and xz compressed G-code files.
+
+    Compression is detected from magic bytes when reading and from the extension when writing.
+    Decompression runs in a background thread, filling a queue of large chunks, so decoding overlaps parsing.
+    Compression also runs in a background thread. `zlib`, `bz2` and `lzma` release the GIL while working.
+
+    Example:
+    ```
+    gcode = Gcode('file.gcode.gz')
+    gcode.write_file('out.gcode.xz')
+
+    with Compression.open('file.gcode.bz2') as f:
+        for line in f:
+            ...
+    ```
+    """
+
+    MAGIC = {b'\x1f\x8b': 'gz', b'BZh': 'bz2', b'\xfd7zXZ\x00': 'xz'}
+    EXTENSIONS = {'.gz': 'gz', '.gzip': 'gz', '.bz2': 'bz2', '.xz': 'xz'}
+
+    BUFFER_SIZE = 1 << 20
+    """Size of decompressed chunks and of write buffers"""
+
+    QUEUE_SIZE = 8
+    """Number of chunks decompressed ahead of the reader"""
+
+
+    class _ThreadedReader(io.RawIOBase):
+        """Reads `source` in a background thread. `tell` gives the compressed position after each chunk"""
+        def __init__(self, source: typing.BinaryIO, chunk_size: int, queue_size: int, tell: typing.Callable[[], int]|None = None):
+            super().__init__()
+            self._source = source
+            self._chunk_size = chunk_size
+            self._tell = tell
+            self.source_position = 0
+            """Compressed position after the chunk being read"""
+            self._queue: queue.Queue[tuple[bytes, int]] = queue.Queue(queue_size)
+            self._stop = threading.Event()
+            self._error: BaseException|None = None
+            self._buffer = memoryview(b'')
+            self._eof = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+        def _put(self, chunk: bytes):
+            item = (chunk, self._tell() if self._tell else 0)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+
+        def _run(self):
+            try:
+                while not self._stop.is_set():
+                    chunk = self._source.read(self._chunk_size)
+                    self._put(chunk)
+                    if not chunk:
+                        return
+            except BaseException as e:
+                self._error = e
+                self._put(b'')
+
+
+        def readable(self):
+            return True
+
+
+        def readinto(self, buffer) -> int:
+            if not self._buffer:
+                if self._eof:
+                    return 0
+                chunk, self.source_position = self._queue.get()
+                if self._error is not None:
+                    raise self._error
+                if not chunk:
+                    self._eof = True
+                    return 0
+                self._buffer = memoryview(chunk)
+            size = min(len(buffer), len(self._buffer))
+            buffer[:size] = self._buffer[:size]
+            self._buffer = self._buffer[size:]
+            return size
+
+
+        def close(self):
+            if not self.closed:
+                self._stop.set()
+                self._thread.join()
+                self._source.close()
+            super().close()
+
+
+    class _ThreadedWriter(io.RawIOBase):
+        """Writes into `target` in a background thread"""
+        def __init__(self, target: typing.BinaryIO, queue_size: int):
+            super().__init__()
+            self._target = target
+            self._queue: queue.Queue[bytes|None] = queue.Queue(queue_size)
+            self._error: BaseException|None = None
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+        def _run(self):
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    return
+                if self._error is None:
+                    try:
+                        self._target.write(chunk)
+                    except BaseException as e:
+                        self._error = e
+
+
+        def writable(self):
+            return True
+
+
+        def write(self, data) -> int:
+            if self._error is not None:
+                raise self._error
+            self._queue.put(bytes(data))
+            return len(data)
+
+
+        def close(self):
+            if self.closed:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._target.close()
+            super().close()
+            if self._error is not None:
+                raise self._error
+
+
+    @staticmethod
+    def _module(compression: str):
+        if compression == 'gz':
+            import gzip
+            return gzip
+        if compression == 'bz2':
+            import bz2
+            return bz2
+        if compression == 'xz':
+            import lzma
+            return lzma
+        raise ValueError(f'Unknown compression: {compression}')
+
+
+    @staticmethod
+    def detect(filename: str, mode = 'r') -> str|None:
+        """
+        Get compression of a file: `gz`, `bz2`, `xz` or `None`.
+        Existing files opened for reading are checked by magic bytes, otherwise the extension is used
+        """
+        if 'r' in mode and os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                head = f.read(6)
+            for magic, compression in Compression.MAGIC.items():
+                if head.startswith(magic):
+                    return compression
+            return None
+        return Compression.EXTENSIONS.get(os.path.splitext(str(filename))[1].lower())
+
+
+    @staticmethod
+    def read_position(f: typing.IO) -> int|None:
+        """
+        Compressed bytes behind the data read from `f` so far, for progress of threaded readers from `Compression.open`
+        of a file object. `None` for other files
+        """
+        raw = getattr(getattr(f, 'buffer', f), 'raw', None)
+        if isinstance(raw, Compression._ThreadedReader) and raw._tell is not None:
+            return raw.source_position
+        return None
+
+
+    @staticmethod
+    def open(filename: str, mode = 'r', compression: str|None = None, level: int|None = None, threaded = True, buffer_size: int|None = None) -> typing.IO:
+        """
+        Open a possibly compressed file. Plain files are opened with the builtin `open`
+
+        Args:
+            filename: `str`, or a binary file object to read or write compressed data through when `compression` is given
+            mode: `str` - `r`, `w`, `rb` or `wb`
+            compression: `str` - `gz`, `bz2`, `xz`. Detected with `Compression.detect` when `None`
+            level: `int` - compression level. Defaults to 6 for gzip and the codec's default otherwise
+            threaded: `bool` - (de)compress in a background thread
+            buffer_size: `int` - defaults to `Compression.BUFFER_SIZE`, or to the default buffering of plain files
+        """
+        if mode not in ('r', 'w', 'rb', 'wb'): raise ValueError(f'Unsupported mode: {mode}')
+        compression = compression or Compression.detect(filename, mode)
+        if compression is None:
+            return open(filename, mode, buffering=buffer_size or -1)
+
+        buffer_size = buffer_size or Compression.BUFFER_SIZE
+        module = Compression._module(compression)
+        binary_mode = mode[0] + 'b'
+
+        if mode[0] == 'r':
+            raw = module.open(filename, binary_mode)
+            if threaded:
+                tell = None if isinstance(filename, (str, os.PathLike)) else filename.tell
+                raw = io.BufferedReader(Compression._ThreadedReader(raw, buffer_size, Compression.QUEUE_SIZE, tell), buffer_size)
+        else:
+            if compression == 'gz':
+                raw = module.open(filename, binary_mode, compresslevel=6 if level is None else level)
+            elif compression == 'bz2':
+                raw = module.open(filename, binary_mode, compresslevel=9 if level is None else level)
+            else:
+                raw = module.open(filename, binary_mode, preset=level)
+            if threaded:
+                raw = io.BufferedWriter(Compression._ThreadedWriter(raw, Compression.QUEUE_SIZE), buffer_size)
+
+        if 'b' in mode:
+            return raw
+        return io.TextIOWrapper(raw, write_through=False)
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import struct
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_tools import Tools
+
+
+
+class Export:
+    """
+    Writes extrusion toolpaths as flat `float32` buffers for viewers and notebooks. Requires `numpy`
+
+    Every extruding segment is a pair of vertices (line list), ordered by layer, with attributes:
+    - `position` - X, Y, Z in mm
+    - `width` - extrusion width in mm, from extruded volume, segment length and layer height
+    - `move_type`, `object`, `layer` - `Block` state of the segment
+
+    `layer_ranges` holds (`layer`, first vertex, vertex count) of every layer, so layers can be drawn without parsing.
+
+    Formats:
+    - `.npz` - the arrays as they are
+    - `.ply` - binary PLY with `vertex` and `edge` elements, layer ranges in comments
+    - `.glb` - binary glTF 2.0, one `LINES` primitive per layer over shared buffer views,
+      attributes `POSITION`, `_WIDTH`, `_MOVE_TYPE`, `_OBJECT`, `_LAYER`. Layer ranges are in the mesh `extras`
+    """
+
+    ATTRIBUTES = ('width', 'move_type', 'object', 'layer')
+    FORMATS = ('.npz', '.ply', '.glb')
+
+    GLTF_TO_Y_UP = [0.001, 0, 0, 0, 0, 0, -0.001, 0, 0, 0.001, 0, 0, 0, 0, 0, 1]
+    """Node matrix (column major) of mm with Z up into glTF meters with Y up"""
+
+
+    @staticmethod
+    def toolpaths(gcode: Gcode, filament_diameter = 1.75, layer_height: float|None = None) -> dict:
+        """
+        Extrusion segments of `gcode` as vertex buffers
+
+        Args:
+            filament_diameter: `float` - in mm, to convert E to volume
+            layer_height: `float` - height for extrusion widths. Defaults to the Z step of each layer
+        Returns:
+            `dict` of `position` (n, 3), `width`, `move_type`, `object`, `layer` (n,) of `float32`,
+            and `layer_ranges` (layers, 3) of `int64`
+        """
+        import numpy as np
+
+        position, e, move_type, object, layer = Tools._columns(gcode)
+        segment = np.flatnonzero(Tools._extruding(position, e))
+        segment = segment[np.argsort(layer[segment], kind='stable')]
+        start, end = position[segment - 1], position[segment]
+        layers, first, inverse = np.unique(layer[segment], return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+        if layer_height is None and len(segment):
+            top = np.maximum.reduceat(end[:, 2], first)
+            heights = np.diff(top, prepend=0)
+            valid = heights > 0
+            heights[~valid] = np.median(heights[valid]) if valid.any() else 0.2
+            height = heights[inverse]
+        else:
+            height = np.full(len(segment), layer_height or 0.2)
+
+        length = np.linalg.norm(end - start, axis=1)
+        volume = e[segment] * math.pi * (filament_diameter / 2) ** 2
+        width = volume / np.maximum(length * height, 1e-9)
+
+        vertices = np.empty((2 * len(segment), 3), dtype=np.float32)
+        vertices[0::2] = start
+        vertices[1::2] = end
+        result = {'position': vertices}
+        for name, values in zip(Export.ATTRIBUTES, (width, move_type[segment], object[segment], layer[segment])):
+            result[name] = np.repeat(values.astype(np.float32), 2)
+        counts = np.diff(np.append(first, len(segment)))
+        result['layer_ranges'] = np.stack([layers, 2 * first, 2 * counts], axis=1).astype(np.int64).reshape(-1, 3)
+        return result
+
+
+    @staticmethod
+    def write_npz(toolpaths: dict, filename: str):
+        import numpy as np
+        with open(filename, 'wb') as f:
+            np.savez(f, **toolpaths)
+
+
+    @staticmethod
+    def write_ply(toolpaths: dict, filename: str):
+        import numpy as np
+        count = len(toolpaths['position'])
+        dtype = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')] + [(name, '<f4') for name in Export.ATTRIBUTES]
+        vertices = np.empty(count, dtype=dtype)
+        for axis, name in enumerate('xyz'):
+            vertices[name] = toolpaths['position'][:, axis]
+        for name in Export.ATTRIBUTES:
+            vertices[name] = toolpaths[name]
+        edges = np.arange(count, dtype='<i4').reshape(-1, 2)
+
+        header = ['ply', 'format binary_little_endian 1.0', 'comment GcodeTools toolpaths, units mm']
+        header += [f'comment layer {layer} first {first} count {n}' for layer, first, n in toolpaths['layer_ranges']]
+        header += [f'element vertex {count}']
+        header += [f'property float {name}' for name, _ in dtype]
+        header += [f'element edge {len(edges)}', 'property int vertex1', 'property int vertex2', 'end_header']
+
+        with open(filename, 'wb') as f:
+            f.write(('\n'.join(header) + '\n').encode('ascii'))
+            f.write(vertices.data)
+            f.write(edges.data)
+
+
+    @staticmethod
+    def write_glb(toolpaths: dict, filename: str):
+        import numpy as np
+        FLOAT = 5126
+        ARRAY_BUFFER = 34962
+        LINES = 1
+
+        columns = [('POSITION', 'position', 'VEC3')] + [(f'_{name.upper()}', name, 'SCALAR') for name in Export.ATTRIBUTES]
+        buffers = [np.ascontiguousarray(toolpaths[key], dtype='<f4') for _, key, _ in columns]
+        views = []
+        offset = 0
+        for data in buffers:
+            views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': data.nbytes, 'target': ARRAY_BUFFER})
+            offset += data.nbytes
+
+        ranges = [(int(layer), int(first), int(n)) for layer, first, n in toolpaths['layer_ranges'] if n > 0]
+        accessors = []
+        primitives = []
+        for layer, first, n in ranges:
+            attributes = {}
+            for view, ((attribute, _, kind), data) in enumerate(zip(columns, buffers)):
+                stride = 12 if kind == 'VEC3' else 4
+                accessor = {'bufferView': view, 'byteOffset': first * stride, 'componentType': FLOAT, 'count': n, 'type': kind}
+                if attribute == 'POSITION':
+                    chunk = data[first:first + n]
+                    accessor['min'] = chunk.min(axis=0).tolist()
+                    accessor['max'] = chunk.max(axis=0).tolist()
+                attributes[attribute] = len(accessors)
+                accessors.append(accessor)
+            primitives.append({'attributes': attributes, 'mode': LINES, 'extras': {'layer': layer}})
+
+        gltf = {
+            'asset': {'version': '2.0', 'generator': 'GcodeTools'},
+            'scene': 0,
+            'scenes': [{'nodes': [0]} if primitives else {}],
+            'nodes': [{'name': 'toolpaths', 'mesh': 0, 'matrix': Export.GLTF_TO_Y_UP}] if primitives else [],
+            'meshes': [{'name': 'toolpaths', 'primitives': primitives, 'extras': {'layers': [list(r) for r in ranges]}}] if primitives else [],
+            'accessors': accessors,
+            'bufferViews': views if primitives else [],
+            'buffers': [{'byteLength': offset}] if primitives else [],
+        }
+        gltf = {key: value for key, value in gltf.items() if value != []}
+        text = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        text += b' ' * (-len(text) % 4)
+        length = 12 + 8 + len(text) + (8 + offset if primitives else 0)
+
+        with open(filename, 'wb') as f:
+            f.write(struct.pack('<4sII', b'glTF', 2, length))
+            f.write(struct.pack('<I4s', len(text), b'JSON'))
+            f.write(text)
+            if primitives:
+                f.write(struct.pack('<I4s', offset, b'BIN\0'))
+                for data in buffers:
+                    f.write(data.data)
+
+
+    @staticmethod
+    def write_file(gcode: Gcode, filename: str, filament_diameter = 1.75, layer_height: float|None = None):
+        """
+        Export toolpaths of `gcode` by the extension of `filename`: `.npz`, `.ply` or `.glb`
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in Export.FORMATS:
+            raise ValueError(f'Unknown export format: {extension}, use one of {Export.FORMATS}')
+        toolpaths = Export.toolpaths(gcode, filament_diameter, layer_height)
+        {'.npz': Export.write_npz, '.ply': Export.write_ply, '.glb': Export.write_glb}[extension](toolpaths, filename)
@@ -0,0 +1,397 @@
+import base64
+import math
+import random
+import struct
+import typing
+import zlib
+from GcodeTools.gcode_parser import MetaParser
+
+
+
+class GcodeGenerator:
+    """
+    Deterministic generator of synthetic G-code files which mimic G-code dialects of supported slicers.
+
+    Generated files contain each slicer's header, thumbnails, config block, layer, feature and object markers,
+    arc moves, `G92` resets and relative or absolute extrusion. They can be of any size and are generated as a stream,
+    so parser scaling, memory and correctness can be tested without real G-code files.
+
+    Example:
+    ```
+    generator = GcodeGenerator('orcaslicer', seed=1)
+    generator.write('orca.gcode', 50 * 1024 * 1024)
+    print(generator.summary)
+    ```
+    """
+
+    DIALECTS = ['prusaslicer', 'superslicer', 'orcaslicer', 'bambustudio', 'cura', 'simplify3d']
+
+    OBJECT_NAMES = ['Cube', 'Cylinder', 'Benchy', 'Bracket', 'Gear', 'Vase', 'Clip', 'Knob']
+
+    FEATURES = {
+        'prusaslicer': {'skirt': 'Skirt/Brim', 'external': 'External perimeter', 'perimeter': 'Perimeter', 'solid': 'Solid infill', 'top': 'Top solid infill', 'sparse': 'Internal infill', 'bridge': 'Bridge infill', 'custom': 'Custom'},
+        'orcaslicer': {'skirt': 'Skirt', 'external': 'Outer wall', 'perimeter': 'Inner wall', 'solid': 'Internal solid infill', 'top': 'Top surface', 'sparse': 'Sparse infill', 'bridge': 'Bridge', 'custom': 'Custom'},
+        'cura': {'skirt': 'SKIRT', 'external': 'WALL-OUTER', 'perimeter': 'WALL-INNER', 'solid': 'SKIN', 'top': 'SKIN', 'sparse': 'FILL', 'bridge': 'SKIN', 'custom': None},
+        'simplify3d': {'skirt': 'skirt', 'external': 'outer perimeter', 'perimeter': 'inner perimeter', 'solid': 'solid layer', 'top': 'solid layer', 'sparse': 'infill', 'bridge': 'bridge', 'custom': None},
+    }
+    FEATURES['superslicer'] = FEATURES['prusaslicer']
+    FEATURES['bambustudio'] = FEATURES['orcaslicer']
+
+    CONFIG = {
+        'layer_height': '0.2',
+        'first_layer_height': '0.2',
+        'nozzle_diameter': '0.4',
+        'filament_diameter': '1.75',
+        'temperature': '215',
+        'bed_temperature': '60',
+        'perimeters': '2',
+        'fill_density': '15%',
+        'retract_length': '0.8',
+        'travel_speed': '150',
+        'printer_settings_id': 'Generated Printer',
+        'print_settings_id': 'Generated Process',
+        'filament_settings_id': 'Generated PLA',
+    }
+
+
+    def __init__(self, dialect = 'prusaslicer', seed = 0, objects = 4, absolute_e: bool|None = None, arcs = True, thumbnails: list[tuple[int, int]]|None = None):
+        """
+        Args:
+            dialect: `str` - one of `GcodeGenerator.DIALECTS`
+            seed: `int` - seed of the random generator, the same seed generates the same file
+            objects: `int` - number of objects on the plate
+            absolute_e: `bool` - use absolute extrusion (`M82`). Defaults to the slicer's default
+            arcs: `bool` - use `G2`/`G3` arc moves in perimeter corners
+            thumbnails: `list` of (`width`, `height`) of embedded png thumbnails. Defaults to [(16, 16), (220, 124)]
+        """
+        if dialect not in GcodeGenerator.DIALECTS:
+            raise ValueError(f'Unknown dialect: {dialect}. Available: {", ".join(GcodeGenerator.DIALECTS)}')
+        self.dialect = dialect
+        self.seed = seed
+        self.objects = [f'{GcodeGenerator.OBJECT_NAMES[i % len(GcodeGenerator.OBJECT_NAMES)]}_{i}' for i in range(objects)]
+        self.absolute_e = dialect in ['cura', 'simplify3d'] if absolute_e is None else absolute_e
+        self.arcs = arcs
+        self.thumbnails = [(16, 16), (220, 124)] if thumbnails is None else thumbnails
+        self.summary = {}
+        """Ground truth of the last generated file: `dialect`, `objects`, `layers`, `extruded` [mm], `retractions`, `lines`, `bytes`"""
+
+        self._e = 0.0
+        self._extruded = 0.0
+        self._retractions = 0
+
+
+    @staticmethod
+    def png(width: int, height: int, seed = 0) -> bytes:
+        """Deterministic RGB png image"""
+        rnd = random.Random(seed)
+        color = [rnd.randrange(256) for _ in range(3)]
+        rows = b''.join(
+            b'\x00' + bytes(value for x in range(width) for value in (x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1), color[(x + y) % 3]))
+            for y in range(height)
+        )
+
+        def chunk(kind: bytes, data: bytes):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+        return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + chunk(b'IDAT', zlib.compress(rows, 9)) + chunk(b'IEND', b'')
+
+
+    def _thumbnail_lines(self) -> list[str]:
+        lines = []
+        for idx, (w, h) in enumerate(self.thumbnails):
+            text = base64.b64encode(GcodeGenerator.png(w, h, self.seed + idx)).decode()
+            lines += ['', f'; thumbnail begin {w}x{h} {len(text)}']
+            lines += ['; ' + text[i:i + 78] for i in range(0, len(text), 78)]
+            lines += ['; thumbnail end', ';']
+        if self.dialect in ['orcaslicer', 'bambustudio']:
+            lines = ['; THUMBNAIL_BLOCK_START'] + lines + ['; THUMBNAIL_BLOCK_END', '']
+        return lines
+
+
+    def _config_lines(self) -> list[str]:
+        if self.dialect == 'cura':
+            settings = '\\n'.join(f'{key} = {value}' for key, value in GcodeGenerator.CONFIG.items())
+            return [f';SETTING_3 {{"global_quality": "[general]\\nversion = 4\\n[values]\\n{settings}"}}']
+        if self.dialect == 'simplify3d':
+            return ['; Settings Summary', ';   processName,Process1'] + [f';   {key},{value}' for key, value in GcodeGenerator.CONFIG.items()]
+        if self.dialect in ['orcaslicer', 'bambustudio']:
+            return ['; CONFIG_BLOCK_START'] + [f'; {key} = {value}' for key, value in GcodeGenerator.CONFIG.items()] + ['; CONFIG_BLOCK_END']
+        return [f'; {self.dialect}_config = begin'] + [f'; {key} = {value}' for key, value in GcodeGenerator.CONFIG.items()] + [f'; {self.dialect}_config = end']
+
+
+    def _feature(self, feature: str) -> list[str]:
+        name = GcodeGenerator.FEATURES[self.dialect][feature]
+        if name is None:
+            return []
+        if self.dialect == 'simplify3d':
+            return [f'; feature {name}']
+        return [f';TYPE:{name}'] + ([] if self.dialect == 'cura' else [';WIDTH:0.45'])
+
+
+    def _object_id(self, idx: int) -> str:
+        if self.dialect in ['orcaslicer']:
+            return f'{self.objects[idx]}.stl_id_{idx}_copy_0'
+        return self.objects[idx]
+
+
+    def _object_markers(self, idx: int) -> tuple[list[str], list[str]]:
+        d = self.dialect
+        name = self._object_id(idx)
+        if d == 'prusaslicer':
+            return [f'M486 S{idx}', f'; printing object {name} id:{idx} copy 0'], [f'; stop printing object {name} id:{idx} copy 0', 'M486 S-1']
+        if d == 'superslicer':
+            return [f'; printing object {name} id:{idx} copy 0'], [f'; stop printing object {name} id:{idx} copy 0']
+        if d == 'orcaslicer':
+            return [f'EXCLUDE_OBJECT_START NAME={name}'], [f'EXCLUDE_OBJECT_END NAME={name}']
+        if d == 'bambustudio':
+            return [f'M624 {base64.b64encode(struct.pack("<Q", 1 << idx)).decode()}'], ['M625']
+        if d == 'cura':
+            return [f';MESH:{name}.stl'], [';MESH:NONMESH']
+        return [], []
+
+
+    def _object_names(self) -> list[str]:
+        """Names of objects, as they are stored in `Gcode.objects` after parsing"""
+        names = []
+        for idx in range(len(self.objects)):
+            start, _ = self._object_markers(idx)
+            if not start:
+                continue
+            marker = start[-1]
+            for prefix in ['; printing object ', 'EXCLUDE_OBJECT_START NAME=', 'M624 ', ';MESH:']:
+                if marker.startswith(prefix):
+                    names.append(MetaParser.sanitize_name(marker[len(prefix):]))
+        return names
+
+
+    def _header(self) -> list[str]:
+        d = self.dialect
+        start_gcode = ['M104 S215', 'M140 S60', 'G28', 'M190 S60', 'M109 S215', 'G90', 'M82' if self.absolute_e else 'M83', 'G92 E0']
+
+        if d in ['prusaslicer', 'superslicer']:
+            version = '2.8.1+linux-x64-GTK3' if d == 'prusaslicer' else '2.5.59.12'
+            name = 'PrusaSlicer' if d == 'prusaslicer' else 'SuperSlicer'
+            lines = [f'; generated by {name} {version} on 2024-01-01 at 12:00:00 UTC', '', ';', '; external perimeters extrusion width = 0.45mm', ';']
+            lines += self._thumbnail_lines()
+            lines += ['M73 P0 R60', 'M201 X1000 Y1000 Z200 E5000', 'M203 X200 Y200 Z12 E120']
+            if d == 'prusaslicer':
+                for idx, name in enumerate(self.objects):
+                    lines += [f'M486 S{idx}', f'M486 A{name}']
+                lines.append('M486 S-1')
+            else:
+                for idx, name in enumerate(self.objects):
+                    lines.append(f'; object:{{"name":"{name}","id":"{name}.stl id:{idx} copy 0","object_center":[0,0,0]}}')
+            return lines + ['M107', ';TYPE:Custom'] + start_gcode
+
+        if d in ['orcaslicer', 'bambustudio']:
+            generated = '; generated by OrcaSlicer 2.1.1 on 2024-01-01 at 12:00:00' if d == 'orcaslicer' else '; BambuStudio 02.00.03.54'
+            lines = ['; HEADER_BLOCK_START', generated, '; model printing time: 1h 0m 0s; total estimated time: 1h 5m 0s', '; HEADER_BLOCK_END', '']
+            lines += self._thumbnail_lines()
+            if d == 'bambustudio':
+                lines += self._config_lines() + ['']
+            lines += ['; EXECUTABLE_BLOCK_START']
+            if d == 'orcaslicer':
+                for idx in range(len(self.objects)):
+                    x, y = self._center(idx)
+                    lines.append(f'EXCLUDE_OBJECT_DEFINE NAME={self._object_id(idx)} CENTER={x},{y} POLYGON=[[{x - 20},{y - 20}],[{x + 20},{y - 20}],[{x + 20},{y + 20}],[{x - 20},{y + 20}]]')
+            return lines + ['M73 P0 R60', ';TYPE:Custom'] + start_gcode
+
+        if d == 'cura':
+            lines = [';FLAVOR:Marlin', ';TIME:3600', ';Filament used: 1m', ';Layer height: 0.2', ';Generated with Cura_SteamEngine 5.8.1']
+            lines += self._thumbnail_lines()
+            return lines + ['M140 S60', 'M105', 'M190 S60', 'M104 S215', 'M105', 'M109 S215', 'M82 ;absolute extrusion mode' if self.absolute_e else 'M83 ;relative extrusion mode', 'G28', 'G92 E0']
+
+        lines = ['; G-Code generated by Simplify3D(R) Version 4.0.0', '; Jan 1, 2024 at 12:00:00 PM']
+        lines += self._config_lines()
+        return lines + ['G90', 'M82' if self.absolute_e else 'M83', 'M106 S0', 'M140 S60', 'M190 S60', 'M104 S215 T0', 'M109 S215 T0', 'G28 ; home all axes', '; process Process1']
+
+
+    def _footer(self, layers: int) -> list[str]:
+        d = self.dialect
+        end_gcode = ['M107', 'M104 S0', 'M140 S0', 'G1 Z{0:.3f} F720'.format(layers * 0.2 + 10), 'M84']
+        filament = f'; filament used [mm] = {self._extruded:.2f}'
+
+        if d in ['prusaslicer', 'superslicer']:
+            return [';TYPE:Custom'] + end_gcode + ['M73 P100 R0', filament, '; estimated printing time (normal mode) = 1h 5m 0s', ''] + self._config_lines()
+        if d in ['orcaslicer', 'bambustudio']:
+            lines = [';TYPE:Custom'] + end_gcode + ['M73 P100 R0', '; EXECUTABLE_BLOCK_END', '', filament]
+            return lines + ([''] + self._config_lines() if d == 'orcaslicer' else [])
+        if d == 'cura':
+            return end_gcode + [';End of Gcode'] + self._config_lines()
+        return ['; layer end'] + end_gcode + ['; Build Summary', ';   Build time: 1 hours 5 minutes', f';   Filament length: {self._extruded:.1f} mm']
+
+
+    def _center(self, idx: int) -> tuple[int, int]:
+        columns = max(1, math.ceil(math.sqrt(len(self.objects))))
+        return (40 + 50 * (idx % columns), 40 + 50 * (idx // columns))
+
+
+    def _extrude(self, length: float) -> str:
+        amount = length * 0.0374
+        self._extruded += amount
+        return self._e_value(amount)
+
+
+    def _e_value(self, amount: float) -> str:
+        if self.absolute_e:
+            self._e += amount
+            return f'E{self._e:.5f}'
+        return f'E{amount:.5f}'
+
+
+    def _travel(self, x: float, y: float) -> list[str]:
+        move = 'G0' if self.dialect == 'cura' else 'G1'
+        self._retractions += 1
+        return [f'G1 {self._e_value(-0.8)} F2100', f'{move} X{x:.3f} Y{y:.3f} F9000', f'G1 {self._e_value(0.8)} F2100']
+
+
+    def _loop(self, cx: float, cy: float, half: float, speed: int) -> list[str]:
+        """Square loop with rounded corners, starting at its bottom left corner"""
+        r = 2.0
+        lines = self._travel(cx - half + r, cy - half)
+        corners = [(1, -1, 0, 1), (1, 1, -1, 0), (-1, 1, 0, -1), (-1, -1, 1, 0)]
+        for sx, sy, ix, iy in corners:
+            side = 2 * (half - r)
+            x = cx + sx * (half - r) if sx == sy else cx + sx * half
+            y = cy + sy * half if sx == sy else cy + sy * (half - r)
+            end_x = cx + sx * half if sx == sy else cx + sx * (half - r)
+            end_y = cy + sy * (half - r) if sx == sy else cy + sy * half
+            lines.append(f'G1 X{x:.3f} Y{y:.3f} {self._extrude(side)} F{speed}')
+            if self.arcs:
+                lines.append(f'G3 X{end_x:.3f} Y{end_y:.3f} I{ix * r:.3f} J{iy * r:.3f} {self._extrude(math.pi * r / 2)}')
+            else:
+                lines.append(f'G1 X{end_x:.3f} Y{end_y:.3f} {self._extrude(r * math.sqrt(2))}')
+        return lines
+
+
+    def _infill(self, rnd: random.Random, cx: float, cy: float, half: float, layer: int, spacing: float) -> list[str]:
+        lines = []
+        count = int(2 * half / spacing)
+        for i in range(count):
+            offset = -half + (i + 0.5) * spacing + rnd.uniform(-0.02, 0.02)
+            a, b = (-half, half) if i % 2 else (half, -half)
+            if layer % 2:
+                x0, y0, x1, y1 = cx + a, cy + offset, cx + b, cy + offset
+            else:
+                x0, y0, x1, y1 = cx + offset, cy + a, cx + offset, cy + b
+            if i == 0:
+                lines += self._travel(x0, y0)
+            else:
+                lines.append(f'G1 X{x0:.3f} Y{y0:.3f} {self._extrude(spacing)}')
+            lines.append(f'G1 X{x1:.3f} Y{y1:.3f} {self._extrude(2 * half)} F{rnd.choice([4800, 6000, 7200])}')
+        return lines
+
+
+    def _object_lines(self, rnd: random.Random, idx: int, layer: int) -> list[str]:
+        cx, cy = self._center(idx)
+        start, end = self._object_markers(idx)
+
+        infill = 'sparse'
+        if layer <= 2 or layer % 25 in [0, 24]: infill = 'solid'
+        if layer % 25 == 0: infill = 'top'
+        if layer % 25 == 3 and idx % 2: infill = 'bridge'
+
+        lines = start
+        lines += self._feature('external') + self._loop(cx, cy, 18, 1800)
+        lines += self._feature('perimeter') + self._loop(cx, cy, 17.55, 2700)
+        lines += self._feature(infill) + self._infill(rnd, cx, cy, 17, layer, 0.45 if infill != 'sparse' else 4)
+        return lines + end
+
+
+    def _layer(self, rnd: random.Random, layer: int) -> list[str]:
+        d = self.dialect
+        z = layer * 0.2
+        if d in ['prusaslicer', 'superslicer', 'orcaslicer']:
+            lines = [';LAYER_CHANGE', f';Z:{z:.1f}', ';HEIGHT:0.2']
+        elif d == 'bambustudio':
+            lines = ['; CHANGE_LAYER', f'; Z_HEIGHT: {z:.1f}', '; LAYER_HEIGHT: 0.2']
+        elif d == 'cura':
+            lines = [f';LAYER:{layer - 1}']
+        else:
+            lines = [f'; layer {layer}, Z = {z:.3f}']
+
+        if self.absolute_e:
+            lines.append('G92 E0')
+            self._e = 0.0
+        lines.append(f'G1 Z{z:.3f} F720')
+
+        if layer == 1:
+            cx, cy = self._center(0)
+            lines += self._feature('skirt') + self._loop(cx, cy, 23, 1800)
+
+        for idx in range(len(self.objects)):
+            lines += self._object_lines(rnd, idx, layer)
+
+        if d == 'cura':
+            lines.append(f';TIME_ELAPSED:{layer * 60.0:.6f}')
+        return lines
+
+
+    def lines(self, size: int) -> typing.Iterator[str]:
+        """
+        Yields lines (without newlines) of a G-code file of approximately `size` bytes. Fills `self.summary` when finished
+        """
+        rnd = random.Random(self.seed)
+        self._e = 0.0
+        self._extruded = 0.0
+        self._retractions = 0
+        written = 0
+        count = 0
+
+        for line in self._header():
+            written += len(line) + 1
+            count += 1
+            yield line
+
+        layer = 0
+        while written < size or layer == 0:
+            layer += 1
+            for line in self._layer(rnd, layer):
+                written += len(line) + 1
+                count += 1
+                yield line
+
+        for line in self._footer(layer):
+            written += len(line) + 1
+            count += 1
+            yield line
+
+        self.summary = {
+            'dialect': self.dialect,
+            'objects': self._object_names(),
+            'layers': layer,
+            'extruded': round(self._extruded, 3),
+            'retractions': self._retractions,
+            'lines': count,
+            'bytes': written,
+        }
+
+
+    def chunks(self, size: int, chunk_size = 1 << 20) -> typing.Iterator[bytes]:
+        """
+        Yields G-code of approximately `size` bytes in chunks of approximately `chunk_size` bytes
+        """
+        buffer = []
+        buffered = 0
+        for line in self.lines(size):
+            buffer.append(line)
+            buffered += len(line) + 1
+            if buffered >= chunk_size:
+                yield ('\n'.join(buffer) + '\n').encode()
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield ('\n'.join(buffer) + '\n').encode()
+
+
+    def write(self, filename: str, size: int) -> dict:
+        """
+        Write G-code file of approximately `size` bytes
+
+        Returns:
+            `dict` - `self.summary`
+        """
+        with open(filename, 'wb') as f:
+            for chunk in self.chunks(size):
+                f.write(chunk)
+        return self.summary
@@ -0,0 +1,323 @@
+import base64
+import json
+import mmap
+import os
+import re
+from GcodeTools.gcode_parser import MetaParser
+from GcodeTools.gcode_compression import Compression
+
+
+
+class MetaReader:
+    """
+    Reads slicer metadata straight from a G-code file, without parsing it into `Gcode`.
+
+    Thumbnails, slicer name and config live in the first and last few hundred kB of a file,
+    so only the head and the tail of the file are scanned (through `mmap`).
+    Compressed files (`.gz`, `.bz2`, `.xz`) are streamed through, keeping only the head and the tail.
+    Binary G-code (`.bgcode`) is read from its metadata and thumbnail blocks.
+    """
+
+    HEAD_SIZE = 1 << 20
+    """Bytes scanned at the beginning of a file"""
+
+    TAIL_SIZE = 1 << 20
+    """Bytes scanned at the end of a file"""
+
+    THUMBNAIL_BEGIN = re.compile(r'^; ?thumbnail(_\w+)? begin')
+    THUMBNAIL_END = re.compile(r'^; ?thumbnail(_\w+)? end')
+
+
+    @staticmethod
+    def _decode_lines(data: bytes) -> list[str]:
+        return [line.strip() for line in data.decode('utf-8', 'replace').splitlines() if line.strip()]
+
+
+    @staticmethod
+    def _read_compressed_lines(filename: str, head_size: int, tail_size: int) -> tuple[list[str], list[str]]:
+        """Compressed files can't be mapped, so the whole file is streamed, keeping the head and a rolling tail"""
+        with Compression.open(filename, 'rb') as f:
+            head = f.read(head_size)
+            head += f.readline()
+            if tail_size == 0:
+                return (MetaReader._decode_lines(head), [])
+            tail = bytearray()
+            while chunk := f.read(Compression.BUFFER_SIZE):
+                tail += chunk
+                if len(tail) > 3 * tail_size:
+                    # keeps more than `tail_size`, so the final cut is at a line boundary
+                    del tail[:len(tail) - 2 * tail_size]
+        if len(tail) > tail_size:
+            del tail[:tail.rfind(b'\n', 0, len(tail) - tail_size) + 1]
+        return (MetaReader._decode_lines(head), MetaReader._decode_lines(tail))
+
+
+    @staticmethod
+    def read_lines(filename: str, head_size: int|None = None, tail_size: int|None = None) -> tuple[list[str], list[str]]:
+        """
+        Read stripped, non-empty lines from the beginning and the end of a file
+
+        Args:
+            filename: `str` - path to a G-code file
+            head_size: `int` - number of bytes to read from the beginning. Defaults to `MetaReader.HEAD_SIZE`
+            tail_size: `int` - number of bytes to read from the end. Defaults to `MetaReader.TAIL_SIZE`
+        Returns:
+            `tuple` of (`head_lines`, `tail_lines`). When the file is smaller than both sizes together, every line is in `head_lines`
+        """
+        head_size = MetaReader.HEAD_SIZE if head_size is None else head_size
+        tail_size = MetaReader.TAIL_SIZE if tail_size is None else tail_size
+
+        if Compression.detect(filename):
+            return MetaReader._read_compressed_lines(filename, head_size, tail_size)
+
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return ([], [])
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if size <= head_size + tail_size:
+                    return (MetaReader._decode_lines(mm[:]), [])
+
+                head_end = mm.find(b'\n', head_size)
+                head_end = size if head_end < 0 else head_end
+                tail_start = mm.rfind(b'\n', 0, size - tail_size) + 1
+                tail_start = max(tail_start, head_end)
+
+                return (MetaReader._decode_lines(mm[:head_end]), MetaReader._decode_lines(mm[tail_start:]))
+
+
+    @staticmethod
+    def parse_thumbnails(lines: list[str]) -> tuple[list[bytes], bool]:
+        """
+        Decode thumbnail blocks from G-code lines
+
+        Returns:
+            `tuple` of (`thumbnails`, `complete`), where `complete` is `False` when the last thumbnail block is not terminated
+        """
+        images = []
+        chunks = None
+        for line in lines:
+            if chunks is None:
+                if MetaReader.THUMBNAIL_BEGIN.match(line):
+                    chunks = []
+                continue
+            if MetaReader.THUMBNAIL_END.match(line):
+                images.append(base64.b64decode(''.join(chunks)))
+                chunks = None
+                continue
+            text = line.removeprefix(';').strip()
+            if text:
+                chunks.append(text)
+
+        return (images, chunks is None)
+
+
+    @staticmethod
+    def parse_slicer_name(lines: list[str]) -> tuple[str, str]|None:
+        """
+        Get (`slicer_name`, `slicer_version`) from the first G-code lines
+        """
+        for cmd in lines[:20]:
+            if 'bambustudio' in cmd.lower():
+                slicer = 'BambuStudio'
+                version = cmd.split('BambuStudio')[-1].strip()
+                return (slicer, version)
+            if 'generated' in cmd.lower():
+                line = cmd.split('by')[-1].split('with')[-1].replace('Version', '').replace('(R)', '').split()
+                if len(line) < 2:
+                    continue
+                slicer = line[0]
+                version = line[1]
+                return (slicer, version)
+        return None
+
+
+    @staticmethod
+    def _matches(lines: list[str], line_no: int, keyword: list[MetaParser.KW], seek_limit = 20) -> bool:
+        """Line-based equivalent of `MetaParser.get_keyword_line` for keywords without offset"""
+        line = lines[line_no]
+        for option in keyword:
+            if not option.command.search(line):
+                continue
+            if option.allow_command is None and option.block_command is None:
+                return True
+
+            for nextline in lines[line_no + 1 : line_no + seek_limit + 1]:
+                if option.block_command is not None and option.block_command.search(nextline):
+                    return False
+                if option.allow_command is not None and option.allow_command.search(nextline):
+                    return True
+
+            if option.allow_command is None:
+                return True
+        return False
+
+
+    @staticmethod
+    def parse_config(lines: list[str]) -> dict[str, str]|None:
+        """
+        Read slicer's config from G-code lines
+        """
+        metadata = {}
+        start_id, end_id = -1, -1
+        for id in range(len(lines)):
+            if start_id == -1:
+                if MetaReader._matches(lines, id, MetaParser.CONFIG_START): start_id = id
+            elif MetaReader._matches(lines, id, MetaParser.CONFIG_END):
+                end_id = id
+                break
+
+        if start_id == -1 or end_id == -1 or end_id - start_id > 1000: return None
+
+        for line in lines[start_id + 1 : end_id]:
+            delimeter = line.find('=')
+            if delimeter < 0: delimeter = line.find(',')
+            key = line[1:delimeter].strip()
+            value = line[delimeter + 1:].strip()
+            metadata[key] = value
+
+        return metadata
+
+
+    @staticmethod
+    def config_files(slicer: str, version: str, config: dict[str, str]) -> dict[str, str]:
+        """
+        Generate configuration file(s) for a given slicer from its config
+
+        Returns:
+            {`filename`, `contents`}
+        """
+        if slicer.lower() in ['cura']:
+            print(f'{slicer.lower()} doesn\'t generate configuration')
+            return {}
+        elif slicer.lower() in ['orcaslicer', 'bambustudio']:
+            machine = config.copy()
+            process = config.copy()
+            filament = {}
+
+            filament_fields = ['filament', 'fan_', 'temp', 'nozzle', 'slow', 'air_']
+            for key in config.keys():
+                if any(field in key for field in filament_fields):
+                    filament[key] = config[key]
+
+            try:
+                inherit_groups = config['inherits_group'].split(';')
+                if inherit_groups[0]:
+                    process['inherits'] = inherit_groups[0]
+                if inherit_groups[1]:
+                    filament['inherits'] = inherit_groups[1]
+                if inherit_groups[2]:
+                    machine['inherits'] = inherit_groups[2]
+                    process['compatible_printers'] = [inherit_groups[2]]
+                    filament['compatible_printers'] = [inherit_groups[2]]
+            except KeyError:
+                pass
+
+            filament['from'] = 'User'
+            filament['type'] = 'filament'
+            filament['is_custom_defined'] = '0'
+            filament['version'] = version
+            filament['name'] = config['filament_settings_id']
+
+            machine['from'] = 'User'
+            machine['type'] = 'machine'
+            machine['is_custom_defined'] = '0'
+            machine['version'] = version
+            machine['name'] = config['printer_settings_id']
+
+            process['from'] = 'User'
+            process['type'] = 'process'
+            process['is_custom_defined'] = '0'
+            process['version'] = version
+            process['name'] = config['print_settings_id']
+
+            filament_str = json.dumps(filament, indent=4)
+            machine_str = json.dumps(machine, indent=4)
+            process_str = json.dumps(process, indent=4)
+
+            return {'filament.json': filament_str, 'machine.json': machine_str, 'process.json': process_str}
+
+        else:
+            if slicer.lower() not in ['prusaslicer', 'slic3r', 'superslicer']:
+                print('Unsupported slicer: trying generating slic3r config')
+            output = ''
+            for key in config.keys():
+                output += key + ' = ' + config[key] + '\n'
+            return {'config.ini': output}
+
+
+    @staticmethod
+    def read_thumbnails(filename: str, head_size: int|None = None) -> list[bytes]:
+        """
+        Get all thumbnails from the beginning of a G-code file, ordered as appearing in the file
+
+        Args:
+            filename: `str` - path to a G-code file
+            head_size: `int` - initial number of bytes to scan. It is extended when a thumbnail block doesn't fit
+        """
+        from GcodeTools.gcode_bgcode import Bgcode
+        if Bgcode.is_bgcode(filename):
+            return Bgcode.read_thumbnails(filename)
+
+        head_size = MetaReader.HEAD_SIZE if head_size is None else head_size
+        if Compression.detect(filename):
+            # the head is extended from the same stream, as the decompressed size is unknown
+            with Compression.open(filename, 'rb') as f:
+                head = f.read(head_size) + f.readline()
+                while True:
+                    images, complete = MetaReader.parse_thumbnails(MetaReader._decode_lines(head))
+                    more = b'' if complete else f.read(len(head))
+                    if not more:
+                        return images
+                    head += more + f.readline()
+
+        size = os.path.getsize(filename)
+        while True:
+            head, _ = MetaReader.read_lines(filename, head_size, 0)
+            images, complete = MetaReader.parse_thumbnails(head)
+            if complete or head_size >= size:
+                return images
+            head_size *= 2
+
+
+    @staticmethod
+    def get_slicer_name(filename: str) -> tuple[str, str]|None:
+        """
+        Get (`slicer_name`, `slicer_version`) of a G-code file
+        """
+        from GcodeTools.gcode_bgcode import Bgcode
+        if Bgcode.is_bgcode(filename):
+            producer = Bgcode.read_metadata(filename)['file'].get('Producer', '')
+            return MetaReader.parse_slicer_name([f'; generated by {producer}'])
+
+        head, _ = MetaReader.read_lines(filename, 1 << 16, 0)
+        return MetaReader.parse_slicer_name(head)
+
+
+    @staticmethod
+    def read_config(filename: str, head_size: int|None = None, tail_size: int|None = None) -> dict[str, str]|None:
+        """
+        Read slicer's config from the end (or the beginning) of a G-code file
+        """
+        from GcodeTools.gcode_bgcode import Bgcode
+        if Bgcode.is_bgcode(filename):
+            return Bgcode.read_metadata(filename)['slicer'] or None
+
+        head, tail = MetaReader.read_lines(filename, head_size, tail_size)
+        config = MetaReader.parse_config(tail)
+        if config is None:
+            config = MetaReader.parse_config(head)
+        return config
+
+
+    @staticmethod
+    def generate_config_files(filename: str) -> dict[str, str]:
+        """
+        Generate configuration file(s) for slicer which generated the G-code file.
+
+        Returns:
+            {`filename`, `contents`}
+        """
+        slicer, version = MetaReader.get_slicer_name(filename)
+        config = MetaReader.read_config(filename)
+        return MetaReader.config_files(slicer, version, config)
@@ -1,6 +1,13 @@
 from GcodeTools.gcode_types import *
 from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_progress import Progress
+import contextlib
+import os
 import re
+import time
+
+if typing.TYPE_CHECKING:
+    from GcodeTools.gcode_profiler import Profiler
 
 
 
@@ -138,19 +145,22 @@ class MetaParser:
     #     return object_map
 
 
+    @staticmethod
+    def sanitize_name(name: str):
+        """Object name as stored in `Gcode.objects`"""
+        return ''.join(c if c.isalnum() else '_' for c in name).strip('_')
+
+
     @staticmethod
     def get_object(id: int, gcode: Gcode):
         
-        def sanitize(name: str):
-            return ''.join(c if c.isalnum() else '_' for c in name).strip('_')
-        
         is_end = MetaParser.get_keyword_line(id, gcode, MetaParser.OBJECT_END)
         if is_end:
             return Static.NO_OBJECT
         
         _, name = MetaParser.get_keyword_arg(id, gcode, MetaParser.OBJECT_START)
         if name is not None:
-            return sanitize(name)
+            return MetaParser.sanitize_name(name)
 
         return None
 
@@ -159,9 +169,18 @@ class MetaParser:
     def fill_meta(gcode: Gcode, progress_callback: typing.Callable|None = None):
         """
         Args:
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         passed `Gcode` gets modified so meta is added into it
         """
+        if gcode.profiler is not None:
+            with gcode.profiler.stage('fill_meta', lines=len(gcode)):
+                return MetaParser._fill_meta(gcode, progress_callback)
+        return MetaParser._fill_meta(gcode, progress_callback)
+
+
+    @staticmethod
+    def _fill_meta(gcode: Gcode, progress_callback: typing.Callable|None = None):
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('meta')
         was_start = False
         layer = 0
         move_type = -1
@@ -219,28 +238,53 @@ class GcodeParser:
 
 
     @staticmethod
-    def from_str(gcode: Gcode, gcode_str: str, block = Block(), progress_callback: typing.Callable|None = None) -> Gcode:
+    def from_str(gcode: Gcode, gcode_str: str, block: Block|None = None, progress_callback: typing.Callable|None = None) -> Gcode:
         """
         Args:
             gcode: `Gcode` or `None`. When `Gcode`, uses its config. When `None`, creates an empty `Gcode`
             gcode_str: `str` - string that will be parsed into `Gcode`
             block: `Block` - initial printer state
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         """
         return GcodeParser._generate_moves(gcode, gcode_str, block, progress_callback)
 
 
     @staticmethod
-    def from_file(gcode: Gcode, filename: str, block = Block(), progress_callback: typing.Callable|None = None) -> Gcode:
+    def from_file(gcode: Gcode, filename: str, block: Block|None = None, progress_callback: typing.Callable|None = None) -> Gcode:
         """
         Args:
             gcode: `Gcode` or `None`. When `Gcode`, uses its config. When `None`, creates an empty `Gcode`
-            filename: `str` - filename containing g-code to be parsed
+            filename: `str` - filename containing g-code to be parsed. Binary G-code (`.bgcode`) and gzip, bzip2, xz compression
+                are detected by their headers. Compressed files are decompressed in a background thread while parsing
             block: `Block` - initial printer state
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`. For compressed files, parsing progress
+                counts compressed bytes read out of the file size
         """
+        from GcodeTools.gcode_bgcode import Bgcode
+        if Bgcode.is_bgcode(filename):
+            if gcode.profiler is None:
+                return GcodeParser.from_str(gcode, Bgcode.to_str(filename), block, progress_callback)
+            with gcode.profiler.stage('read') as args:
+                gcode_str = Bgcode.to_str(filename)
+                args['bytes'] = len(gcode_str)
+            return GcodeParser.from_str(gcode, gcode_str, block, progress_callback)
+
+        from GcodeTools.gcode_compression import Compression
+        compression = Compression.detect(filename)
+        if compression:
+            size = os.path.getsize(filename)
+            with open(filename, 'rb') as raw, Compression.open(raw, 'r', compression) as f:
+                if isinstance(progress_callback, Progress): progress_callback.set_stage('parse')
+                callback = (lambda current, total: progress_callback(Compression.read_position(f), size)) if progress_callback else None
+                return GcodeParser._generate_moves(gcode, f, block, callback)
+
         with open(filename, 'r') as f:
-            return GcodeParser.from_str(gcode, f.read(), block, progress_callback)
+            if gcode.profiler is None:
+                return GcodeParser.from_str(gcode, f.read(), block, progress_callback)
+            with gcode.profiler.stage('read') as args:
+                gcode_str = f.read()
+                args['bytes'] = len(gcode_str)
+        return GcodeParser.from_str(gcode, gcode_str, block, progress_callback)
 
 
     @staticmethod
@@ -251,26 +295,36 @@ class GcodeParser:
         Args:
             gcode: `Gcode`
             verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         Returns:
             str
         """
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('write')
         coords = CoordSystem(position=Vector(F=gcode.config.speed), abs_e=False)
         out_str = gcode.header + '\n' + coords.to_str()
 
         len_blocks = len(gcode)
+        profiler = gcode.profiler
 
-        for i in range(len_blocks):
-            
-            line_str = gcode.block_to_str(i, verbose)
-            
-            out_str += line_str
+        with profiler.stage('write', lines=len_blocks) if profiler else contextlib.nullcontext({}) as args:
+            block_to_str = 0.0
+            for i in range(len_blocks):
+                
+                if profiler: start = time.perf_counter()
+                line_str = gcode.block_to_str(i, verbose)
+                if profiler: block_to_str += time.perf_counter() - start
+                
+                out_str += line_str
+                
+                if progress_callback:
+                    progress_callback(i, len_blocks)
             
-            if progress_callback:
-                progress_callback(i, len_blocks)
-        
+            out_str += '\n' + gcode.footer
+            if profiler:
+                profiler.add('write.block_to_str', block_to_str, len_blocks, len_blocks)
+                args['bytes'] = len(out_str)
         
-        return out_str + '\n' + gcode.footer
+        return out_str
 
 
     @staticmethod
@@ -280,20 +334,31 @@ class GcodeParser:
         
         Args:
             gcode: `Gcode`
-            filename: `str` of output path
+            filename: `str` of output path. `.bgcode` files are written as binary G-code, see `Bgcode.write_file`.
+                `.gz`, `.bz2` and `.xz` files are compressed in a background thread, see `Compression`
             verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
-            progress_callback: `Callable(current: int, total: int)`
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
         """
+        from GcodeTools.gcode_compression import Compression
+        if str(filename).lower().endswith('.bgcode'):
+            from GcodeTools.gcode_bgcode import Bgcode
+            return Bgcode.write_file(gcode, filename, verbose, progress_callback)
+
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('write')
         coords = CoordSystem(position=Vector(F=gcode.config.speed), abs_e=False)
-        
-        with open(filename, 'w') as f:
-            f.write(gcode.header + '\n' + coords.to_str())
 
-            len_blocks = len(gcode)
+        len_blocks = len(gcode)
+        profiler = gcode.profiler
+
+        with Compression.open(filename, 'w') as f, profiler.stage('write', lines=len_blocks) if profiler else contextlib.nullcontext({}) as args:
+            f.write(gcode.header + '\n' + coords.to_str())
 
+            block_to_str = 0.0
             for i in range(len_blocks):
                 
+                if profiler: start = time.perf_counter()
                 line_str = gcode.block_to_str(i, verbose)
+                if profiler: block_to_str += time.perf_counter() - start
                 
                 f.write(line_str)
                 
@@ -301,6 +366,28 @@ class GcodeParser:
                     progress_callback(i, len_blocks)
 
             f.write('\n' + gcode.footer)
+            if profiler:
+                profiler.add('write.block_to_str', block_to_str, len_blocks, len_blocks)
+                if f.seekable(): args['bytes'] = f.tell()
+
+
+    @staticmethod
+    def iter_str(gcode: Gcode, verbose = False) -> typing.Iterator[str]:
+        """
+        Yields G-Code text piece by piece, as `write_str` would write it: header, one string per `Block`, then footer.
+        Used to stream G-code without building the whole string
+
+        Args:
+            gcode: `Gcode`
+            verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
+        """
+        coords = CoordSystem(position=Vector(F=gcode.config.speed), abs_e=False)
+        yield gcode.header + '\n' + coords.to_str()
+
+        for i in range(len(gcode)):
+            yield gcode.block_to_str(i, verbose)
+
+        yield '\n' + gcode.footer
 
 
     @staticmethod
@@ -331,7 +418,7 @@ class GcodeParser:
 
 
     @staticmethod
-    def _parse_line(parser_data: 'GcodeParser.ParserData', config: Config) -> list['GcodeParser.ParserData']:
+    def _parse_line(parser_data: 'GcodeParser.ParserData', config: Config, profiler: 'Profiler|None' = None) -> list['GcodeParser.ParserData']:
 
         pd = parser_data.copy()
         command = None
@@ -341,7 +428,12 @@ class GcodeParser:
         pd.block.e_wait = 0
         pd.block.bed_wait = 0
         
-        line_dict: dict = GcodeParser._line_to_dict(pd.block.command)
+        if profiler:
+            start = time.perf_counter()
+            line_dict: dict = GcodeParser._line_to_dict(pd.block.command)
+            profiler.add('parse.line_to_dict', time.perf_counter() - start, lines=1)
+        else:
+            line_dict: dict = GcodeParser._line_to_dict(pd.block.command)
         command: str = line_dict['0']
         
         if command in ['G0', 'G1', 'G2', 'G3']:
@@ -409,28 +501,85 @@ class GcodeParser:
 
 
     @staticmethod
-    def _generate_moves(gcode: Gcode, gcode_str: str, block = Block(), progress_callback = None) -> Gcode:
-
-        coord_system = CoordSystem(position=Vector(F=gcode.config.speed))
-        block = block.copy()
+    def _initial_state(config: Config, block: Block|None = None) -> 'GcodeParser.ParserData':
+        """Printer state before the first line is parsed. `block` is copied, never modified"""
+        coord_system = CoordSystem(position=Vector(F=config.speed))
+        block = block.copy() if block is not None else Block()
         block.position = coord_system.position
-        
-        gcode_lines = list(filter(str.strip, gcode_str.split('\n')))
-        
-        len_gcode_lines = len(gcode_lines)
-        
-        pd = GcodeParser.ParserData(coord_system, block)
-        
-        for i, line in enumerate(gcode_lines):
-            
+        return GcodeParser.ParserData(coord_system, block)
+
+
+    @staticmethod
+    def iter_blocks(lines: typing.Iterable[str], config: Config, block: Block|None = None, progress_callback: typing.Callable|None = None, profiler: 'Profiler|None' = None) -> typing.Iterator[Block]:
+        """
+        Parse G-code lines lazily, one `Block` at a time. Metadata (`layer`, `object`, `move_type`) is not filled
+
+        Args:
+            lines: `Iterable[str]` - G-code lines, e.g. an open file
+            config: `Config`
+            block: `Block` - initial printer state
+            progress_callback: `Callable(current: int, total: int)` or `Progress`. `total` is only known when `lines` is a `list`
+            profiler: `Profiler` - aggregates time spent in `_parse_line` as `parse.parse_line`
+        """
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('parse')
+        len_lines = len(lines) if isinstance(lines, list) else None
+
+        pd = GcodeParser._initial_state(config, block)
+
+        for i, line in enumerate(lines):
+            if not line.strip():
+                continue
+
             pd.block.command = line
-            list_pd:list[GcodeParser.ParserData] = GcodeParser._parse_line(pd, gcode.config)
-            
+            if profiler:
+                start = time.perf_counter()
+                list_pd:list[GcodeParser.ParserData] = GcodeParser._parse_line(pd, config, profiler)
+                profiler.add('parse.parse_line', time.perf_counter() - start, lines=1)
+            else:
+                list_pd:list[GcodeParser.ParserData] = GcodeParser._parse_line(pd, config)
+
             for num in list_pd:
-                gcode.append(num.block)
+                yield num.block
             pd = list_pd[-1]
-            
+
             if progress_callback:
-                progress_callback(i, len_gcode_lines)
-        
-        return gcode
\ No newline at end of file
+                progress_callback(i, len_lines)
+
+
+    @staticmethod
+    def _generate_moves(gcode: Gcode, gcode_str: str|typing.Iterable[str], block: Block|None = None, progress_callback = None) -> Gcode:
+        """`gcode_str` is a string or an iterable of lines, e.g. an open file, which is parsed while it's read"""
+
+        profiler = gcode.profiler
+        if profiler is None:
+            gcode_lines = list(filter(str.strip, gcode_str.split('\n'))) if isinstance(gcode_str, str) else gcode_str
+
+            for block in GcodeParser.iter_blocks(gcode_lines, gcode.config, block, progress_callback):
+                gcode.append(block)
+
+            return gcode
+
+        if not isinstance(gcode_str, str):
+            with profiler.stage('parse') as args:
+                append = 0.0
+                for block in GcodeParser.iter_blocks(gcode_str, gcode.config, block, progress_callback, profiler):
+                    start = time.perf_counter()
+                    gcode.append(block)
+                    append += time.perf_counter() - start
+                profiler.add('parse.append', append, len(gcode))
+                args['lines'] = len(gcode)
+            return gcode
+
+        with profiler.stage('parse', bytes=len(gcode_str)) as args:
+            with profiler.stage('parse.split_lines', bytes=len(gcode_str)) as split_args:
+                gcode_lines = list(filter(str.strip, gcode_str.split('\n')))
+                args['lines'] = split_args['lines'] = len(gcode_lines)
+
+            append = 0.0
+            for block in GcodeParser.iter_blocks(gcode_lines, gcode.config, block, progress_callback, profiler):
+                start = time.perf_counter()
+                gcode.append(block)
+                append += time.perf_counter() - start
+            profiler.add('parse.append', append, len(gcode))
+
+        return gcode
@@ -0,0 +1,159 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import typing
+
+
+
+class Profiler:
+    """
+    Collects per-stage statistics of G-code processing: wall time, call count, lines and bytes processed
+    and optionally memory allocations (using `tracemalloc`).
+
+    Pass it to `Gcode` to profile parsing, metadata and writing. Stages are nested with a dot,
+    e.g. `parse.line_to_dict` is the time spent in `GcodeParser._line_to_dict` while parsing.
+    Hot-path stages (called once per line) are only aggregated, top-level stages are also recorded as trace events.
+
+    Example:
+    ```
+    profiler = Profiler(track_allocations=True)
+    gcode = Gcode('file.gcode', profiler=profiler)
+    gcode.write_file('out.gcode')
+    print(profiler.report())
+    profiler.write_chrome_trace('trace.json') # open in chrome://tracing or https://ui.perfetto.dev
+    ```
+    """
+
+    def __init__(self, track_allocations = False):
+        """
+        Args:
+            track_allocations: `bool` - measure memory allocated in stages. Slows down profiled code considerably
+        """
+        self.track_allocations = track_allocations
+        self.stages: dict[str, dict] = {}
+        """`name`: `dict` with `seconds`, `calls`, `lines`, `bytes` and, when tracking allocations, `alloc_bytes`, `alloc_peak`"""
+        self.events: list[dict] = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    def add(self, name: str, seconds: float, calls = 1, lines = 0, bytes = 0):
+        """
+        Add measurement to a stage. Used for aggregating hot paths, where a trace event per call would be too expensive
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'lines': 0, 'bytes': 0}
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+            stage['lines'] += lines
+            stage['bytes'] += bytes
+
+
+    @contextlib.contextmanager
+    def stage(self, name: str, lines = 0, bytes = 0) -> typing.Iterator[dict]:
+        """
+        Measure a stage, recording it as a trace event
+
+        Yields:
+            `dict` of event arguments, `lines` and `bytes` can be updated when they are known only after processing
+        """
+        args = {'lines': lines, 'bytes': bytes}
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        frame = {'peak': 0, 'started': False}
+        tracemalloc = None
+        if self.track_allocations:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                frame['started'] = True
+            current, peak = tracemalloc.get_traced_memory()
+            if stack: stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            self.add(name, seconds, 1, args['lines'], args['bytes'])
+
+            if tracemalloc is not None:
+                end, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame['peak'])
+                if stack: stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                args['alloc_bytes'] = end - current
+                args['alloc_peak'] = peak - current
+                with self._lock:
+                    stage = self.stages[name]
+                    stage['alloc_bytes'] = stage.get('alloc_bytes', 0) + args['alloc_bytes']
+                    stage['alloc_peak'] = max(stage.get('alloc_peak', 0), args['alloc_peak'])
+                if frame['started']:
+                    tracemalloc.stop()
+
+            with self._lock:
+                self.events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': round((start - self._start) * 1e6, 3),
+                    'dur': round(seconds * 1e6, 3),
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                    'args': args,
+                })
+
+
+    def reset(self):
+        """Clear all collected data"""
+        with self._lock:
+            self.stages = {}
+            self.events = []
+            self._start = time.perf_counter()
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            `dict` of stages, with `lines_per_s` and `mb_per_s` added
+        """
+        stages = {}
+        for name, stage in self.stages.items():
+            stage = dict(stage)
+            stage['seconds'] = round(stage['seconds'], 6)
+            if stage['seconds'] > 0:
+                if stage['lines']: stage['lines_per_s'] = round(stage['lines'] / stage['seconds'])
+                if stage['bytes']: stage['mb_per_s'] = round(stage['bytes'] / 1e6 / stage['seconds'], 3)
+            stages[name] = stage
+        return {'stages': stages}
+
+
+    def write_json(self, filename: str):
+        """Write stage statistics as JSON"""
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+
+    def write_chrome_trace(self, filename: str):
+        """
+        Write Chrome trace-event file, viewable in `chrome://tracing`, Perfetto or speedscope.
+        Aggregated hot-path stages are added to `otherData`
+        """
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms', 'otherData': self.to_dict()['stages']}, f)
+
+
+    def report(self) -> str:
+        """Human readable table of stages"""
+        lines = [f'{"stage":32} {"seconds":>10} {"calls":>10} {"lines":>10} {"MB/s":>9}']
+        for name, stage in self.to_dict()['stages'].items():
+            lines.append(f'{name:32} {stage["seconds"]:10.4f} {stage["calls"]:10} {stage["lines"]:10} {stage.get("mb_per_s", ""):>9}')
+        return '\n'.join(lines)
@@ -0,0 +1,97 @@
+import threading
+import time
+import typing
+
+
+
+class OperationCancelled(Exception):
+    """Raised inside an operation whose `Progress` was cancelled"""
+
+
+
+class Progress:
+    """
+    Progress and cancellation token, usable everywhere a `progress_callback` is accepted.
+
+    Reports are throttled to at most one per `interval` seconds or per `percent` of progress,
+    so the callback doesn't slow down per-line loops. The stage (`parse`, `meta`, `write`) is set by the running operation.
+
+    `cancel()` can be called from any thread. The running operation raises `OperationCancelled` on its next line.
+
+    Example:
+    ```
+    progress = Progress(lambda current, total, stage: print(stage, current, total), interval=0.5)
+    threading.Timer(10, progress.cancel).start()
+    try:
+        gcode = Gcode().from_file('big.gcode', progress_callback=progress)
+    except OperationCancelled:
+        print('Loading cancelled')
+    ```
+    """
+
+    def __init__(self, callback: typing.Callable[[int, int|None, str|None], None]|None = None, interval: float|None = 0.1, percent: float|None = 1.0):
+        """
+        Args:
+            callback: `Callable(current: int, total: int|None, stage: str|None)`
+            interval: `float` - report at most every `interval` seconds. `None` to only use `percent`
+            percent: `float` - report when progress advanced by `percent` percent. `None` to only use `interval`
+        """
+        self.callback = callback
+        self.interval = interval
+        self.percent = percent
+        self.stage: str|None = None
+        self.current = 0
+        self.total: int|None = None
+        self._cancelled = threading.Event()
+        self._last_time = None
+        self._last_percent = None
+
+
+    def set_stage(self, stage: str):
+        """Start reporting a new stage"""
+        self.stage = stage
+        self.current = 0
+        self.total = None
+        self._last_time = None
+        self._last_percent = None
+
+
+    def cancel(self):
+        """Request cancellation. Thread-safe"""
+        self._cancelled.set()
+
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+    def check(self):
+        """Raise `OperationCancelled` if cancellation was requested"""
+        if self._cancelled.is_set():
+            raise OperationCancelled(f'{self.stage or "Operation"} cancelled')
+
+
+    def __call__(self, current: int, total: int|None = None):
+        if self._cancelled.is_set():
+            raise OperationCancelled(f'{self.stage or "Operation"} cancelled')
+
+        self.current = current
+        self.total = total
+        if self.callback is None:
+            return
+
+        now = time.monotonic()
+        done = total is not None and current >= total - 1
+        if not done and self._last_time is not None:
+            due = self.interval is None and (self.percent is None or not total)
+            if self.interval is not None and now - self._last_time >= self.interval:
+                due = True
+            if self.percent is not None and total and (current - self._last_percent) * 100 >= self.percent * total:
+                due = True
+            if not due:
+                return
+
+        self._last_time = now
+        self._last_percent = current
+        self.callback(current, total, self.stage)
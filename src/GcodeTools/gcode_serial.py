@@ -0,0 +1,207 @@
+import collections
+import queue
+import re
+import threading
+import time
+import typing
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_progress import Progress
+
+
+
+class SerialSender:
+    """
+    Streams G-code to a printer over serial, as a host like Printrun or OctoPrint would.
+
+    Each command is sent as `N<line> <command>*<checksum>`. Up to `window` commands are in flight,
+    each `ok` from the firmware allows sending the next one. `Resend: N` rewinds to line `N`.
+
+    `port` is a device path opened with `pyserial` (`pip install pyserial`), or any object with `write(bytes)`
+    and blocking `readline() -> bytes`, e.g. a pty opened with `open(path, 'r+b', buffering=0)`.
+
+    Example:
+    ```
+    with SerialSender('/dev/ttyUSB0', 115200, window=4) as sender:
+        stats = sender.send_gcode(Gcode('file.gcode'))
+    print(stats['lines_per_s'])
+    ```
+    """
+
+    RESEND = re.compile(r'^(?:resend|rs)\s*:?\s*N?:?\s*(\d+)', re.IGNORECASE)
+
+
+    def __init__(self, port: str|typing.Any, baudrate = 115200, window = 4, timeout = 30.0, history = 1000):
+        """
+        Args:
+            port: `str` - serial device, or an open binary stream
+            baudrate: `int` - used when opening a device
+            window: `int` - number of commands sent without waiting for `ok`. 1 is the safest, more fills the firmware's buffer
+            timeout: `float` - seconds to wait for any response before raising `TimeoutError`
+            history: `int` - number of sent lines kept for resending
+        """
+        if isinstance(port, str):
+            try:
+                import serial
+            except ImportError:
+                raise ImportError('Opening serial ports requires pyserial. Install it with `pip install pyserial`')
+            self.port = serial.Serial(port, baudrate, timeout=None)
+            self._owns_port = True
+        else:
+            self.port = port
+            self._owns_port = False
+
+        self.window = max(1, window)
+        self.timeout = timeout
+        self.history: collections.OrderedDict[int, bytes] = collections.OrderedDict()
+        self.history_size = history
+        self.responses: queue.Queue[str|None] = queue.Queue()
+        self.log: collections.deque[str] = collections.deque(maxlen=100)
+        """Last responses of the firmware"""
+
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        """Closes the port if it was opened by `SerialSender`"""
+        if self._owns_port:
+            self.port.close()
+
+
+    def _read_loop(self):
+        while True:
+            try:
+                line = self.port.readline()
+            except (OSError, ValueError):
+                line = b''
+            if not line:
+                self.responses.put(None)
+                return
+            self.responses.put(line.decode('ascii', errors='replace').strip())
+
+
+    @staticmethod
+    def checksum(line: str) -> int:
+        """XOR of all bytes of `line`"""
+        result = 0
+        for byte in line.encode('ascii', errors='replace'):
+            result ^= byte
+        return result
+
+
+    @staticmethod
+    def format_line(line_number: int, command: str) -> str:
+        """Returns `N<line_number> <command>*<checksum>`"""
+        line = f'N{line_number} {command}'
+        return f'{line}*{SerialSender.checksum(line)}'
+
+
+    @staticmethod
+    def clean_command(line: str) -> str:
+        """Strips comments and whitespace, empty string if there is no command"""
+        return line.split(';')[0].strip()
+
+
+    def _write(self, line_number: int, data: bytes):
+        self.history[line_number] = data
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+        self.port.write(data)
+
+
+    def send(self, lines: typing.Iterable[str], progress_callback: typing.Callable|None = None) -> dict:
+        """
+        Stream G-code lines. Comments and empty lines are not sent. Returns when all commands are acknowledged
+
+        Args:
+            lines: `Iterable[str]` - G-code lines, e.g. an open file
+            progress_callback: `Callable(current: int, total: None)` or `Progress`
+        Returns:
+            `dict` with `lines`, `seconds`, `lines_per_s`, `resends`, `errors`
+        """
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('send')
+        commands = (command for command in map(SerialSender.clean_command, lines) if command)
+        resend: collections.deque[int] = collections.deque()
+        stats = {'lines': 0, 'resends': 0, 'errors': 0}
+
+        line_number = 0
+        in_flight = 0
+        last_resend = None
+        stale = 0
+        done = False
+        start = time.perf_counter()
+
+        self._write(0, (SerialSender.format_line(0, 'M110 N0') + '\n').encode())
+        in_flight = 1
+
+        while True:
+            while in_flight < self.window:
+                if resend:
+                    number = resend.popleft()
+                    self.port.write(self.history[number])
+                elif not done:
+                    command = next(commands, None)
+                    if command is None:
+                        done = True
+                        continue
+                    line_number += 1
+                    self._write(line_number, (SerialSender.format_line(line_number, command) + '\n').encode())
+                    stats['lines'] += 1
+                    if progress_callback:
+                        progress_callback(stats['lines'], None)
+                else:
+                    break
+                in_flight += 1
+
+            if done and not resend and in_flight == 0:
+                break
+
+            try:
+                response = self.responses.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f'No response from the printer in {self.timeout} s, last line sent: {line_number}')
+            if response is None:
+                raise ConnectionError('Serial port closed')
+            self.log.append(response)
+
+            match = SerialSender.RESEND.match(response)
+            if match:
+                number = int(match.group(1))
+                if number == last_resend and stale > 0:
+                    # lines sent after the broken one are rejected with the same request
+                    stale -= 1
+                    continue
+                if number not in self.history:
+                    raise RuntimeError(f'Printer requested line {number}, which is no longer in history')
+                stats['resends'] += 1
+                # rejected lines are still acknowledged with `ok`, so `in_flight` stays as it is
+                resend = collections.deque(n for n in self.history if n >= number)
+                last_resend = number
+                stale = len(resend) - 1
+            elif response.startswith('ok'):
+                in_flight = max(0, in_flight - 1)
+            elif response.lower().startswith('error'):
+                stats['errors'] += 1
+                if 'halted' in response.lower() or 'kill' in response.lower():
+                    raise RuntimeError(f'Printer halted: {response}')
+
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        stats['lines_per_s'] = round(stats['lines'] / stats['seconds']) if stats['seconds'] else None
+        return stats
+
+
+    def send_gcode(self, gcode: Gcode, progress_callback: typing.Callable|None = None) -> dict:
+        """
+        Stream `Gcode` as it would be written by `write_file`, without creating a file. See `SerialSender.send`
+        """
+        from GcodeTools.gcode_parser import GcodeParser
+        lines = (line for text in GcodeParser.iter_str(gcode) for line in text.split('\n'))
+        return self.send(lines, progress_callback)
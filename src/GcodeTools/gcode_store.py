@@ -0,0 +1,415 @@
+import json
+import mmap
+import struct
+import threading
+import typing
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_progress import Progress
+
+
+
+class GcodeStore:
+    """
+    Versioned binary container of a parsed `Gcode`, loaded without parsing.
+
+    Layout (little-endian): a header with a section table, then 8-byte aligned sections:
+    - `meta` - JSON with header, footer, objects and config
+    - `position` - `float64` X, Y, Z, E, F of every block
+    - `state` - `float64` values of `Block` state (`STATE` order), with their kinds in `kinds` (`uint8`)
+    - `command` - `int32` index of the command in the string table, -1 for `None`
+    - `str_off`, `str_data` - string table: `uint64` offsets into UTF-8 data. Holds commands and string state values
+
+    Example:
+    ```
+    Gcode('file.gcode').save('file.gts')
+    gcode = Gcode.load('file.gts')   # memory mapped, blocks are created when accessed
+    ```
+    """
+
+    MAGIC = b'GCTS'
+    VERSION = 1
+
+    HEADER = struct.Struct('<4sHHQII')
+    """magic, version, reserved, block count, section count, reserved"""
+    SECTION = struct.Struct('<8sQQ')
+    """name, offset, length"""
+
+    STATE = ('emit_command', 'e_temp', 'e_wait', 'bed_temp', 'bed_wait', 'fan', 'T', 'object', 'move_type', 'layer')
+
+    NONE, BOOL, INT, FLOAT, STR = range(5)
+    """Kinds of state values"""
+
+    POSITION = struct.Struct('<5d')
+    STATE_VALUES = struct.Struct(f'<{len(STATE)}d')
+    STATE_KINDS = struct.Struct(f'<{len(STATE)}B')
+    INDEX = struct.Struct('<i')
+    OFFSET = struct.Struct('<Q')
+
+    _attach_lock = threading.Lock()
+
+
+    @staticmethod
+    def to_bytes(gcode: Gcode, progress_callback: typing.Callable|None = None) -> bytes:
+        """
+        Serialize `Gcode` into the container format
+
+        Args:
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
+        """
+        from array import array
+        import sys
+
+        if isinstance(progress_callback, Progress): progress_callback.set_stage('save')
+        S = GcodeStore
+        strings: dict[str, int] = {}
+        position = array('d')
+        state = array('d')
+        kinds = array('B')
+        command = array('i')
+
+        def value(item):
+            if item is None: return (S.NONE, 0.0)
+            if isinstance(item, bool): return (S.BOOL, float(item))
+            if isinstance(item, int): return (S.INT, float(item))
+            if isinstance(item, float): return (S.FLOAT, item)
+            return (S.STR, float(strings.setdefault(str(item), len(strings))))
+
+        len_gcode = len(gcode)
+        for id, block in enumerate(gcode):
+            p = block.position
+            position.extend((p.X, p.Y, p.Z, p.E, p.F))
+            for kind, number in map(value, (block.emit_command, block.e_temp, block.e_wait, block.bed_temp, block.bed_wait, block.fan, block.T, block.object, block.move_type, block.layer)):
+                kinds.append(kind)
+                state.append(number)
+            command.append(-1 if block.command is None else strings.setdefault(block.command, len(strings)))
+            if progress_callback:
+                progress_callback(id, len_gcode)
+
+        str_data = bytearray()
+        str_off = array('Q', [0])
+        for string in strings:
+            str_data += string.encode('utf-8')
+            str_off.append(len(str_data))
+
+        if sys.byteorder != 'little':
+            for column in (position, state, command, str_off):
+                column.byteswap()
+
+        meta = {
+            'header': gcode.header,
+            'footer': gcode.footer,
+            'objects': gcode.objects,
+            'config': vars(gcode.config),
+        }
+        sections = [
+            (b'meta', json.dumps(meta).encode('utf-8')),
+            (b'position', position.tobytes()),
+            (b'state', state.tobytes()),
+            (b'kinds', kinds.tobytes()),
+            (b'command', command.tobytes()),
+            (b'str_off', str_off.tobytes()),
+            (b'str_data', bytes(str_data)),
+        ]
+
+        out = bytearray(S.HEADER.pack(S.MAGIC, S.VERSION, 0, len_gcode, len(sections), 0))
+        table_at = len(out)
+        out += bytes(S.SECTION.size * len(sections))
+        table = []
+        for name, data in sections:
+            out += bytes(-len(out) % 8)
+            table.append(S.SECTION.pack(name, len(out), len(data)))
+            out += data
+        out[table_at:table_at + S.SECTION.size * len(sections)] = b''.join(table)
+        return bytes(out)
+
+
+    @staticmethod
+    def save(gcode: Gcode, filename: str, progress_callback: typing.Callable|None = None):
+        """
+        Write `Gcode` into a container file, see `GcodeStore`
+
+        Args:
+            progress_callback: `Callable(current: int, total: int)` or `Progress`
+        """
+        data = GcodeStore.to_bytes(gcode, progress_callback)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+
+    @staticmethod
+    def sections(buffer) -> tuple[int, dict[str, memoryview]]:
+        """
+        Read the header of a container
+
+        Args:
+            buffer: `bytes`, `mmap` or any buffer holding a container
+        Returns:
+            `tuple` of (`block_count`, `dict` of section name: `memoryview`)
+        """
+        S = GcodeStore
+        view = memoryview(buffer).cast('B')
+        if len(view) < S.HEADER.size:
+            raise ValueError('Not a GcodeTools store: file is too short')
+        magic, version, _, count, n_sections, _ = S.HEADER.unpack_from(view, 0)
+        if magic != S.MAGIC:
+            raise ValueError('Not a GcodeTools store: wrong magic')
+        if version > S.VERSION:
+            raise ValueError(f'GcodeTools store version {version} is newer than supported version {S.VERSION}')
+        sections = {}
+        for i in range(n_sections):
+            name, offset, length = S.SECTION.unpack_from(view, S.HEADER.size + i * S.SECTION.size)
+            sections[name.rstrip(b'\0').decode('ascii')] = view[offset:offset + length]
+        return (count, sections)
+
+
+    @staticmethod
+    def load(filename: str) -> 'StoredGcode':
+        """
+        Memory-map a container file. Blocks are created when they are accessed, see `StoredGcode`
+        """
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return StoredGcode(buffer)
+
+
+    @staticmethod
+    def publish(gcode: Gcode, name: str|None = None) -> 'multiprocessing.shared_memory.SharedMemory':
+        """
+        Put `Gcode` into shared memory, to be attached by other processes with `GcodeStore.attach(shm.name)`.
+        The caller owns the memory: call `shm.close()` and `shm.unlink()` when workers are done
+
+        Args:
+            name: `str` - name of the shared memory block. Random when `None`
+        """
+        from multiprocessing import shared_memory
+        data = GcodeStore.to_bytes(gcode)
+        shm = shared_memory.SharedMemory(name, create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        return shm
+
+
+    @staticmethod
+    def attach(name: str) -> 'StoredGcode':
+        """
+        Attach read-only to `Gcode` published with `GcodeStore.publish`. Nothing is copied: blocks are created
+        from shared memory when accessed. Call `StoredGcode.close()` when done.
+
+        Attached `StoredGcode` is pickled as the name of its shared memory, so passing it to workers costs O(1)
+        """
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # before Python 3.13 attaching registers the block, so it is unlinked when any attached process exits
+            from multiprocessing import resource_tracker
+            with GcodeStore._attach_lock:
+                register = resource_tracker.register
+                resource_tracker.register = lambda name, rtype: None
+                try:
+                    shm = shared_memory.SharedMemory(name)
+                finally:
+                    resource_tracker.register = register
+        gcode = StoredGcode(memoryview(shm.buf).toreadonly())
+        gcode._shm = shm
+        return gcode
+
+
+    @staticmethod
+    def is_store(filename: str) -> bool:
+        with open(filename, 'rb') as f:
+            return f.read(len(GcodeStore.MAGIC)) == GcodeStore.MAGIC
+
+
+
+class StoredGcode(Gcode):
+    """
+    `Gcode` backed by a `GcodeStore` buffer: a memory-mapped file or shared memory.
+
+    Blocks are created from the columns on first access and cached, so edits of a `Block` are kept.
+    Any change of the list itself (insert, delete, sort...) first creates all blocks and detaches from the buffer.
+    """
+
+    def __init__(self, buffer):
+        """
+        Args:
+            buffer: `bytes`, `mmap` or any buffer holding a `GcodeStore` container
+        """
+        super().__init__()
+        count, sections = GcodeStore.sections(buffer)
+        meta = json.loads(bytes(sections['meta']).decode('utf-8'))
+        self.header = meta['header']
+        self.footer = meta['footer']
+        self.objects = meta['objects']
+        for key, value in meta['config'].items():
+            setattr(self.config, key, value)
+
+        self._buffer = buffer
+        self._sections = sections
+        self._count = count
+        self._blocks: list[Block|None]|None = [None] * count
+        self._shm = None
+
+
+    def __reduce__(self):
+        if self._shm is not None and self._blocks is not None:
+            return (GcodeStore.attach, (self._shm.name,))
+        self.materialize()
+        return super().__reduce__()
+
+
+    def close(self):
+        """Release the buffer, detaching from shared memory. Blocks that weren't accessed are lost"""
+        for view in self._sections.values():
+            view.release()
+        self._sections = {}
+        if isinstance(self._buffer, memoryview):
+            self._buffer.release()
+        self._buffer = None
+        if self._blocks is not None:
+            self._count = 0
+            self._blocks = []
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+    @property
+    def columns(self) -> dict[str, memoryview]:
+        """
+        Raw columns: `position` (`float64`, 5 per block), `state` (`float64`, `len(GcodeStore.STATE)` per block),
+        `kinds` (`uint8`), `command` (`int32`). Use e.g. `numpy.frombuffer(columns['position']).reshape(-1, 5)`.
+        Empty after the list was modified
+        """
+        if self._blocks is None: return {}
+        return {name: self._sections[name] for name in ('position', 'state', 'kinds', 'command')}
+
+
+    @property
+    def untouched(self) -> bool:
+        """`True` when no block was accessed yet, so `columns` hold the current state of every block"""
+        return self._blocks is not None and not any(self._blocks)
+
+
+    def _string(self, index: int) -> str:
+        start, = GcodeStore.OFFSET.unpack_from(self._sections['str_off'], index * 8)
+        end, = GcodeStore.OFFSET.unpack_from(self._sections['str_off'], index * 8 + 8)
+        return bytes(self._sections['str_data'][start:end]).decode('utf-8')
+
+
+    def _block(self, index: int) -> Block:
+        S = GcodeStore
+        sections = self._sections
+        values = S.STATE_VALUES.unpack_from(sections['state'], index * S.STATE_VALUES.size)
+        kinds = S.STATE_KINDS.unpack_from(sections['kinds'], index * S.STATE_KINDS.size)
+        state = []
+        for kind, value in zip(kinds, values):
+            if kind == S.NONE: state.append(None)
+            elif kind == S.BOOL: state.append(bool(value))
+            elif kind == S.INT: state.append(int(value))
+            elif kind == S.FLOAT: state.append(value)
+            else: state.append(self._string(int(value)))
+        command, = S.INDEX.unpack_from(sections['command'], index * 4)
+        position = Vector(*S.POSITION.unpack_from(sections['position'], index * S.POSITION.size))
+        emit_command, e_temp, e_wait, bed_temp, bed_wait, fan, T, object, move_type, layer = state
+        return Block(None if command < 0 else self._string(command), emit_command, position, e_temp, e_wait, bed_temp, bed_wait, fan, T, object, move_type, layer)
+
+
+    def _get(self, index: int) -> Block:
+        block = self._blocks[index]
+        if block is None:
+            block = self._block(index)
+            self._blocks[index] = block
+        return block
+
+
+    def materialize(self):
+        """Create all blocks and detach from the buffer. Called before any change of the list"""
+        if self._blocks is None: return
+        blocks = [self._get(i) for i in range(self._count)]
+        self.close()
+        self._blocks = None
+        self.__super__().extend(blocks)
+
+
+    def __iter__(self):
+        if self._blocks is None: return super().__iter__()
+        return (self._get(i) for i in range(self._count))
+
+
+    def __len__(self):
+        if self._blocks is None: return super().__len__()
+        return self._count
+
+
+    def __getitem__(self, key):
+        if self._blocks is None: return super().__getitem__(key)
+        if isinstance(key, slice):
+            new_gcode = self.new()
+            for i in range(self._count)[key]:
+                new_gcode.__super__().append(self._get(i))
+            return new_gcode
+        return self._get(range(self._count)[key])
+
+
+    def __reversed__(self):
+        return (self[i] for i in reversed(range(len(self))))
+
+
+    def __contains__(self, value):
+        return any(block is value or block == value for block in self)
+
+
+    def index(self, *args):
+        self.materialize()
+        return super().index(*args)
+
+
+    def count(self, value):
+        self.materialize()
+        return super().count(value)
+
+
+    def insert(self, index: int, value: Block|str):
+        self.materialize()
+        return super().insert(index, value)
+
+
+    def __setitem__(self, key, value):
+        self.materialize()
+        return super().__setitem__(key, value)
+
+
+    def __delitem__(self, key):
+        self.materialize()
+        return super().__delitem__(key)
+
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+
+    def pop(self, *args):
+        self.materialize()
+        return super().pop(*args)
+
+
+    def remove(self, value):
+        self.materialize()
+        return super().remove(value)
+
+
+    def clear(self):
+        self.materialize()
+        return super().clear()
+
+
+    def reverse(self):
+        self.materialize()
+        return super().reverse()
+
+
+    def sort(self, *args, **kwargs):
+        self.materialize()
+        return super().sort(*args, **kwargs)
@@ -0,0 +1,102 @@
+import itertools
+from GcodeTools.gcode_types import *
+from GcodeTools.gcode import Gcode
+from GcodeTools.gcode_parser import GcodeParser
+
+
+
+class GcodeStream:
+    """
+    Constant-memory G-code processing: input is parsed and written in chunks of `Gcode`.
+
+    Metadata (`layer`, `object`, `move_type`) is not filled, as it needs look-ahead over the whole file.
+    Only operations which work on consecutive blocks can be streamed, like `Tools.translate` or `Tools.trim`.
+
+    Example:
+    ```
+    with open('in.gcode') as fin, open('out.gcode', 'w') as fout:
+        chunks = GcodeStream.read(fin)
+        chunks = GcodeStream.apply(chunks, lambda chunk: Tools.translate(chunk, Vector(10, 0, 0)))
+        GcodeStream.write(chunks, fout)
+    ```
+    """
+
+    CHUNK_SIZE = 10000
+    """Default number of `Block`s in a chunk"""
+
+
+    @staticmethod
+    def read(lines: typing.Iterable[str], config: Config|None = None, chunk_size: int|None = None) -> typing.Iterator[Gcode]:
+        """
+        Parse G-code lines into consecutive `Gcode` chunks
+
+        Args:
+            lines: `Iterable[str]` - G-code lines, e.g. an open file or `sys.stdin`
+            config: `Config` of created chunks
+            chunk_size: `int` - number of `Block`s in a chunk
+        """
+        config = config or Config()
+        chunk_size = chunk_size or GcodeStream.CHUNK_SIZE
+        blocks = GcodeParser.iter_blocks(lines, config)
+
+        while True:
+            chunk = Gcode(config=config)
+            for block in itertools.islice(blocks, chunk_size):
+                chunk.append(block)
+            if not len(chunk):
+                return
+            yield chunk
+
+
+    @staticmethod
+    def apply(chunks: typing.Iterable[Gcode], operation: typing.Callable[[Gcode], Gcode], one_to_one = True) -> typing.Iterator[Gcode]:
+        """
+        Apply `operation` on each chunk.
+
+        The last input `Block` of a previous chunk is put in front of each chunk, so operations comparing consecutive blocks
+        behave the same as on a whole `Gcode`.
+
+        Args:
+            operation: `Callable(Gcode) -> Gcode`
+            one_to_one: `bool` - `True` if `operation` returns one `Block` per input `Block` (like `Tools.translate`),
+                `False` if it drops the first `Block` itself (like `Tools.trim`)
+        """
+        prev = None
+        for chunk in chunks:
+            last = chunk[-1]
+            if prev is not None:
+                chunk.__super__().insert(0, prev)
+            out = operation(chunk)
+            if prev is not None and one_to_one:
+                out = out[1:]
+            prev = last
+            yield out
+
+
+    @staticmethod
+    def write(chunks: typing.Iterable[Gcode], file: typing.TextIO, verbose = False, config: Config|None = None):
+        """
+        Write `Gcode` chunks into a text file, as `Gcode.write_file` would write a whole `Gcode`
+
+        Args:
+            chunks: `Iterable[Gcode]`
+            file: `TextIO` - opened file, e.g. `sys.stdout`
+            verbose: `bool` - include Block's metadata for each line. Warning: takes up much more time and space
+            config: `Config` - used for the initial speed. Defaults to config of chunks
+        """
+        write_coords = lambda config: file.write('\n' + CoordSystem(position=Vector(F=config.speed), abs_e=False).to_str())
+        started = False
+        prev = None
+        for chunk in chunks:
+            if not started:
+                write_coords(config or chunk.config)
+                started = True
+            if not len(chunk):
+                continue
+
+            file.write(''.join(chunk.block_to_str(i, verbose, prev) for i in range(len(chunk))))
+            prev = chunk[-1]
+
+        if not started:
+            write_coords(config or Config())
+        file.write('\n')
@@ -1,56 +1,40 @@
-import json
 from GcodeTools.gcode_types import *
 from GcodeTools.gcode import Gcode
 import base64
-import textwrap
-from GcodeTools.gcode_parser import MetaParser
+import typing
+import re
+from GcodeTools.gcode_parser import MetaParser, GcodeParser
+from GcodeTools.gcode_meta_reader import MetaReader
+from GcodeTools.gcode_compression import Compression
 
 
 class Tools:
 
+    REORDER_TYPES = (Static.SOLID_INFILL, Static.SPARSE_INFILL, Static.TOP_SOLID_INFILL, Static.BRIDGE, Static.SUPPORT)
+    """Move types whose islands `Tools.optimize_travels` reorders within an object. Perimeters keep their order"""
+
+    TWO_OPT_LIMIT = 1000
+    """Most paths improved with 2-opt, which is quadratic per pass. Larger sets keep the nearest neighbour order"""
+
 
     @staticmethod
     def get_slicer_name(gcode: Gcode) -> tuple[str, str]:
         """
         Get (`slicer_name`, `slicer_version`)
+
+        To read it straight from a file, use `MetaReader.get_slicer_name(filename)`
         """
-        for line in gcode[:20]:
-            cmd = line.command
-            if 'bambustudio' in cmd.lower():
-                slicer = 'BambuStudio'
-                version = cmd.split('BambuStudio')[1].trim()
-                return (slicer, version)
-            if 'generated' in cmd.lower():
-                line = cmd.split('by')[-1].split('with')[-1].replace('Version', '').replace('(R)', '').split()
-                slicer = line[0]
-                version = line[1]
-                return (slicer, version)
+        return MetaReader.parse_slicer_name([block.command for block in gcode[:20]])
 
 
     @staticmethod
     def read_config(gcode: Gcode):
         """
         Read slicer's config from `Gcode`
+
+        To read it straight from a file, use `MetaReader.read_config(filename)`
         """
-        metadata = {}
-        start_id, end_id = -1, -1
-        for id, block in enumerate(gcode):
-        
-            if start_id == -1 and MetaParser.get_keyword_line(id, gcode, MetaParser.CONFIG_START): start_id = id
-            if end_id == -1 and start_id != -1 and MetaParser.get_keyword_line(id, gcode, MetaParser.CONFIG_END): end_id = id
-        
-        if start_id == -1 or end_id - start_id > 1000: return None
-        print(f'{start_id=}, {end_id=}')
-        
-        for block in gcode[start_id + 1 : end_id]:
-            line = block.command
-            delimeter = line.find('=')
-            if delimeter < 0: delimeter = line.find(',')
-            key = line[1:delimeter].strip()
-            value = line[delimeter + 1:].strip()
-            metadata[key] = value
-        
-        return metadata
+        return MetaReader.parse_config([block.command for block in gcode])
 
 
     @staticmethod
@@ -58,68 +42,14 @@ class Tools:
         """
         Generate configuration file(s) for slicer which generated the gcode.
 
+        To generate them straight from a file, use `MetaReader.generate_config_files(filename)`
+
         Returns:
             {`filename`, `contents`}
         """
         slicer, version = Tools.get_slicer_name(gcode)
         config = Tools.read_config(gcode)
-        if slicer.lower() in ['cura']:
-            print(f'{slicer.lower()} doesn\'t generate configuration')
-            return {}
-        elif slicer.lower() in ['orcaslicer', 'bambustudio']:
-            machine = config.copy()
-            process = config.copy()
-            filament = {}
-
-            filament_fields = ['filament', 'fan_', 'temp', 'nozzle', 'slow', 'air_']
-            for key in config.keys():
-                if any(field in key for field in filament_fields):
-                    filament[key] = config[key]
-
-            try:
-                inherit_groups = config['inherits_group'].split(';')
-                if inherit_groups[0]:
-                    process['inherits'] = inherit_groups[0]
-                if inherit_groups[1]:
-                    filament['inherits'] = inherit_groups[1]
-                if inherit_groups[2]:
-                    machine['inherits'] = inherit_groups[2]
-                    process['compatible_printers'] = [inherit_groups[2]]
-                    filament['compatible_printers'] = [inherit_groups[2]]
-            except KeyError:
-                pass
-
-            filament['from'] = 'User'
-            filament['type'] = 'filament'
-            filament['is_custom_defined'] = '0'
-            filament['version'] = version
-            filament['name'] = config['filament_settings_id']
-
-            machine['from'] = 'User'
-            machine['type'] = 'machine'
-            machine['is_custom_defined'] = '0'
-            machine['version'] = version
-            machine['name'] = config['printer_settings_id']
-
-            process['from'] = 'User'
-            process['type'] = 'process'
-            process['is_custom_defined'] = '0'
-            process['version'] = version
-            process['name'] = config['print_settings_id']
-
-            filament_str = json.dumps(filament, indent=4)
-            machine_str = json.dumps(machine, indent=4)
-            process_str = json.dumps(process, indent=4)
-
-            return {'filament.json': filament_str, 'machine.json': machine_str, 'process.json': process_str}
-
-        else:
-            if slicer.lower() not in ['prusaslicer', 'slic3r', 'superslicer']:
-                print('Unsupported slicer: trying generating slic3r config')
-            output = ''
-            for key in config.keys():
-                output += key + ' = ' + config[key] + '\n'
-            return {'config.ini': output}
+        return MetaReader.config_files(slicer, version, config)
 
 
     @staticmethod
@@ -160,6 +90,177 @@ class Tools:
         return (start_gcode, end_gcode, object_gcode, objects)
 
 
+    @staticmethod
+    def exclude_objects(in_path: str|typing.BinaryIO, out_path: str|typing.BinaryIO, names: list[str]) -> int:
+        """
+        Streams G-code from `in_path` to `out_path`, removing selected objects without parsing into `Gcode`.
+
+        Lines are passed through untouched, except moves inside excluded objects'
+        `EXCLUDE_OBJECT_START`/`EXCLUDE_OBJECT_END`, `M486 S`/`M486 S-1` and `; printing object`/`; stop printing object` ranges.
+        These moves are replaced with an equivalent travel at the end of the range, keeping position, feedrate,
+        retraction state and absolute/relative E continuity. Non-move commands inside the range (temperature, fan, `G10`...) are kept.
+
+        Assumes XYZ positioning mode (`G90`/`G91`) doesn't change inside an excluded object.
+
+        Args:
+            in_path: `str` path or binary file object to read G-code from
+            out_path: `str` path or binary file object to write G-code to
+            names: `list[str]` of object names (as in `Gcode.objects` or as in the file) or `M486` object ids
+        Returns:
+            `int` - number of removed object ranges
+        """
+        excluded = set(str(name) for name in names) | set(MetaParser.sanitize_name(str(name)) for name in names)
+        is_excluded = lambda name: name is not None and (name in excluded or MetaParser.sanitize_name(name) in excluded)
+        num = lambda value: f'{value:.5f}'.rstrip('0').rstrip('.').encode()
+        e_regex = re.compile(rb'E(-?[\d.]+)')
+
+        m486_names: dict[str, str] = {}
+        state = {'abs_xyz': True, 'abs_e': True, 'e': 0.0, 'obj': None, 'm486': None, 'range': None, 'count': 0}
+
+        def begin_range():
+            state['range'] = {'axes': {}, 'f': None, 'e_f': None, 'e_start': state['e'], 'retract': 0.0, 'moves': 0}
+
+        def end_range(fout):
+            r = state['range']
+            state['range'] = None
+            if not r['moves']:
+                return
+            state['count'] += 1
+
+            def move(params: list[bytes], f: float|None):
+                if f is not None: params = params + [b'F' + num(f)]
+                return [(b' '.join([b'G1'] + params), f)] if params else []
+
+            travel = move([axis.encode() + num(value) for axis, value in r['axes'].items() if state['abs_xyz'] or abs(value) > 1e-9], r['f'])
+            e_move = []
+            setup = []
+            if state['abs_e']:
+                if r['retract']:
+                    setup = [(b'G92 E' + num(state['e'] - r['retract']), None)]
+                    e_move = move([b'E' + num(state['e'])], r['e_f'])
+                elif state['e'] != r['e_start']:
+                    setup = [(b'G92 E' + num(state['e']), None)]
+            elif r['retract']:
+                e_move = move([b'E' + num(r['retract'])], r['e_f'])
+
+            out = setup + (e_move + travel if r['retract'] < 0 else travel + e_move)
+            emitted_f = [f for _, f in out if f is not None]
+            if emitted_f and emitted_f[-1] != r['f']:
+                out += move([], r['f'])
+            for line, _ in out:
+                fout.write(line + b'\n')
+
+        def switch_object(name: str|None, fout):
+            if state['range'] is not None:
+                end_range(fout)
+            state['obj'] = name
+            if is_excluded(name):
+                begin_range()
+
+        def process(line: bytes, fout):
+            if state['range'] is None and not state['abs_e'] and line.startswith((b'G1 ', b'G0 ')):
+                fout.write(line)
+                return
+            stripped = line.strip()
+            first = stripped[:1]
+
+            if first == b';':
+                if stripped.startswith(b'; printing object'):
+                    switch_object(stripped[len(b'; printing object'):].decode('utf-8', 'replace').strip(), fout)
+                elif stripped.startswith(b'; stop printing object'):
+                    switch_object(None, fout)
+                fout.write(line)
+                return
+
+            if first == b'E' and stripped.startswith(b'EXCLUDE_OBJECT_'):
+                params = GcodeParser._line_to_dict(stripped.decode('utf-8', 'replace'))
+                if params['0'] == 'EXCLUDE_OBJECT_START':
+                    switch_object(str(params.get('NAME')), fout)
+                elif params['0'] == 'EXCLUDE_OBJECT_END':
+                    switch_object(None, fout)
+                fout.write(line)
+                return
+
+            if first != b'G' and first != b'M':
+                fout.write(line)
+                return
+
+            code = stripped.split(b';', 1)[0]
+            if state['range'] is None:
+                if code.startswith((b'G0 ', b'G1 ', b'G2 ', b'G3 ')):
+                    if state['abs_e'] and b'E' in code:
+                        match = e_regex.search(code)
+                        if match: state['e'] = float(match.group(1))
+                    fout.write(line)
+                    return
+                if not code.startswith((b'G9', b'M8', b'M486')):
+                    fout.write(line)
+                    return
+
+            params = GcodeParser._line_to_dict(code.decode('utf-8', 'replace'))
+            command = params['0']
+
+            if command == 'M486':
+                arg = code[4:].strip().decode('utf-8', 'replace')
+                if arg.startswith('S'):
+                    obj_id = arg[1:].strip()
+                    switch_object(None if obj_id == '-1' else m486_names.get(obj_id, obj_id), fout)
+                    state['m486'] = obj_id
+                elif arg.startswith('A') and state['m486'] not in [None, '-1']:
+                    m486_names[state['m486']] = arg[1:].strip()
+                    if state['obj'] == state['m486'] and state['range'] is None and is_excluded(arg[1:].strip()):
+                        state['obj'] = arg[1:].strip()
+                        begin_range()
+                fout.write(line)
+                return
+
+            if command == Static.ABSOLUTE_COORDS or command == Static.RELATIVE_COORDS:
+                state['abs_xyz'] = command == Static.ABSOLUTE_COORDS
+            elif command == Static.ABSOLUTE_EXTRUDER or command == Static.RELATIVE_EXTRUDER:
+                state['abs_e'] = command == Static.ABSOLUTE_EXTRUDER
+            elif command == Static.SET_POSITION:
+                if 'E' in params and state['abs_e']:
+                    state['e'] = float(params['E'])
+            elif command == Static.HOME and state['range'] is not None:
+                state['range']['axes'] = {}
+
+            r = state['range']
+            if r is None or command not in ['G0', 'G1', 'G2', 'G3']:
+                fout.write(line)
+                return
+
+            r['moves'] += 1
+            c = Coords(params)
+            if c.F is not None:
+                r['f'] = c.F
+            has_xyz = False
+            for axis in 'XYZ':
+                value = getattr(c, axis)
+                if value is None: continue
+                has_xyz = True
+                r['axes'][axis] = value if state['abs_xyz'] else r['axes'].get(axis, 0.0) + value
+            if c.E is not None:
+                delta = c.E - state['e'] if state['abs_e'] else c.E
+                if state['abs_e']:
+                    state['e'] = c.E
+                if delta < 0 or not has_xyz:
+                    r['retract'] += delta
+                    if c.F is not None: r['e_f'] = c.F
+
+        fin = Compression.open(in_path, 'rb', buffer_size=1 << 20) if isinstance(in_path, str) else in_path
+        fout = Compression.open(out_path, 'wb', buffer_size=1 << 20) if isinstance(out_path, str) else out_path
+        try:
+            for line in fin:
+                process(line, fout)
+            if state['range'] is not None:
+                end_range(fout)
+        finally:
+            if isinstance(in_path, str): fin.close()
+            if isinstance(out_path, str): fout.close()
+
+        return state['count']
+
+
     @staticmethod
     def trim(gcode: Gcode):
         """
@@ -181,28 +282,161 @@ class Tools:
 
 
     @staticmethod
-    def set_flowrate(gcode: Gcode, flowrate: float, force_extrusion = False) -> Gcode:
+    def _flow_selector(gcode: Gcode, selector, move_type, object, layer):
+        """`np.ndarray` of `bool` - blocks matching a `Tools.set_flowrate` selector"""
+        import numpy as np
+        if selector is None:
+            return np.ones(len(layer), dtype=bool)
+        if isinstance(selector, tuple):
+            mask = np.ones(len(layer), dtype=bool)
+            for part in selector:
+                mask &= Tools._flow_selector(gcode, part, move_type, object, layer)
+            return mask
+        if isinstance(selector, range):
+            mask = (layer >= selector.start) & (layer < selector.stop)
+            if selector.step != 1:
+                mask &= (layer - selector.start) % selector.step == 0
+            return mask
+        if isinstance(selector, str):
+            if selector not in gcode.objects:
+                raise ValueError(f'Unknown object: {selector}, use one of {gcode.objects}')
+            return object == gcode.objects.index(selector)
+        if isinstance(selector, int):
+            return move_type == selector
+        raise TypeError(f'Unsupported flowrate selector: {selector!r}')
+
+
+    @staticmethod
+    def _flow_target(target) -> tuple[float|None, float]:
+        """(`flowrate`, `multiplier`) of a `Tools.set_flowrate` target"""
+        if isinstance(target, str):
+            text = target.strip().lower()
+            if text.endswith('%'):
+                return (None, float(text[:-1]) / 100)
+            return (None, float(text.strip('x')))
+        return (float(target), 1.0)
+
+
+    @staticmethod
+    def set_flowrate(gcode: Gcode, flowrate: float|dict, force_extrusion = False) -> Gcode:
         """
-        Sets flowrate (mm in E over mm in XYZ)
-        
+        Sets flowrate (mm in E over mm in XYZ) of printing moves, all at once. Requires `numpy`
+
+        Retractions and unretractions (E-only moves) stay untouched. E of every `Block` stays relative,
+        so output written with absolute E stays consistent.
+
+        Args:
+            flowrate: `float` - desired flowrate of all printing moves, or `dict` of {`selector`: `target`}.
+                The last matching selector of a move applies.
+                - `selector`: `None` - every move, `int` - move type, `str` - object name, `range` - layers,
+                  `tuple` - moves matching all of its selectors
+                - `target`: `float` - flowrate, `str` - multiplier of the current flow, e.g. `'90%'` or `'0.9x'`
+            force_extrusion: `bool` - on `True` forces flowrates even on non-extrusion moves
+        Example:
+        ```
+        Tools.set_flowrate(gcode, {Static.BRIDGE: '90%', Static.EXTERNAL_PERIMETER: 0.04, (Static.SPARSE_INFILL, range(0, 3)): '105%'})
+        ```
+        """
+        import numpy as np
+        rules = flowrate if isinstance(flowrate, dict) else {None: flowrate}
+
+        position, e, move_type, object, layer = Tools._columns(gcode)
+        distance = np.zeros(len(e))
+        distance[1:] = np.linalg.norm(position[1:] - position[:-1], axis=1)
+        moving = distance >= gcode.config.step
+        printing = moving & (e > 0)
+
+        new_e = e.copy()
+        changed = np.zeros(len(e), dtype=bool)
+        for selector, target in rules.items():
+            mask = Tools._flow_selector(gcode, selector, move_type, object, layer)
+            rate, multiplier = Tools._flow_target(target)
+            if rate is None:
+                mask &= printing
+                new_e[mask] = e[mask] * multiplier
+            else:
+                mask &= moving if force_extrusion else printing
+                new_e[mask] = distance[mask] * rate
+            changed |= mask
+
+        gcode_new = gcode.copy()
+        for i in np.flatnonzero(changed & (new_e != e)):
+            gcode_new[int(i)].position.E = float(new_e[i])
+        return gcode_new
+
+
+    @staticmethod
+    def scale_flow(gcode: Gcode, multiplier: float) -> Gcode:
+        """
+        Multiplies extrusion of printing moves. Retractions and unretractions (E-only moves) stay untouched
+
         Args:
-            flowrate: `float` - desired flowrate
-            force_extrusion: `bool` - on `True` forces flowrate even on non-extrusion moves
+            multiplier: `float` - e.g. `0.95` for 95% flow
         """
         gcode_new = gcode.copy()
+        prev = None
         for i in gcode_new:
-            if force_extrusion or (i.position.E and i.position.E > 0):
-                # i.move.set_flowrate(flowrate)
-                pass
+            pos = i.position
+            if prev is not None and pos.E > 0 and (pos.X != prev.X or pos.Y != prev.Y or pos.Z != prev.Z):
+                pos.E *= multiplier
+            prev = pos
         return gcode_new
 
 
+    @staticmethod
+    def limit_volumetric_flow(gcode: Gcode, max_mm3_s = 15.0, filament_diameter = 1.75, smoothing = 0) -> tuple[Gcode, dict]:
+        """
+        Lowers `F` of extruding moves whose volumetric flow exceeds `max_mm3_s`. Requires `numpy`
+
+        Flow of a move is its filament volume over its duration, `E * area / (distance / F)`, as in `Vector.get_flowrate`.
+
+        Args:
+            max_mm3_s: `float` - max volumetric flow in mm³/s
+            filament_diameter: `float` - in mm
+            smoothing: `int` - each move is also capped by the limits of up to `smoothing` neighbouring moves of the same extrusion,
+                so the feedrate doesn't oscillate between short and long moves
+        Returns:
+            `tuple` of (`Gcode`, `dict` of `slowed` moves, `max_flow` before in mm³/s, `time_before`, `time_after` of slowed moves and `time_added` in seconds)
+        """
+        import numpy as np
+
+        position, e, *_ = Tools._columns(gcode)
+        feedrate = Tools._feedrates(gcode)
+        distance = np.zeros(len(e))
+        distance[1:] = np.linalg.norm(position[1:] - position[:-1], axis=1)
+        extrude = (e > 0) & (distance >= gcode.config.step) & (feedrate > 0)
+        area = math.pi * (filament_diameter / 2) ** 2
+
+        limit = np.full(len(e), np.inf)
+        limit[extrude] = max_mm3_s * 60 * distance[extrude] / (e[extrude] * area)
+        if smoothing > 0:
+            # neighbours are only taken from the same run of consecutive extruding moves
+            run = np.cumsum(~extrude)
+            smooth = limit.copy()
+            for shift in range(1, int(smoothing) + 1):
+                same = run[shift:] == run[:-shift]
+                smooth[shift:] = np.where(same, np.minimum(smooth[shift:], limit[:-shift]), smooth[shift:])
+                smooth[:-shift] = np.where(same, np.minimum(smooth[:-shift], limit[shift:]), smooth[:-shift])
+            limit = np.where(extrude, smooth, limit)
+
+        slowed = np.flatnonzero(extrude & (limit < feedrate))
+        flow = np.zeros(len(e))
+        flow[extrude] = e[extrude] * area * feedrate[extrude] / (60 * distance[extrude])
+
+        gcode_new = gcode.copy()
+        for i in slowed:
+            gcode_new[int(i)].position.F = float(limit[i])
+
+        time_before = float((distance[slowed] * 60 / feedrate[slowed]).sum())
+        time_after = float((distance[slowed] * 60 / limit[slowed]).sum())
+        return (gcode_new, {'slowed': len(slowed), 'max_flow': float(flow.max(initial=0)), 'time_before': time_before, 'time_after': time_after, 'time_added': time_after - time_before})
+
+
     @staticmethod
     def translate(gcode: Gcode, vector: Vector) -> Gcode:
         gcode_new = gcode.copy()
         for i in gcode_new:
             i.position += vector
-        gcode_new.order()
         return gcode_new
 
 
@@ -276,6 +510,157 @@ class Tools:
         return (sum / total_volume).xyz()
 
 
+    @staticmethod
+    def _columns(gcode: Gcode, no_type = -1):
+        """
+        Block state as arrays. Requires `numpy`
+
+        Args:
+            no_type: `int` - move type of blocks without one
+        Returns:
+            `tuple` of `np.ndarray` (`position` (n, 3), `e`, `move_type`, `object`, `layer`)
+        """
+        import numpy as np
+        from GcodeTools.gcode_store import GcodeStore, StoredGcode
+        if isinstance(gcode, StoredGcode) and gcode.untouched:
+            columns = gcode.columns
+            position = np.frombuffer(columns['position'], dtype='<f8').reshape(-1, 5)
+            state = np.frombuffer(columns['state'], dtype='<f8').reshape(-1, len(GcodeStore.STATE))
+            kinds = np.frombuffer(columns['kinds'], dtype=np.uint8).reshape(-1, len(GcodeStore.STATE))
+            def column(name: str, default: int):
+                index = GcodeStore.STATE.index(name)
+                return np.where(kinds[:, index] == GcodeStore.NONE, default, state[:, index]).astype(np.int64)
+            e = np.nan_to_num(position[:, 3])
+            return (position[:, :3], e, column('move_type', no_type), column('object', Static.NO_OBJECT), column('layer', 0))
+
+        position = np.array([(b.position.X, b.position.Y, b.position.Z) for b in gcode], dtype=float).reshape(-1, 3)
+        e = np.array([b.position.E or 0 for b in gcode], dtype=float)
+        move_type = np.array([no_type if b.move_type is None else b.move_type for b in gcode], dtype=np.int64)
+        object = np.array([Static.NO_OBJECT if b.object is None else b.object for b in gcode], dtype=np.int64)
+        layer = np.array([b.layer or 0 for b in gcode], dtype=np.int64)
+        return (position, e, move_type, object, layer)
+
+
+    @staticmethod
+    def _extruding(position, e):
+        """
+        Blocks extruding a segment from the position of the block before, as `np.ndarray` of `bool`.
+        The first block only sets the start position, and extrusion without XY movement (unretraction) is no segment
+
+        Args:
+            position: `np.ndarray` (n, 3) and `e` (n,) - from `Tools._columns`
+        """
+        import numpy as np
+        extruding = np.zeros(len(e), dtype=bool)
+        extruding[1:] = (e[1:] > 0) & np.any(position[1:, :2] != position[:-1, :2], axis=1)
+        return extruding
+
+
+    @staticmethod
+    def _feedrates(gcode: Gcode):
+        """`np.ndarray` of `F` of every block. Requires `numpy`"""
+        import numpy as np
+        from GcodeTools.gcode_store import StoredGcode
+        if isinstance(gcode, StoredGcode) and gcode.untouched:
+            return np.frombuffer(gcode.columns['position'], dtype='<f8').reshape(-1, 5)[:, 4].copy()
+        return np.array([b.position.F or 0 for b in gcode], dtype=float)
+
+
+    @staticmethod
+    def layer_rasters(gcode: Gcode, resolution = 0.5, bounds: tuple[float, float, float, float]|None = None, filament_diameter = 1.75, workers: int|None = 1) -> dict:
+        """
+        Rasterize every layer into a 2D grid of extruded volume, with the dominant move type and object of each cell.
+        Requires `numpy`
+
+        Segments are sampled at a quarter of a cell, every sample adds its share of the segment's volume to its cell.
+        Extrusion without XY movement, like unretraction, is not counted.
+
+        Args:
+            resolution: `float` - cell size in mm
+            bounds: `tuple` of (`x_min`, `y_min`, `x_max`, `y_max`) - area of the grid, defaults to the extruded area.
+                Use the same bounds to compare two `Gcode`s cell by cell
+            filament_diameter: `float` - in mm, to convert E to volume
+            workers: `int` - threads rasterizing layers concurrently, `None` for one per CPU
+        Returns:
+            `dict` of:
+            - `volume` - `np.ndarray` (layers, height, width) of `float32` extruded volume in mm³
+            - `move_type` - `np.ndarray` (layers, height, width) of `int8`, -1 where nothing or custom moves were extruded
+            - `object` - `np.ndarray` (layers, height, width) of `int16` indices of `gcode.objects`, `Static.NO_OBJECT` where none
+            - `layers` - `np.ndarray` (layers,) of layer numbers
+            - `origin` - (`x`, `y`) of the corner of cell [0, 0]. Row index grows with Y
+            - `resolution` - cell size
+        """
+        import numpy as np
+        import concurrent.futures
+
+        position, e, move_type, object, layer = Tools._columns(gcode)
+        xy = position[:, :2]
+        segment = np.flatnonzero(Tools._extruding(position, e))
+        start, end = xy[segment - 1], xy[segment]
+        volume = e[segment] * math.pi * (filament_diameter / 2) ** 2
+        move_type, object, layer = move_type[segment], object[segment], layer[segment]
+
+        if bounds is None:
+            points = np.concatenate([start, end]) if len(segment) else np.zeros((1, 2))
+            x_min, y_min = points.min(axis=0) - resolution
+            x_max, y_max = points.max(axis=0) + resolution
+        else:
+            x_min, y_min, x_max, y_max = bounds
+        width = max(1, int(math.ceil((x_max - x_min) / resolution)))
+        height = max(1, int(math.ceil((y_max - y_min) / resolution)))
+
+        order = np.argsort(layer, kind='stable')
+        start, end, volume, move_type, object, layer = (a[order] for a in (start, end, volume, move_type, object, layer))
+        layers, layer_start = np.unique(layer, return_index=True)
+        layer_end = np.append(layer_start[1:], len(layer))
+
+        types = np.unique(move_type)
+        objects = np.unique(object)
+        type_index = np.searchsorted(types, move_type)
+        object_index = np.searchsorted(objects, object)
+
+        result_volume = np.zeros((len(layers), height, width), dtype=np.float32)
+        result_type = np.full((len(layers), height, width), -1, dtype=np.int8)
+        result_object = np.full((len(layers), height, width), Static.NO_OBJECT, dtype=np.int16)
+        cells = width * height
+
+        def rasterize(i: int):
+            sl = slice(layer_start[i], layer_end[i])
+            a, b = start[sl], end[sl]
+            length = np.hypot(*(b - a).T)
+            counts = np.ceil(length / (resolution / 4)).astype(np.int64) + 1
+            owner = np.repeat(np.arange(len(a)), counts)
+            first = np.cumsum(counts) - counts
+            t = (np.arange(counts.sum()) - first[owner] + 0.5) / counts[owner]
+            p = a[owner] + (b - a)[owner] * t[:, None]
+            ix = ((p[:, 0] - x_min) / resolution).astype(np.int64)
+            iy = ((p[:, 1] - y_min) / resolution).astype(np.int64)
+            inside = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+            owner = owner[inside]
+            cell = (iy * width + ix)[inside]
+            share = (volume[sl] / counts)[owner]
+
+            result_volume[i] = np.bincount(cell, share, cells).reshape(height, width)
+            for index, values, out in ((type_index, types, result_type), (object_index, objects, result_object)):
+                # volume per (cell, value) pair, sorted by cell then volume, so the last pair of a cell dominates.
+                # Ties go to the lowest value
+                key, inverse = np.unique(cell * len(values) + index[sl][owner], return_inverse=True)
+                total = np.bincount(inverse.ravel(), share)
+                key = key[np.lexsort((-(key % len(values)), total, key // len(values)))]
+                pair_cell = key // len(values)
+                last = np.append(pair_cell[1:] != pair_cell[:-1], True)
+                out[i].ravel()[pair_cell[last]] = values[key[last] % len(values)]
+
+        if workers == 1 or len(layers) < 2:
+            for i in range(len(layers)):
+                rasterize(i)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                list(executor.map(rasterize, range(len(layers))))
+
+        return {'volume': result_volume, 'move_type': result_type, 'object': result_object, 'layers': layers, 'origin': (float(x_min), float(y_min)), 'resolution': resolution}
+
+
     # TODO: regenerate_travels:
     # - ensure clean travel trimming
     # FIXME: correct travel begin/end
@@ -315,6 +700,279 @@ class Tools:
         return out_gcode
 
 
+    @staticmethod
+    def _plan_order(starts, ends, origin, passes = 8):
+        """
+        Order of directed paths, each going from `starts[i]` to `ends[i]`, with short travels in between.
+        Paths keep their direction
+
+        Nearest neighbour tour from `origin`, searching a grid of path starts ring by ring around the current position.
+        Tours of up to `Tools.TWO_OPT_LIMIT` paths are then improved with 2-opt, larger ones are returned as they are
+
+        Args:
+            starts, ends: `np.ndarray` (n, 2)
+            origin: `np.ndarray` (2,)
+        Returns:
+            `np.ndarray` of path indices
+        """
+        import numpy as np
+        n = len(starts)
+        order = np.zeros(n, dtype=np.int64)
+        if n == 0:
+            return order
+
+        low = starts.min(axis=0)
+        size = max(float(np.ptp(starts, axis=0).max()) / math.sqrt(n), 1e-6)
+        cells = np.floor((starts - low) / size).astype(np.int64)
+        top = cells.max(axis=0).tolist()
+        grid: dict[tuple[int, int], list[int]] = {}
+        for i, cell in enumerate(map(tuple, cells.tolist())):
+            grid.setdefault(cell, []).append(i)
+
+        def ring(cx: int, cy: int, r: int):
+            """Cells of the grid `r` cells away from (`cx`, `cy`)"""
+            xs = range(max(cx - r, 0), min(cx + r, top[0]) + 1)
+            ys = range(max(cy - r + 1, 0), min(cy + r - 1, top[1]) + 1)
+            for y in {cy - r, cy + r}:
+                if 0 <= y <= top[1]:
+                    for x in xs:
+                        yield (x, y)
+            for x in {cx - r, cx + r}:
+                if 0 <= x <= top[0]:
+                    for y in ys:
+                        yield (x, y)
+
+        here = origin
+        for k in range(n):
+            cx, cy = (int(v) for v in np.floor((here - low) / size))
+            # rings closer than the grid hold no starts, the ones past the best found can't hold a closer one
+            r = max(0, -cx, -cy, cx - top[0], cy - top[1])
+            last = max(cx, cy, top[0] - cx, top[1] - cy)
+            best = (math.inf, -1)
+            while r <= last and best[0] >= (r - 1) * size:
+                for cell in ring(cx, cy, r):
+                    for i in grid.get(cell, ()):
+                        best = min(best, (math.hypot(*(starts[i] - here)), i))
+                r += 1
+            order[k] = best[1]
+            grid[tuple(cells[best[1]].tolist())].remove(best[1])
+            here = ends[best[1]]
+        if n < 3 or n > Tools.TWO_OPT_LIMIT:
+            return order
+
+        def costs():
+            s, e = starts[order], ends[order]
+            previous = np.vstack([origin, e[:-1]])
+            forward = np.concatenate([[0], np.cumsum(np.hypot(*(s[1:] - e[:-1]).T))])
+            backward = np.concatenate([[0], np.cumsum(np.hypot(*(s[:-1] - e[1:]).T))])
+            return (s, e, previous, forward, backward)
+
+        s, e, previous, forward, backward = costs()
+        for _ in range(passes):
+            improved = False
+            for i in range(n - 1):
+                # reversing the order of paths i..j: travels inside the range run backwards
+                j = np.arange(i + 1, n)
+                has_next = j < n - 1
+                following = s[np.minimum(j + 1, n - 1)]
+                old = np.hypot(*(s[i] - previous[i])) + forward[j] - forward[i] + np.where(has_next, np.hypot(*(following - e[j]).T), 0)
+                new = np.hypot(*(s[j] - previous[i]).T) + backward[j] - backward[i] + np.where(has_next, np.hypot(*(following - e[i]).T), 0)
+                best = int((old - new).argmax())
+                if old[best] - new[best] > 1e-6:
+                    order[i:j[best] + 1] = order[i:j[best] + 1][::-1].copy()
+                    s, e, previous, forward, backward = costs()
+                    improved = True
+            if not improved:
+                break
+        return order
+
+
+    @staticmethod
+    def _travel_distance(gcode: Gcode) -> float:
+        """XY length of non-extruding moves"""
+        import numpy as np
+        position, e, *_ = Tools._columns(gcode)
+        step = np.hypot(*(position[1:, :2] - position[:-1, :2]).T)
+        return float(step[e[1:] <= 0].sum())
+
+
+    @staticmethod
+    def optimize_travels(gcode: Gcode, retract_length: float|None = None, travel_speed: float|None = None, min_travel = 2.0, reorder_types: tuple = REORDER_TYPES) -> tuple[Gcode, dict]:
+        """
+        Reorder objects and extrusion islands within each layer to shorten travels, and regenerate the travel moves.
+        Requires `numpy`
+
+        An island is a continuous extrusion of one object and move type. In every layer, runs of islands of the same object
+        are reordered between paths of no object (skirt, wipe tower, start and end G-code), which stay in place.
+        Within an object, islands of `reorder_types` are reordered among consecutive islands of the same type.
+        Travels are planned with a nearest neighbour tour improved with 2-opt.
+
+        Where an island still follows the same block as in `gcode`, the moves between them are kept as they are.
+        Otherwise retractions, unretractions, wipes, Z hops and travels between islands are replaced with a retract,
+        travel and unretract without wipe or Z hop, keeping the total extrusion.
+        Other commands between islands move with the island following them.
+
+        Args:
+            retract_length: `float` - defaults to the median retraction of `gcode`, 0 disables retractions
+            travel_speed: `float` - in mm/min, defaults to the median speed of travels
+            min_travel: `float` - shorter travels are retracted only when the original one was
+            reorder_types: `tuple` of move types - see `Tools.REORDER_TYPES`
+        Returns:
+            `tuple` of (`Gcode`, `dict` of `travel_before`, `travel_after`, `saved` in mm and `time_saved` in seconds)
+        """
+        import numpy as np
+
+        position, e, move_type, object, layer = Tools._columns(gcode)
+        n = len(e)
+        moved = np.zeros(n, dtype=bool)
+        moved[1:] = np.any(position[1:, :2] != position[:-1, :2], axis=1)
+        hop = np.zeros(n, dtype=bool)
+        hop[1:] = (position[1:, 2] != position[:-1, 2]) & ~moved[1:] & (e[1:] == 0)
+        extrude = (e > 0) & moved
+        # retractions, unretractions, travels and Z hops between islands are regenerated.
+        # Extrusion without movement is an unretraction only while the filament is retracted
+        retracted = np.zeros(n, dtype=bool)
+        level = 0.0
+        for i in np.flatnonzero(~extrude & (e != 0)):
+            retracted[i] = level < -1e-6
+            level = min(0.0, level + e[i])
+        motion = ~extrude & ((e < 0) | (moved & (e == 0)) | hop | ((e > 0) & retracted))
+        motions = np.cumsum(motion)
+
+        retracts = np.flatnonzero(e < 0)
+        travels = np.flatnonzero(motion & moved & (e == 0))
+        if retract_length is None:
+            retract_length = float(np.median(-e[retracts])) if len(retracts) else 0.0
+        retract_speed = gcode[int(retracts[0])].position.F if len(retracts) else gcode.config.speed
+        if travel_speed is None:
+            sample = travels[::max(1, len(travels) // 100)]
+            travel_speed = float(np.median([gcode[int(i)].position.F for i in sample])) if len(sample) else gcode.config.speed
+
+        out = gcode.new()
+        out.header = gcode.header
+        out.footer = gcode.footer
+        blocks = out.__super__()
+        here: Block = None
+        # last block of `gcode` emitted in its original order
+        source_end = -1
+
+        def emit(block: Block):
+            nonlocal here
+            blocks.append(block)
+            here = block
+
+        def emit_kept(i: int):
+            """Block between islands, moved to the current position"""
+            block = gcode[i].copy()
+            if here is not None:
+                block.position.X, block.position.Y = here.position.X, here.position.Y
+            emit(block)
+
+        def emit_move(template: Block, target: Vector, e: float, f: float):
+            block = template.copy()
+            block.command = None
+            block.emit_command = False
+            block.position = Vector(target.X, target.Y, target.Z, e, f)
+            emit(block)
+
+        def emit_gap(gap: range, kept: list):
+            """Blocks between islands: as they are when following the same block, else without the moves"""
+            if gap.start == source_end + 1:
+                for i in gap:
+                    emit(gcode[i].copy())
+                return False
+            for i in kept:
+                emit_kept(i)
+            return True
+
+        def emit_island(k: int):
+            nonlocal source_end
+            first, last, gap, kept, residual, island_retracted = islands[k]
+            if emit_gap(gap, kept):
+                start = gcode[first - 1].position
+                template = gcode[first]
+                distance = math.hypot(start.X - here.position.X, start.Y - here.position.Y) if here is not None else 0
+                retract = retract_length > 0 and (island_retracted or distance > min_travel)
+                if retract:
+                    emit_move(here, here.position, -retract_length, retract_speed)
+                if distance > 0 or (here is not None and start.Z != here.position.Z):
+                    emit_move(template, start, 0, travel_speed)
+                if retract or residual:
+                    emit_move(template, start, (retract_length if retract else 0) + residual, retract_speed)
+            for i in range(first, last + 1):
+                emit(gcode[i].copy())
+            source_end = last
+
+        bounds = np.concatenate([[0], np.flatnonzero(layer[1:] != layer[:-1]) + 1, [n]])
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            ext = np.flatnonzero(extrude[a:b]) + a
+            if len(ext) == 0:
+                for i in range(a, b):
+                    emit(gcode[int(i)].copy())
+                source_end = b - 1
+                continue
+
+            # islands break at travels and at object or move type changes
+            split = (motions[ext[1:] - 1] - motions[ext[:-1]] > 0) | (move_type[ext[1:]] != move_type[ext[:-1]]) | (object[ext[1:]] != object[ext[:-1]])
+            firsts = ext[np.concatenate([[True], split])]
+            lasts = ext[np.concatenate([split, [True]])]
+            islands = []
+            gap_start = a
+            for first, last in zip(firsts, lasts):
+                first, last = int(first), int(last)
+                gap = range(gap_start, first)
+                kept = [i for i in gap if not motion[i]]
+                residual = float(e[[i for i in gap if motion[i]]].sum()) if len(gap) else 0.0
+                island_retracted = bool(np.any(e[gap_start:first] < 0))
+                islands.append((first, last, gap, kept, residual, island_retracted))
+                gap_start = last + 1
+
+            fixed = lambda k: object[firsts[k]] < 0 or move_type[firsts[k]] in (Static.PRINT_START, Static.PRINT_END)
+            k = 0
+            while k < len(islands):
+                if fixed(k):
+                    emit_island(k)
+                    k += 1
+                    continue
+                end = k
+                while end < len(islands) and not fixed(end):
+                    end += 1
+                # runs of one object between fixed islands
+                units = []
+                for j in range(k, end):
+                    if units and object[firsts[j]] == object[firsts[units[-1][-1]]]:
+                        units[-1].append(j)
+                    else:
+                        units.append([j])
+                origin = np.array([here.position.X, here.position.Y]) if here is not None else position[firsts[k] - 1, :2]
+                unit_starts = np.array([position[firsts[u[0]] - 1, :2] for u in units])
+                unit_ends = np.array([position[lasts[u[-1]], :2] for u in units])
+                for u in Tools._plan_order(unit_starts, unit_ends, origin):
+                    unit = units[u]
+                    g = 0
+                    while g < len(unit):
+                        group = [unit[g]]
+                        while g + len(group) < len(unit) and move_type[firsts[unit[g + len(group)]]] == move_type[firsts[group[0]]]:
+                            group.append(unit[g + len(group)])
+                        g += len(group)
+                        if len(group) > 1 and move_type[firsts[group[0]]] in reorder_types:
+                            group_starts = position[firsts[group] - 1, :2]
+                            group_ends = position[lasts[group], :2]
+                            group = [group[i] for i in Tools._plan_order(group_starts, group_ends, np.array([here.position.X, here.position.Y]))]
+                        for j in group:
+                            emit_island(j)
+                k = end
+
+            # blocks after the last island keep their order, moved to where it ends
+            emit_gap(range(gap_start, b), [i for i in range(gap_start, b) if not (motion[i] and e[i] == 0)])
+            source_end = b - 1
+
+        before = Tools._travel_distance(gcode)
+        after = Tools._travel_distance(out)
+        saved = before - after
+        return (out, {'travel_before': before, 'travel_after': after, 'saved': saved, 'time_saved': saved / (travel_speed / 60) if travel_speed else 0.0})
+
+
     @staticmethod
     def remove_thumbnails(gcode: Gcode) -> Gcode:
         """
@@ -338,6 +996,8 @@ class Tools:
     def read_thumbnails(gcode: Gcode) -> list[bytes]:
         """
         Get all thumbnails from `Gcode`, ordered as appearing in `Gcode`. For now only `png` format is supported
+
+        To read them straight from a file, use `MetaReader.read_thumbnails(filename)`
         
         Example implementation:
         ```
@@ -346,52 +1006,64 @@ class Tools:
                 f.write(thumb)
         ```
         """
-        start = -1
-        image_text = ''
-        images = []
-        for idx, i in enumerate(gcode):
-            if start > -1:
-                if i.command == '; THUMBNAIL_BLOCK_END':
-                    start = -1
-                    images.append(base64.b64decode(image_text))
-                
-                text = i.command.removeprefix(';').strip()
-                if 'thumbnail end' in text or 'thumbnail begin' in text or len(text) == 0: continue
-                image_text += text
-            
-            if i.command == '; THUMBNAIL_BLOCK_START':
-                start = idx
-                image_text = ''
-        
+        images, _ = MetaReader.parse_thumbnails([block.command for block in gcode])
         return images
 
 
     @staticmethod
-    def write_thumbnail(gcode: Gcode, data: bytes, width: int, height: int, textwidth = None) -> Gcode:
+    def _thumbnail_text(data: bytes, textwidth = None) -> tuple[str, int]:
+        """
+        Base64 text of `data`, wrapped into `; ` comment lines of `textwidth` characters
+
+        Returns:
+            `tuple` of (`text`, length of base64 data)
+        """
+        encoded = base64.b64encode(data)
+        len_text = len(encoded)
+        if not textwidth: textwidth = 80 if len_text < 10000 else 160
+        width = max(textwidth - 2, 1)
+        lines = [encoded[i:i + width] for i in range(0, len_text, width)]
+        return ((b'; ' + b'\n; '.join(lines)).decode('ascii'), len_text)
+
+
+    @staticmethod
+    def write_thumbnail(gcode: Gcode, data: bytes, width: int, height: int, textwidth = None, format: str|None = None) -> Gcode:
         """
         Args:
-            data: `bytes` - raw png data
+            data: `bytes` - raw image data
             width: `int` - width in pixels
             height: `int` - height in pixels
             textwidth: `int` - custom wrapping width of thumbnail text
                 Defaults to 80 below 10kB, otherwise 160
+            format: `str` - image format of the comment block, e.g. `JPG` writes `; thumbnail_JPG begin`.
+                `None` or `PNG` writes `; thumbnail begin`
+        """
+        return Tools.write_thumbnails(gcode, [(data, width, height, format)], textwidth)
+
+
+    @staticmethod
+    def write_thumbnails(gcode: Gcode, thumbnails: typing.Iterable[tuple[bytes, int, int, str|None]], textwidth = None) -> Gcode:
+        """
+        Write many thumbnails at once
+
+        Args:
+            thumbnails: `Iterable` of (`data`, `width`, `height`, `format`) - see `Tools.write_thumbnail`
         """
         new = gcode.copy()
-        
+
         THUMB_BLOCK = '\n'\
-        '; thumbnail begin {0}x{1} {2}\n'\
-        '{3}\n'\
-        '; thumbnail end\n'\
-        
-        text = base64.b64encode(data)
-        len_text = len(text)
-        if not textwidth: textwidth = 80 if len_text < 10000 else 160
-        text = textwrap.indent(textwrap.fill(text.decode('utf-8'), textwidth - 2), '; ')
+        '; {0} begin {1}x{2} {3}\n'\
+        '{4}\n'\
+        '; {0} end\n'\
+
+        blocks = []
+        for data, width, height, format in thumbnails:
+            keyword = 'thumbnail' if format in (None, 'PNG') else f'thumbnail_{format}'
+            text, len_text = Tools._thumbnail_text(data, textwidth)
+            blocks.append(THUMB_BLOCK.format(keyword, width, height, len_text, text))
 
-        thumb = THUMB_BLOCK.format(width, height, len_text, text)
-        
         Tools.write_slicer_header(new)
-        new.header += thumb
+        new.header += ''.join(blocks)
         return new
 
 
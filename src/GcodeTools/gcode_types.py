@@ -328,7 +328,9 @@ class Vector:
 
 
 class CoordSystem:
-    def __init__(self, abs_xyz = True, abs_e = True, arc_plane = Static.ARC_PLANES['XY'], position = Vector(), offset = Vector(), abs_position_e = 0.0):
+    def __init__(self, abs_xyz = True, abs_e = True, arc_plane = Static.ARC_PLANES['XY'], position: Vector|None = None, offset: Vector|None = None, abs_position_e = 0.0):
+        if position is None: position = Vector()
+        if offset is None: offset = Vector()
         if position.F is None:
             print('Warning: speed parameter is unset! Defaultnig to 1200 mm/min')
             position.set_value(F=1200)
@@ -423,7 +425,7 @@ class CoordSystem:
 
 class Arc:
     
-    def __init__(self, position: Vector, dir = 0, ijk = Vector()):
+    def __init__(self, position: Vector, dir = 0, ijk: Vector|None = None):
         """
         Args:
             dir: `int` - 2=CW, 3=CCW
@@ -433,7 +435,7 @@ class Arc:
         """
         self.position = position
         self.dir = dir
-        self.ijk = ijk.vector_op(Vector())
+        self.ijk = ijk.vector_op(Vector()) if ijk is not None else Vector()
 
 
     def from_params(self, params: dict[str, str]):
@@ -486,7 +488,7 @@ class Arc:
 
 class Block:
     
-    def __init__(self, command: str | None = None, emit_command = True, position=Vector(), e_temp=None, e_wait=None, bed_temp=None, bed_wait=None, fan=None, T=None, object=-1, move_type=None, layer=0):
+    def __init__(self, command: str | None = None, emit_command = True, position: Vector|None = None, e_temp=None, e_wait=None, bed_temp=None, bed_wait=None, fan=None, T=None, object=-1, move_type=None, layer=0):
         
         self.command = command
         self.emit_command = emit_command
@@ -499,7 +501,7 @@ class Block:
         self.object = object
         self.move_type = move_type
         self.layer = layer
-        self.position = position
+        self.position = position if position is not None else Vector()
 
 
     def copy(self):
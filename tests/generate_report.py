@@ -21,6 +21,23 @@ processed_data = []
 
 do_verbose = False # Set to True for verbose output in G-code writing, not strictly needed for this task
 
+renderer = None # One rendering session per worker process, set up on first use
+
+
+def get_renderer():
+    global renderer
+    if renderer is None:
+        renderer = gcode_thumbnails.ThumbnailRenderer()
+    return renderer
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        return background
+    return image
+
 
 def process_gcode(name, id):
     """
@@ -66,11 +83,7 @@ def process_gcode(name, id):
 
     if len(thumb_gcode_for_file) > 2: # Ensure there's enough data to generate a thumbnail
         try:
-            file_thumbnail_img = gcode_thumbnails.Thumbnails.generate_thumbnail(thumb_gcode_for_file, render_scale=2, resolution=1000) # Doubled resolution
-            if file_thumbnail_img.mode == 'RGBA':
-                background = Image.new('RGB', file_thumbnail_img.size, (255, 255, 255))
-                background.paste(file_thumbnail_img, mask=file_thumbnail_img.split()[3])
-                file_thumbnail_img = background
+            file_thumbnail_img = to_rgb(get_renderer().render(thumb_gcode_for_file, {'render_scale': 2}, 1000)[0]) # Doubled resolution
         except Exception as e:
             print(f"Error generating file thumbnail for {name}: {e}")
             # Optionally save the error or a placeholder image
@@ -85,12 +98,8 @@ def process_gcode(name, id):
         # Ensure object name is valid and there's enough data for a thumbnail
         if obj_name and len(obj_gcode) > 2:
             try:
-                obj_thumb_img = gcode_thumbnails.Thumbnails.generate_thumbnail(obj_gcode, render_scale=1, resolution=1000, draw_bounding_box=True) # Doubled resolution for Objects
-                if obj_thumb_img.mode == 'RGBA':
-                    background = Image.new('RGB', obj_thumb_img.size, (255, 255, 255))
-                    background.paste(obj_thumb_img, mask=obj_thumb_img.split()[3])
-                    obj_thumb_img = background
-                objects[obj_name] = obj_thumb_img
+                # All objects are rendered in one session, each with only its own geometry
+                objects[obj_name] = to_rgb(get_renderer().render(obj_gcode, {'draw_bounding_box': True}, 1000)[0]) # Doubled resolution for Objects
             except Exception as e:
                 print(f"Error generating thumbnail for object '{obj_name}' in {name}: {e}")
                 # Optionally save a placeholder image for this object thumbnail